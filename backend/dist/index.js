@@ -30,6 +30,13 @@ app.use((req, res, next) => {
     res.header('Access-Control-Allow-Headers', 'Origin, X-Requested-With, Content-Type, Accept');
     next();
 });
+// An overloaded Python service says when to come back; pass that on
+function forwardRetryAfter(response, res) {
+    const retryAfter = response.headers['retry-after'];
+    if (retryAfter) {
+        res.set('Retry-After', String(retryAfter));
+    }
+}
 // Health check endpoint
 app.get('/health', (req, res) => {
     res.json({
@@ -48,13 +55,29 @@ app.post('/upload', upload.single('audio'), async (req, res) => {
         // Create form data for Python service
         const formData = new form_data_1.default();
         formData.append('audio', fs_1.default.createReadStream(req.file.path));
+        for (const field of ['variants', 'deadline']) {
+            if (req.body[field]) {
+                formData.append(field, String(req.body[field]));
+            }
+        }
+        // Hang up on the Python service when the browser goes away; it
+        // notices and cancels the pipeline's Replicate predictions
+        const abort = new AbortController();
+        res.on('close', () => {
+            if (!res.writableEnded) {
+                abort.abort();
+            }
+        });
         // Call Python service
         console.log('🔄 Calling Python service...');
         const response = await axios_1.default.post(`${PYTHON_SERVICE_URL}/upload`, formData, {
             headers: {
                 ...formData.getHeaders(),
             },
-            timeout: 300000, // 5 minutes timeout
+            signal: abort.signal,
+            // No client timeout: the pipeline can legitimately take minutes
+            // and is bounded by its deadline on the Python side. The web
+            // interface uses /jobs and its event stream instead.
         });
         const result = response.data;
         if (result.success) {
@@ -65,11 +88,17 @@ app.post('/upload', upload.single('audio'), async (req, res) => {
                 message: 'Two-stage pipeline completed successfully',
                 abstract_image: result.abstract_image,
                 representational_image: result.representational_image,
+                abstract_variants: result.abstract_variants,
+                representational_variants: result.representational_variants,
                 features: result.features,
                 transcription: result.transcription,
+                transcription_segments: result.transcription_segments,
+                vocals: result.vocals,
+                lyric_imagery: result.lyric_imagery,
                 abstract_prompt: result.abstract_prompt,
                 representational_prompt: result.representational_prompt,
-                detected_instruments: result.detected_instruments
+                detected_instruments: result.detected_instruments,
+                service_tier: result.service_tier
             });
         }
         else {
@@ -81,6 +110,10 @@ app.post('/upload', upload.single('audio'), async (req, res) => {
         }
     }
     catch (error) {
+        if (axios_1.default.isCancel(error)) {
+            console.log('🛑 Client disconnected, upload cancelled');
+            return;
+        }
         console.error('❌ Upload error:', error);
         if (axios_1.default.isAxiosError(error)) {
             if (error.code === 'ECONNREFUSED') {
@@ -90,6 +123,7 @@ app.post('/upload', upload.single('audio'), async (req, res) => {
                 });
             }
             else if (error.response) {
+                forwardRetryAfter(error.response, res);
                 res.status(error.response.status).json({
                     success: false,
                     error: error.response.data?.error || 'Python service error'
@@ -116,6 +150,113 @@ app.post('/upload', upload.single('audio'), async (req, res) => {
         }
     }
 });
+// Start a background pipeline job; the client polls /jobs/:id for previews and the result
+app.post('/jobs', upload.single('audio'), async (req, res) => {
+    if (!req.file) {
+        return res.status(400).json({ error: 'No audio file provided' });
+    }
+    try {
+        console.log(`📁 Queuing job for file: ${req.file.originalname}`);
+        const formData = new form_data_1.default();
+        // Keep the original name; the analyzer reads hints from it
+        formData.append('audio', fs_1.default.createReadStream(req.file.path), req.file.originalname);
+        // No 'lane': browser jobs are always interactive. Trusted batch
+        // callers (run_pipeline.py) talk to the Python service directly
+        for (const field of ['variants', 'preview', 'deadline']) {
+            if (req.body[field]) {
+                formData.append(field, String(req.body[field]));
+            }
+        }
+        const response = await axios_1.default.post(`${PYTHON_SERVICE_URL}/jobs`, formData, {
+            headers: {
+                ...formData.getHeaders(),
+                // Every request reaches Python from this proxy, so name the
+                // real client for its per-client fair queueing. The id comes
+                // from the connection, never from a header the browser could set
+                'X-Client-Id': req.ip || req.socket.remoteAddress || 'anonymous',
+            },
+            timeout: 60000,
+        });
+        res.status(response.status).json(response.data);
+    }
+    catch (error) {
+        console.error('❌ Job submission error:', error);
+        if (axios_1.default.isAxiosError(error) && error.response) {
+            forwardRetryAfter(error.response, res);
+            res.status(error.response.status).json(error.response.data);
+        }
+        else {
+            res.status(503).json({
+                success: false,
+                error: 'Python service is not running. Please start the Python service first.'
+            });
+        }
+    }
+    finally {
+        if (req.file && fs_1.default.existsSync(req.file.path)) {
+            fs_1.default.unlinkSync(req.file.path);
+        }
+    }
+});
+app.get('/jobs/:id', async (req, res) => {
+    try {
+        const response = await axios_1.default.get(`${PYTHON_SERVICE_URL}/jobs/${encodeURIComponent(req.params.id)}`, {
+            timeout: 10000,
+        });
+        res.json(response.data);
+    }
+    catch (error) {
+        if (axios_1.default.isAxiosError(error) && error.response) {
+            res.status(error.response.status).json(error.response.data);
+        }
+        else {
+            res.status(503).json({ error: 'Python service is not running' });
+        }
+    }
+});
+// Cancel a queued or running job and its Replicate predictions
+app.post('/jobs/:id/cancel', async (req, res) => {
+    try {
+        const response = await axios_1.default.post(`${PYTHON_SERVICE_URL}/jobs/${encodeURIComponent(req.params.id)}/cancel`, null, {
+            timeout: 10000,
+        });
+        res.status(response.status).json(response.data);
+    }
+    catch (error) {
+        if (axios_1.default.isAxiosError(error) && error.response) {
+            res.status(error.response.status).json(error.response.data);
+        }
+        else {
+            res.status(503).json({ error: 'Python service is not running' });
+        }
+    }
+});
+// Relay a job's server-sent event stream
+app.get('/jobs/:id/events', async (req, res) => {
+    const lastEventId = req.get('Last-Event-ID');
+    try {
+        const response = await axios_1.default.get(`${PYTHON_SERVICE_URL}/jobs/${encodeURIComponent(req.params.id)}/events`, {
+            responseType: 'stream',
+            headers: lastEventId ? { 'Last-Event-ID': lastEventId } : {},
+        });
+        res.writeHead(200, {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+        });
+        response.data.pipe(res);
+        // Stop reading upstream when the browser goes away
+        req.on('close', () => response.data.destroy());
+    }
+    catch (error) {
+        if (axios_1.default.isAxiosError(error) && error.response) {
+            res.status(error.response.status).json({ error: 'Job not found' });
+        }
+        else {
+            res.status(503).json({ error: 'Python service is not running' });
+        }
+    }
+});
 // Serve images from Python service
 app.get('/images/:filename', async (req, res) => {
     try {
@@ -124,7 +265,7 @@ app.get('/images/:filename', async (req, res) => {
         const response = await axios_1.default.get(imageUrl, {
             responseType: 'stream'
         });
-        res.setHeader('Content-Type', 'image/png');
+        res.setHeader('Content-Type', response.headers['content-type'] || 'image/png');
         response.data.pipe(res);
     }
     catch (error) {
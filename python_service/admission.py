@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Sequence
+
+
+class ServiceTier:
+    """What a pipeline run does: whether it transcribes, how many stages
+    Replicate renders (the rest are drawn locally) and at what quality."""
+
+    __slots__ = ('name', 'transcribe', 'remote_stages', 'quality')
+
+    def __init__(self, name: str, transcribe: bool, remote_stages: int, quality: Optional[str]):
+        self.name = name
+        self.transcribe = transcribe
+        self.remote_stages = remote_stages
+        self.quality = quality
+
+    @property
+    def render_stage(self) -> str:
+        """Latency key of this tier's render"""
+        return f"render_{self.quality}" if self.remote_stages else 'render_local'
+
+
+# Service tiers, best first. Each drops one more costly piece of the
+# pipeline: the remote representational render (the procedural renderer
+# draws it instead), full resolution, transcription, and finally Replicate
+# altogether
+SERVICE_TIERS = (
+    ServiceTier('full', True, 2, 'full'),
+    ServiceTier('single_stage', True, 1, 'full'),
+    ServiceTier('low_res', True, 1, 'preview'),
+    ServiceTier('no_transcription', False, 1, 'preview'),
+    ServiceTier('local', False, 0, None)
+)
+
+PIPELINE_STAGES = ('queue', 'analysis', 'transcription', 'render')
+
+# Stage latencies assumed until some have been measured (seconds); queue
+# waits are kept per lane
+DEFAULT_STAGE_SECONDS = {
+    'queue_interactive': 0.0,
+    'queue_batch': 0.0,
+    'analysis': 5.0,
+    'transcription': 20.0,
+    'render_full': 40.0,
+    'render_preview': 12.0,
+    'render_local': 1.0
+}
+
+# Weight of each new measurement in a stage's moving average
+LATENCY_SMOOTHING = 0.3
+
+# A tier is chosen only if its estimate fits in this share of the time left,
+# leaving room for estimates that run short
+DEADLINE_HEADROOM = 0.8
+
+# Load is pending interactive pipelines (queued or running) per unit of
+# capacity. Above each threshold the best tier offered drops by one,
+# whatever the deadline. Batch work is queued behind interactive work by
+# the job queue, so it neither adds to the load nor is shed or degraded by it
+LOAD_THRESHOLDS = (1.0, 1.5, 2.0, 3.0)
+
+# Above this load new pipelines are refused outright
+DEFAULT_SHED_LOAD = 5.0
+
+
+class Admission:
+    """One admitted pipeline run: its tier, lane and deadline"""
+
+    __slots__ = ('tier', 'reason', 'lane', 'admitted_at', 'deadline_at', 'queued', 'released')
+
+    def __init__(self, tier: ServiceTier, reason: str, deadline: Optional[float], queued: bool,
+                 lane: str = 'interactive'):
+        self.tier = tier
+        self.reason = reason
+        self.lane = lane
+        self.admitted_at = time.time()
+        self.deadline_at = self.admitted_at + deadline if deadline else None
+        self.queued = queued
+        self.released = False
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None without one)"""
+        return None if self.deadline_at is None else self.deadline_at - time.time()
+
+    def to_dict(self):
+        return {'name': self.tier.name, 'reason': self.reason, 'degraded': self.tier is not SERVICE_TIERS[0]}
+
+
+class AdmissionController:
+    """Decides how much of the pipeline each request gets.
+
+    It counts pending pipelines and keeps moving averages of recent stage
+    latencies. A request is served the best tier allowed by the current
+    load whose estimated run time fits its deadline, is re-planned as
+    stages finish (a slow transcription can still drop the render to a
+    cheaper tier), and is refused only when the load passes shed_load.
+    """
+
+    def __init__(self, capacity: int, shed_load: float = DEFAULT_SHED_LOAD):
+        self.capacity = max(1, capacity)
+        self.shed_load = shed_load
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._latencies: Dict[str, float] = dict(DEFAULT_STAGE_SECONDS)
+        self._served = Counter()
+        self._shed = 0
+
+    def admit(self, deadline: Optional[float] = None, queued: bool = False,
+              lane: str = 'interactive', sheddable: bool = True) -> Optional[Admission]:
+        """Admit a pipeline run (queued: it waits for a job worker first); None when shed.
+
+        Work accepted before a restart is resumed with sheddable=False: it
+        may be degraded but is never refused.
+        """
+        with self._lock:
+            load = self._load()
+            floor = 0
+            if lane == 'interactive':
+                if load >= self.shed_load and sheddable:
+                    self._shed += 1
+                    return None
+                floor = sum(load > threshold for threshold in LOAD_THRESHOLDS)
+            stages = PIPELINE_STAGES if queued else PIPELINE_STAGES[1:]
+            tier = self._fit(floor, deadline, stages, lane)
+            self._pending[lane] += 1
+        index = SERVICE_TIERS.index(tier)
+        reason = 'ok' if index == 0 else 'load' if index == floor else 'deadline'
+        admission = Admission(tier, reason, deadline, queued, lane)
+        if tier is not SERVICE_TIERS[0]:
+            print(f"⚖️ Admitted at tier {tier.name} ({reason}, load {load:.2f})")
+        return admission
+
+    def replan(self, admission: Admission, stages: Sequence[str]) -> bool:
+        """Drop the admission to a cheaper tier if the stages still to run no
+        longer fit its deadline; True if the tier changed. Never upgrades."""
+        remaining = admission.remaining()
+        if remaining is None:
+            return False
+        with self._lock:
+            tier = self._fit(SERVICE_TIERS.index(admission.tier), remaining, stages, admission.lane)
+        if tier is admission.tier:
+            return False
+        print(f"⚖️ Degrading from {admission.tier.name} to {tier.name}: {remaining:.0f}s left")
+        admission.tier, admission.reason = tier, 'deadline'
+        return True
+
+    def release(self, admission: Admission):
+        """The admitted run finished (in whatever way); counts the tier it was served"""
+        with self._lock:
+            if admission.released:
+                return
+            admission.released = True
+            self._pending[admission.lane] -= 1
+            self._served[admission.tier.name] += 1
+
+    def observe(self, stage: str, seconds: float):
+        """Fold a measured stage latency (analysis, transcription, render_<quality>, queue_<lane>) into its average"""
+        with self._lock:
+            previous = self._latencies.get(stage, seconds)
+            self._latencies[stage] = previous + LATENCY_SMOOTHING * (seconds - previous)
+
+    def estimate(self, tier: ServiceTier, stages: Sequence[str] = PIPELINE_STAGES,
+                 lane: str = 'interactive') -> float:
+        """Expected seconds for a tier to run the given stages"""
+        with self._lock:
+            return self._estimate(tier, stages, lane)
+
+    def _estimate(self, tier: ServiceTier, stages: Sequence[str], lane: str) -> float:
+        seconds = 0.0
+        for stage in stages:
+            if stage == 'transcription' and not tier.transcribe:
+                continue
+            if stage == 'render':
+                stage = tier.render_stage
+            elif stage == 'queue':
+                stage = f"queue_{lane}"
+            seconds += self._latencies.get(stage, 0.0)
+        return seconds
+
+    def _fit(self, floor: int, budget: Optional[float], stages: Sequence[str], lane: str) -> ServiceTier:
+        # Best tier from floor down whose estimate fits the budget; caller holds the lock
+        for tier in SERVICE_TIERS[floor:]:
+            if budget is None or self._estimate(tier, stages, lane) <= budget * DEADLINE_HEADROOM:
+                return tier
+        return SERVICE_TIERS[-1]
+
+    def _load(self) -> float:
+        # Caller holds the lock
+        return self._pending['interactive'] / self.capacity
+
+    def stats(self):
+        with self._lock:
+            load = self._load()
+            floor = min(sum(load > threshold for threshold in LOAD_THRESHOLDS), len(SERVICE_TIERS) - 1)
+            return {
+                'pending': dict(self._pending),
+                'capacity': self.capacity,
+                'load': round(load, 2),
+                'shedding': load >= self.shed_load,
+                'best_tier': SERVICE_TIERS[floor].name,
+                'stage_seconds': {stage: round(seconds, 2) for stage, seconds in self._latencies.items()},
+                'served': dict(self._served),
+                'shed': self._shed
+            }
@@ -1,17 +1,47 @@
 import os
+import hashlib
+import json
+import mimetypes
+import select
+import shutil
+import socket
 import tempfile
-from flask import Flask, request, jsonify, send_file
+import threading
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from whisper_processor import WhisperAudioProcessor
 from replicate_image_generator import ReplicateImageGenerator
 from improved_audio_analysis import ImprovedAudioAnalyzer
+from feature_store import FeatureStore
+from audio_hash import hash_audio_file
+from seeding import seeded_random
+from jobs import JobManager
+from worker_pool import WorkerPool, parse_processes
+from job_store import JobStore
+from cancellation import CancelToken, JobCancelled
+from admission import AdmissionController, Admission, SERVICE_TIERS, DEFAULT_SHED_LOAD
+from fair_queue import LANES, parse_lane, get_prediction_slots
+from prediction_registry import PredictionRegistry
+from prompt_cache import TwoLevelCache
+from prompt_templates import get_templates
+from lyric_keyphrases import get_extractor
 from PIL import Image
 import time
 
 app = Flask(__name__)
 CORS(app)
 
+def is_serving_process():
+    """False in the processes that import this module but never serve
+    requests: the debug reloader's file watcher (python app.py always runs
+    the reloader) and, under python app.py, worker processes, which
+    re-import the main script as __mp_main__"""
+    if __name__ == '__mp_main__':
+        return False
+    reloading = app.debug or __name__ == '__main__'
+    return not reloading or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -20,50 +50,155 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 
+# Images per stage a client may ask for; SDXL returns up to 4 per prediction
+MAX_VARIANTS = 4
+
+# 'local' previews come from the procedural renderer, 'remote' adds a
+# low-step Replicate render before the full-quality one
+PREVIEW_MODES = ('none', 'local', 'remote')
+
+# Idle event streams send a comment this often
+SSE_HEARTBEAT_SECONDS = 15
+
+# Pipelines still running this long after submission are cancelled along
+# with their predictions (0 disables); clients may ask for less
+DEADLINE_SECONDS = float(os.getenv('JOB_DEADLINE_SECONDS', '600'))
+
+# A synchronous upload's connection is checked for a hang-up this often
+DISCONNECT_POLL_SECONDS = 1
+
+# Response status for requests the client abandoned (nginx's convention)
+CLIENT_CLOSED_REQUEST = 499
+
+# Clients refused while the service sheds load are told to retry after this long
+SHED_RETRY_AFTER_SECONDS = 30
+
 # Initialize processors
-audio_processor = WhisperAudioProcessor()
+# Replicate calls REPLICATE_WEBHOOK_URL (this service's /replicate/webhook,
+# reachable from the internet) on completion; unset, predictions are polled
+prediction_registry = PredictionRegistry(os.getenv('REPLICATE_WEBHOOK_URL'), os.getenv('REPLICATE_WEBHOOK_SECRET'))
+audio_processor = WhisperAudioProcessor(registry=prediction_registry)
 improved_analyzer = ImprovedAudioAnalyzer()
+feature_store = FeatureStore(os.getenv('FEATURE_STORE_DIR', 'feature_store'))
 replicate_key = os.getenv('REPLICATE_API_KEY')
 if replicate_key:
-    image_generator = ReplicateImageGenerator(api_key=replicate_key)
+    image_generator = ReplicateImageGenerator(api_key=replicate_key, registry=prediction_registry)
 else:
-    image_generator = ReplicateImageGenerator()
+    image_generator = ReplicateImageGenerator(registry=prediction_registry)
+# WORKER_PROCESSES=N (or 'auto', one per core) moves analysis and procedural
+# rendering into N worker processes so concurrent pipelines use every core;
+# the reloader's file watcher never serves, so it starts none
+WORKER_PROCESSES = parse_processes(os.getenv('WORKER_PROCESSES'))
+worker_pool = WorkerPool(WORKER_PROCESSES) if WORKER_PROCESSES and is_serving_process() else None
+# Jobs are recorded in SQLite at JOB_STORE_PATH (empty keeps them in memory
+# only) so queued and running work is resumed after a restart
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', 'jobs.sqlite3')
+job_store = JobStore(JOB_STORE_PATH) if JOB_STORE_PATH else None
+job_manager = JobManager(max_workers=int(os.getenv('JOB_WORKERS', '2')), store=job_store)
+# Pipelines mostly wait on Replicate, so a few can run at full quality at
+# once; past ADMISSION_CAPACITY pending runs they are degraded, and past
+# ADMISSION_SHED_LOAD times that refused
+admission_controller = AdmissionController(int(os.getenv('ADMISSION_CAPACITY', '4')),
+                                           float(os.getenv('ADMISSION_SHED_LOAD', DEFAULT_SHED_LOAD)))
+
+# Palettes, lyric summaries and prompts are memoized in memory, and on
+# disk under PROMPT_CACHE_DIR when it is set
+palette_cache = TwoLevelCache('palettes', directory=os.getenv('PROMPT_CACHE_DIR'))
+lyric_cache = TwoLevelCache('lyrics', directory=os.getenv('PROMPT_CACHE_DIR'))
+prompt_cache = TwoLevelCache('prompts', directory=os.getenv('PROMPT_CACHE_DIR'))
 
-def two_stage_pipeline(audio_file_path):
-    """Two-stage pipeline: colorful abstract -> representational"""
+def two_stage_pipeline(audio_file_path, variants=1, progress=None, preview='local', listener=None, cancel=None,
+                       admission=None, journal=None):
+    """Two-stage pipeline: colorful abstract -> representational, with `variants` images per stage
+
+    progress(stage, **fields) is called as the pipeline advances (the job
+    API passes one). With it, a local preview is published as soon as the
+    features are known and, for preview='remote', a low-step Replicate
+    preview once the prompts are ready. listener(event, data) receives
+    finer-grained events: analysis, transcription, prompts, Replicate
+    prediction status changes and each image as it is written. Once the
+    cancel token fires, running predictions are cancelled and JobCancelled
+    is raised at the next stage. admission (from the admission controller)
+    sets the service tier, which is re-planned against its deadline before
+    transcription and rendering. With a job journal, the transcript and
+    rendered files are checkpointed, and a resumed job reuses them instead
+    of running those stages again.
+    """
+    report = progress or (lambda stage, **fields: None)
+    notify = listener or (lambda event, data: None)
+    checkpoint = cancel.raise_if_cancelled if cancel is not None else (lambda: None)
+    base_name = os.path.splitext(os.path.basename(audio_file_path))[0]
+    if admission is None:
+        admission = Admission(SERVICE_TIERS[0], 'ok', None, False)
+    
+    def replan(stages):
+        if admission_controller.replan(admission, stages):
+            notify('tier', admission.to_dict())
     
     try:
         # Stage 1: Generate Colorful Abstract Art
         print(f"🎨 STAGE 1: Generate Colorful Abstract Art")
         
-        # Use improved analyzer for better feature extraction
-        features = improved_analyzer.analyze_audio_file(audio_file_path)
-        transcription = audio_processor.transcribe_audio(audio_file_path)
+        # Use improved analyzer for better feature extraction, reusing stored
+        # features for audio we have already analyzed
+        audio_hash = hash_audio_file(audio_file_path)
+        # Output files live in the shared working directory, so their names
+        # carry the job id (or the audio hash outside jobs); a resumed job
+        # then only ever finds files it wrote itself
+        output_name = f"{base_name}_{journal.job_id if journal is not None else audio_hash[:12]}"
+        report('analyzing')
+        started = time.time()
+        features = lookup_features(audio_hash, audio_file_path)
+        admission_controller.observe('analysis', time.time() - started)
+        notify('analysis', {'audio_hash': audio_hash, 'features': features.to_dict()})
+        
+        # The local renderers only need features and colors, so a preview
+        # can go out before the slow transcription and remote render
+        if progress and preview != 'none':
+            report('preview', previews=render_local_previews(audio_hash, output_name, features))
+        
+        checkpoint()
+        replan(('transcription', 'render'))
+        transcript = journal.checkpoint('transcription') if journal is not None else None
+        if transcript is not None:
+            print(f"⏭️ Reusing the transcript from before the restart")
+        elif admission.tier.transcribe:
+            report('transcribing')
+            started = time.time()
+            transcript = audio_processor.transcribe(audio_file_path, cancel=cancel)
+            admission_controller.observe('transcription', time.time() - started)
+            if journal is not None:
+                journal.save_checkpoint('transcription', transcript)
+        else:
+            print(f"⏭️ Skipping transcription at tier {admission.tier.name}")
+            transcript = {'text': '', 'segments': [], 'vocals': None}
+        transcription = transcript['text']
+        vocals = transcript.get('vocals')
         
-        # Detect instruments
-        detected_instruments = improved_analyzer.detect_instruments(audio_file_path, transcription)
+        # Detect instruments; measured vocal activity decides the voice entry
+        detected_instruments = improved_analyzer.detect_instruments(
+            audio_file_path, transcription, vocals['confidence'] if vocals else None)
+        imagery = lyric_imagery(transcription)
+        notify('transcription', {'transcription': transcription, 'segments': transcript['segments'],
+                                 'vocals': vocals, 'lyric_imagery': imagery,
+                                 'detected_instruments': detected_instruments})
         
         print(f"📊 Analysis: {features.get('mood', 'unknown')} mood, {features.get('energy_level', 'unknown')} energy")
         print(f"📝 Transcription: {transcription[:100]}...")
+        print(f"🔑 Lyric imagery: {imagery}")
         print(f"🎵 Detected instruments: {len(detected_instruments)} found")
         for inst in detected_instruments:
             print(f"  • {inst['name']} (confidence: {inst['confidence']:.2f})")
         if not detected_instruments:
             print(f"  • No instruments detected")
         
+        # Palette colors also drive the local renderers if image generation falls back
+        palette_colors = color_palette_for(features, detected_instruments)['final_colors']
+        
         # Create colorful abstract prompt (focus on colors, not representational)
         abstract_prompt = create_colorful_abstract_prompt(features, transcription, detected_instruments)
         print(f"🎯 Abstract Prompt: {abstract_prompt[:200]}...")
         
-        # Generate colorful abstract image
-        print("🖼️ Generating colorful abstract image...")
-        abstract_img = image_generator.generate_image(abstract_prompt)
-        
-        # Save abstract image
-        abstract_filename = f"stage1_abstract_{os.path.splitext(os.path.basename(audio_file_path))[0]}.png"
-        abstract_img.save(abstract_filename)
-        print(f"✅ Abstract image saved: {abstract_filename}")
-        
         # Stage 2: Convert to Representational
         print(f"🖼️ STAGE 2: Convert to Representational Art")
         
@@ -71,13 +206,38 @@ def two_stage_pipeline(audio_file_path):
         representational_prompt = create_representational_prompt(features, transcription, detected_instruments)
         print(f"🎯 Representational Prompt: {representational_prompt[:200]}...")
         
-        # Generate representational image
-        print("🖼️ Generating representational image...")
-        representational_img = image_generator.generate_image(representational_prompt)
+        notify('prompts', {'abstract_prompt': abstract_prompt, 'representational_prompt': representational_prompt})
+        
+        # Remote previews are extra predictions, only worth it at full service
+        if progress and preview == 'remote' and admission.tier is SERVICE_TIERS[0]:
+            remote_previews = render_remote_previews(audio_hash, output_name, [abstract_prompt, representational_prompt],
+                                                     listener, cancel)
+            if remote_previews:
+                report('preview', previews=remote_previews)
         
-        # Save representational image
-        representational_filename = f"stage2_representational_{os.path.splitext(os.path.basename(audio_file_path))[0]}.png"
-        representational_img.save(representational_filename)
+        checkpoint()
+        replan(('render',))
+        report('rendering')
+        # Generate both stages as one batch so their predictions overlap;
+        # images are written straight to disk and the extension follows the
+        # generated format
+        print(f"🖼️ Generating abstract and representational images ({variants} variant(s) each)...")
+        started = time.time()
+        rendered = journal.checkpoint('images') if journal is not None else None
+        if rendered and all(os.path.exists(filename) for files in rendered for filename in files):
+            print(f"⏭️ Reusing the images rendered before the restart")
+            abstract_files, representational_files = rendered
+        else:
+            abstract_files, representational_files = render_images(
+                admission.tier, [abstract_prompt, representational_prompt],
+                [f"stage1_abstract_{output_name}.png", f"stage2_representational_{output_name}.png"],
+                variants, [seeded_random(audio_hash, 'abstract'), seeded_random(audio_hash, 'representational')],
+                features, palette_colors, image_listener(notify), cancel)
+            admission_controller.observe(admission.tier.render_stage, time.time() - started)
+            if journal is not None:
+                journal.save_checkpoint('images', [abstract_files, representational_files])
+        abstract_filename, representational_filename = abstract_files[0], representational_files[0]
+        print(f"✅ Abstract image saved: {abstract_filename}")
         print(f"✅ Representational image saved: {representational_filename}")
         
         print(f"📤 Response includes {len(detected_instruments)} detected instruments")
@@ -87,11 +247,18 @@ def two_stage_pipeline(audio_file_path):
             'success': True,
             'abstract_image': abstract_filename,
             'representational_image': representational_filename,
-            'features': features,
+            'abstract_variants': abstract_files,
+            'representational_variants': representational_files,
+            'features': features.to_dict(),
+            'audio_hash': audio_hash,
             'transcription': transcription,
+            'transcription_segments': transcript['segments'],
+            'vocals': vocals,
+            'lyric_imagery': imagery,
             'abstract_prompt': abstract_prompt,
             'representational_prompt': representational_prompt,
-            'detected_instruments': detected_instruments
+            'detected_instruments': detected_instruments,
+            'service_tier': admission.to_dict()
         }
         
     except Exception as e:
@@ -101,70 +268,248 @@ def two_stage_pipeline(audio_file_path):
             'error': str(e)
         }
 
-def create_colorful_abstract_prompt(features, transcription, detected_instruments=None):
-    """Create a prompt focused on colorful abstract art"""
-    
-    # Get color palette from improved analyzer
-    color_palette = improved_analyzer.generate_color_palette(features, detected_instruments)
-    
-    # Build colorful abstract prompt
-    prompt_parts = []
-    
-    # Color emphasis
-    if color_palette['final_colors']:
-        prompt_parts.append(f"COLORFUL ABSTRACT ARTWORK featuring {', '.join(color_palette['final_colors'])}")
-        prompt_parts.append(f"Color style: {color_palette['description']}")
+def render_images(tier, prompts, filenames, variants, rngs, features, colors, listener=None, cancel=None):
+    """Render each stage's images, per prompt: the tier's first remote_stages
+    with Replicate at its quality, the rest with the procedural renderer"""
+    remote = tier.remote_stages
+    files = []
+    if remote:
+        files += image_generator.generate_image_files(
+            prompts[:remote], filenames[:remote], variants=variants, rngs=rngs[:remote],
+            features=features, colors=colors, quality=tier.quality, listener=listener, cancel=cancel)
+    if remote < len(prompts):
+        def local_listener(event, data):
+            if event == 'image':
+                data = {**data, 'prompt_index': data['prompt_index'] + remote}
+            listener(event, data)
+        files += generate_local_files(prompts[remote:], filenames[remote:], variants, rngs[remote:], features, colors,
+                                      local_listener if listener else None, cancel)
+    return files
+
+def generate_local_files(prompts, filenames, variants, rngs, features, colors, listener=None, cancel=None):
+    """Procedural images per prompt; in worker mode each prompt is rendered by its own worker process"""
+    if worker_pool is None:
+        return image_generator.generate_image_files(prompts, filenames, variants=variants, rngs=rngs,
+                                                    features=features, colors=colors, backend='procedural',
+                                                    listener=listener, cancel=cancel)
+    results = worker_pool.map('render', [([prompt], [filename], variants, [rng], features, colors)
+                                         for prompt, filename, rng in zip(prompts, filenames, rngs)], cancel=cancel)
+    files = [paths for result in results for paths in result]
+    if listener:
+        for prompt_index, paths in enumerate(files):
+            for variant, path in enumerate(paths):
+                listener('image', {'prompt_index': prompt_index, 'variant': variant, 'path': path})
+    return files
+
+def render_local_previews(audio_hash, output_name, features):
+    """Procedural previews of both stages; takes a fraction of a second"""
+    # Instruments are not known yet, so the palette comes from features alone
+    colors = color_palette_for(features, [])['final_colors']
+    abstract_files, representational_files = generate_local_files(
+        ['abstract preview', 'representational preview'],
+        [f"preview_stage1_abstract_{output_name}.png", f"preview_stage2_representational_{output_name}.png"],
+        1, [seeded_random(audio_hash, 'abstract'), seeded_random(audio_hash, 'representational')],
+        features, colors)
+    return {
+        'abstract_image': abstract_files[0],
+        'representational_image': representational_files[0],
+        'quality': 'local'
+    }
+
+def image_listener(notify):
+    """Forward generator events, naming the stage and URL of each finished image"""
+    stage_names = ('abstract', 'representational')
+    def forward(event, data):
+        if event == 'image':
+            data = {**data, 'stage': stage_names[data['prompt_index']],
+                    'url': f"/images/{os.path.basename(data['path'])}"}
+        notify(event, data)
+    return forward
+
+def render_remote_previews(audio_hash, output_name, prompts, listener=None, cancel=None):
+    """Small low-step Replicate previews, or None when Replicate is unavailable or fails"""
+    replicate_backend = image_generator.backends['replicate']['backend']
+    if not replicate_backend.is_available():
+        return None
+    abstract_file, representational_file = replicate_backend.generate_many_to_files(
+        prompts,
+        [f"preview_hq_stage1_abstract_{output_name}.png", f"preview_hq_stage2_representational_{output_name}.png"],
+        [seeded_random(audio_hash, 'abstract'), seeded_random(audio_hash, 'representational')],
+        quality='preview', listener=listener, cancel=cancel)
+    if abstract_file is None or representational_file is None:
+        return None
+    return {
+        'abstract_image': abstract_file,
+        'representational_image': representational_file,
+        'quality': 'preview'
+    }
+
+def run_pipeline_job(job, filepath, variants, preview, admission):
+    """Job body: run the pipeline with progress reported on the job"""
+    # Time spent queued is known now; the tier is re-planned against what is left
+    admission_controller.observe(f"queue_{job.lane}", job.queue_wait or 0.0)
+    if admission_controller.replan(admission, ('analysis', 'transcription', 'render')):
+        job.emit('tier', admission.to_dict())
+    return two_stage_pipeline(filepath, variants=variants, preview=preview,
+                              progress=lambda stage, **fields: job.update(stage=stage, **fields),
+                              listener=job.emit, cancel=job.cancel_token, admission=admission,
+                              journal=job.journal)
+
+def submit_pipeline_job(filepath, variants, preview, admission, lane, client, deadline, record=None):
+    """Queue run_pipeline_job, storing what resume_jobs needs to queue it again after a restart"""
+    params = {'filepath': filepath, 'variants': variants, 'preview': preview,
+              'deadline_at': admission.deadline_at}
     
-    # Mood and energy
-    mood = features.get('mood', 'balanced')
-    energy = features.get('energy_level', 'medium')
-    prompt_parts.append(f"Abstract art with {mood} mood and {energy} energy")
+    def finished(job):
+        # Runs however the job ended, including cancelled before it started
+        admission_controller.release(admission)
+        shutil.rmtree(os.path.dirname(filepath), ignore_errors=True)
     
-    # Abstract style instructions
-    prompt_parts.append("FLUID and ORGANIC abstract forms")
-    prompt_parts.append("FLOWING and DYNAMIC composition")
-    prompt_parts.append("RICH SATURATED COLORS")
-    prompt_parts.append("NO BLACK AND WHITE")
-    prompt_parts.append("VIBRANT and INTENSE colors")
+    return job_manager.submit(run_pipeline_job, filepath, variants, preview, admission,
+                              lane=lane, client=client, cost=variants, deadline=deadline,
+                              on_done=finished, params=params, record=record)
+
+def resume_jobs():
+    """Re-queue the jobs a previous run of the service left unfinished.
+
+    Each keeps its id, lane, client and deadline (a deadline that passed
+    during the downtime cancels it at once) and resumes from its last
+    checkpoint, re-attaching to the Replicate predictions it had started.
+    """
+    for record in job_manager.load():
+        params = record['params'] or {}
+        if not os.path.exists(params.get('filepath', '')):
+            print(f"❌ Cannot resume job {record['id']}: its upload is gone")
+            job_manager.submit(lambda job: {'success': False, 'error': 'Upload lost in a restart'},
+                               lane=record['lane'], client=record['client'], params=params, record=record)
+            continue
+        deadline = None
+        if params.get('deadline_at'):
+            deadline = max(params['deadline_at'] - time.time(), 0.001)
+        admission = admission_controller.admit(deadline, queued=True, lane=record['lane'], sheddable=False)
+        submit_pipeline_job(params['filepath'], params['variants'], params['preview'], admission,
+                            record['lane'], record['client'], deadline, record=record)
+
+def parse_deadline(value):
+    """Seconds a pipeline may run: the client's value, capped at DEADLINE_SECONDS (None for no limit)"""
+    try:
+        requested = float(value)
+    except (TypeError, ValueError):
+        requested = 0
+    if requested > 0 and DEADLINE_SECONDS > 0:
+        return min(requested, DEADLINE_SECONDS)
+    return requested if requested > 0 else DEADLINE_SECONDS or None
+
+def watch_disconnect(cancel):
+    """Cancel when the client of the current request hangs up; returns a function that stops watching.
+
+    Only servers that expose the connection (werkzeug, gunicorn) can be
+    watched; elsewhere this does nothing.
+    """
+    connection = request.environ.get('werkzeug.socket') or request.environ.get('gunicorn.socket')
+    if connection is None:
+        return lambda: None
+    stopped = threading.Event()
     
-    # Add transcription if available
-    if transcription and transcription.strip():
-        prompt_parts.append(f"Audio content: '{transcription.strip()}'")
+    def watch():
+        while not stopped.wait(DISCONNECT_POLL_SECONDS):
+            try:
+                # The body has been read, so a readable socket with nothing
+                # to peek at is a closed one
+                readable, _, _ = select.select([connection], [], [], 0)
+                if readable and not connection.recv(1, socket.MSG_PEEK):
+                    cancel.cancel('client disconnected')
+                    return
+            except (OSError, ValueError):
+                return
     
-    return " | ".join(prompt_parts)
+    threading.Thread(target=watch, name='disconnect-watch', daemon=True).start()
+    return stopped.set
+
+def overloaded_response():
+    """503 for a request refused while shedding load"""
+    response = jsonify({'error': 'Service overloaded, try again later', 'load': admission_controller.stats()})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(SHED_RETRY_AFTER_SECONDS)
+    return response
+
+def client_id():
+    """Who a request is from, for fair queueing: X-Client-Id (set by the
+    Node backend, which proxies everyone), else the form's client field,
+    else the peer address"""
+    return request.headers.get('X-Client-Id') or request.form.get('client') or request.remote_addr or 'anonymous'
+
+def parse_variants(value):
+    """Requested variants per stage, clamped to 1..MAX_VARIANTS"""
+    try:
+        return min(max(int(value), 1), MAX_VARIANTS)
+    except (TypeError, ValueError):
+        return 1
+
+def lookup_features(audio_hash, audio_file_path):
+    """Return stored features for this audio, analyzing and storing them on a miss"""
+    features = feature_store.get(audio_hash)
+    # The analyzer reads hints from the file name, so the same audio
+    # uploaded under another name has to be re-analyzed
+    if features is not None and features.file_name == os.path.basename(audio_file_path):
+        print(f"🗄️ Using stored features for {audio_hash[:12]}")
+        return features
+    # Workers only analyze; the store is written here, by one process
+    if worker_pool is not None:
+        features = worker_pool.call('analyze', audio_file_path)
+    else:
+        features = improved_analyzer.analyze_audio_file(audio_file_path)
+    feature_store.put(audio_hash, features)
+    return features
+
+def color_palette_for(features, detected_instruments=None):
+    """Palette colors and description for these features, memoized across requests"""
+    def compute():
+        palette = improved_analyzer.generate_color_palette(features, detected_instruments)
+        return {'final_colors': palette['final_colors'], 'description': palette['description']}
+    return palette_cache.get_or_compute(improved_analyzer.palette_key(features, detected_instruments), compute)
+
+def lyric_imagery(transcription):
+    """A few visual phrases standing in for the transcription, memoized per transcript hash"""
+    text = (transcription or '').strip()
+    extractor = get_extractor()
+    key = (extractor.version, hashlib.sha256(text.encode('utf-8')).hexdigest())
+    return lyric_cache.get_or_compute(key, lambda: extractor.summarize(text))
+
+def cached_prompt(kind, build, features, transcription, detected_instruments=None):
+    """build(features, transcription, detected_instruments), memoized on the inputs prompt builders read"""
+    key = (
+        kind,
+        get_templates().version,
+        improved_analyzer.palette_key(features, detected_instruments),
+        lyric_imagery(transcription)
+    )
+    return prompt_cache.get_or_compute(key, lambda: build(features, transcription, detected_instruments))
+
+def create_colorful_abstract_prompt(features, transcription, detected_instruments=None):
+    """Create a prompt focused on colorful abstract art"""
+    return cached_prompt('abstract', build_colorful_abstract_prompt, features, transcription, detected_instruments)
 
 def create_representational_prompt(features, transcription, detected_instruments=None):
     """Create a prompt focused on representational art"""
-    
-    # Get color palette from improved analyzer
-    color_palette = improved_analyzer.generate_color_palette(features, detected_instruments)
-    
-    # Build representational prompt
-    prompt_parts = []
-    
-    # Color emphasis
-    if color_palette['final_colors']:
-        prompt_parts.append(f"REPRESENTATIONAL IMAGE featuring {', '.join(color_palette['final_colors'])}")
-        prompt_parts.append(f"Color style: {color_palette['description']}")
-    
-    # Mood and energy
-    mood = features.get('mood', 'balanced')
-    energy = features.get('energy_level', 'medium')
-    prompt_parts.append(f"Representational art with {mood} mood and {energy} energy")
-    
-    # Representational style instructions
-    prompt_parts.append("CONCRETE SCENES with RECOGNIZABLE OBJECTS")
-    prompt_parts.append("REALISTIC and REPRESENTATIONAL imagery")
-    prompt_parts.append("NO ABSTRACT ART")
-    prompt_parts.append("CREATE CONCRETE SCENES WITH REAL OBJECTS")
-    # prompt_parts.append("RICH SATURATED COLORS")
-    # prompt_parts.append("NO BLACK AND WHITE")
-    
-    # Add transcription if available
-    if transcription and transcription.strip():
-        prompt_parts.append(f"Audio content: '{transcription.strip()}'")
-    
-    return " | ".join(prompt_parts)
+    return cached_prompt('representational', build_representational_prompt, features, transcription, detected_instruments)
+
+def build_colorful_abstract_prompt(features, transcription, detected_instruments=None):
+    """Build the colorful abstract prompt (uncached)"""
+    return render_prompt('abstract', features, transcription, detected_instruments)
+
+def build_representational_prompt(features, transcription, detected_instruments=None):
+    """Build the representational prompt (uncached)"""
+    return render_prompt('representational', features, transcription, detected_instruments)
+
+def render_prompt(template, features, transcription, detected_instruments=None):
+    color_palette = color_palette_for(features, detected_instruments)
+    return get_templates().render(
+        template, features,
+        colors=', '.join(color_palette['final_colors']),
+        palette_description=color_palette['description'],
+        transcription=lyric_imagery(transcription)
+    )
 
 @app.route('/upload', methods=['POST'])
 def upload_audio():
@@ -178,6 +523,13 @@ def upload_audio():
         return jsonify({'error': 'No file selected'}), 400
     
     if file:
+        # The tier served depends on load and the deadline; past the shedding
+        # point the request is refused before any work is done
+        deadline = parse_deadline(request.form.get('deadline'))
+        admission = admission_controller.admit(deadline)
+        if admission is None:
+            return overloaded_response()
+        
         try:
             # Save uploaded file
             filename = secure_filename(file.filename)
@@ -186,8 +538,18 @@ def upload_audio():
             
             print(f"📁 File uploaded: {filename}")
             
-            # Run two-stage pipeline
-            result = two_stage_pipeline(filepath)
+            # Run two-stage pipeline; a client that hangs up or a passed
+            # deadline cancels it along with its predictions
+            cancel = CancelToken()
+            stop_watching = watch_disconnect(cancel)
+            timer = cancel.cancel_after(deadline) if deadline else None
+            try:
+                result = two_stage_pipeline(filepath, variants=parse_variants(request.form.get('variants')),
+                                            cancel=cancel, admission=admission)
+            finally:
+                stop_watching()
+                if timer is not None:
+                    timer.cancel()
             
             if result['success']:
                 return jsonify({
@@ -195,11 +557,18 @@ def upload_audio():
                     'message': 'Two-stage pipeline completed successfully',
                     'abstract_image': result['abstract_image'],
                     'representational_image': result['representational_image'],
+                    'abstract_variants': result['abstract_variants'],
+                    'representational_variants': result['representational_variants'],
                     'features': result['features'],
+                    'audio_hash': result['audio_hash'],
                     'transcription': result['transcription'],
+                    'transcription_segments': result['transcription_segments'],
+                    'vocals': result['vocals'],
+                    'lyric_imagery': result['lyric_imagery'],
                     'abstract_prompt': result['abstract_prompt'],
                     'representational_prompt': result['representational_prompt'],
-                    'detected_instruments': result.get('detected_instruments', [])
+                    'detected_instruments': result.get('detected_instruments', []),
+                    'service_tier': result['service_tier']
                 })
             else:
                 return jsonify({
@@ -207,31 +576,161 @@ def upload_audio():
                     'error': result['error']
                 }), 500
                 
+        except JobCancelled as e:
+            print(f"🛑 Upload cancelled: {e}")
+            return jsonify({'error': f'Cancelled: {e}'}), CLIENT_CLOSED_REQUEST
         except Exception as e:
             return jsonify({'error': f'Processing error: {str(e)}'}), 500
         finally:
+            admission_controller.release(admission)
             # Clean up uploaded file
             if os.path.exists(filepath):
                 os.remove(filepath)
     
     return jsonify({'error': 'File processing failed'}), 500
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Start the pipeline in the background; poll GET /jobs/<job_id> for previews and the result"""
+    
+    if 'audio' not in request.files:
+        return jsonify({'error': 'No audio file provided'}), 400
+    
+    file = request.files['audio']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    preview = request.form.get('preview', 'local')
+    if preview not in PREVIEW_MODES:
+        return jsonify({'error': f"preview must be one of {', '.join(PREVIEW_MODES)}"}), 400
+    
+    # Interactive jobs come before batch ones, and clients take turns within a lane
+    lane = parse_lane(request.form.get('lane'))
+    if lane is None:
+        return jsonify({'error': f"lane must be one of {', '.join(LANES)}"}), 400
+    
+    deadline = parse_deadline(request.form.get('deadline'))
+    admission = admission_controller.admit(deadline, queued=True, lane=lane)
+    if admission is None:
+        return overloaded_response()
+    
+    # Each job gets its own upload directory; the analyzer reads hints from
+    # the original file name, so it cannot be made unique
+    job_dir = tempfile.mkdtemp(dir=app.config['UPLOAD_FOLDER'])
+    filepath = os.path.join(job_dir, secure_filename(file.filename))
+    file.save(filepath)
+    print(f"📁 File uploaded for job: {os.path.basename(filepath)}")
+    
+    # A job's cost in its client's turns is the images it renders per stage
+    variants = parse_variants(request.form.get('variants'))
+    job = submit_pipeline_job(filepath, variants, preview, admission, lane, client_id(), deadline)
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'lane': job.lane,
+        'status': job.status,
+        'service_tier': admission.to_dict(),
+        'status_url': f"/jobs/{job.id}",
+        'cancel_url': f"/jobs/{job.id}/cancel"
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status with any previews so far and, once finished, the pipeline result"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job and its Replicate predictions"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status in ('succeeded', 'failed'):
+        return jsonify({'error': f'Job already {job.status}', **job.to_dict()}), 409
+    # The job settles as 'cancelled' once its worker reaches a checkpoint
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent event stream of a job's progress; replays from Last-Event-ID on reconnect"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except ValueError:
+        last_id = 0
+    
+    def stream(last_id):
+        while True:
+            events, finished = job.events_after(last_id, timeout=SSE_HEARTBEAT_SECONDS)
+            for event in events:
+                last_id = event['id']
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+            if finished and not events:
+                return
+            if not events:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+    
+    return Response(stream(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/replicate/webhook', methods=['POST'])
+def replicate_webhook():
+    """Prediction status callbacks from Replicate"""
+    if not prediction_registry.verify(request.headers, request.get_data()):
+        return jsonify({'error': 'Invalid signature'}), 401
+    status_data = request.get_json(silent=True)
+    if not isinstance(status_data, dict) or 'id' not in status_data:
+        return jsonify({'error': 'Expected a prediction object'}), 400
+    prediction_registry.deliver(status_data)
+    return '', 204
+
 @app.route('/images/<filename>')
 def get_image(filename):
     """Serve generated images"""
     try:
-        return send_file(filename, mimetype='image/png')
+        mimetype = mimetypes.guess_type(filename)[0] or 'image/png'
+        return send_file(filename, mimetype=mimetype)
     except FileNotFoundError:
         return jsonify({'error': 'Image not found'}), 404
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Cache hit rates, per-lane queue waits and Replicate slots, prediction, feature and job store counters,
+    and worker process health"""
+    return jsonify({
+        'caches': {cache.name: cache.stats() for cache in (palette_cache, lyric_cache, prompt_cache)},
+        'jobs': job_manager.stats(),
+        'queue': job_manager.queue_stats(),
+        'replicate_slots': get_prediction_slots().stats(),
+        'admission': admission_controller.stats(),
+        'predictions': prediction_registry.stats(),
+        'feature_store': feature_store.stats(),
+        'job_store': job_store.stats() if job_store is not None else None,
+        'workers': worker_pool.stats() if worker_pool is not None else None,
+        'timestamp': time.time()
+    })
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; 'degraded' while a worker process is down or silent"""
     return jsonify({
-        'status': 'ok',
+        'status': 'ok' if worker_pool is None or worker_pool.healthy() else 'degraded',
         'service': 'audio-to-image-python',
-        'timestamp': time.time()
+        'timestamp': time.time(),
+        'load': admission_controller.stats(),
+        'predictions': prediction_registry.stats(),
+        'workers': worker_pool.stats() if worker_pool is not None else None
     })
 
+# Resumed on import, so gunicorn and flask run pick unfinished jobs up too
+if is_serving_process():
+    resume_jobs()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True) 
\ No newline at end of file
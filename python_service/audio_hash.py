@@ -0,0 +1,13 @@
+import hashlib
+
+# Read in 1 MB chunks so large uploads are never held in memory at once
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_audio_file(audio_path: str) -> str:
+    """SHA-256 hex digest of an audio file's contents"""
+    digest = hashlib.sha256()
+    with open(audio_path, 'rb') as audio_file:
+        for chunk in iter(lambda: audio_file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,213 @@
+import io
+import mimetypes
+import os
+import shutil
+import subprocess
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Whisper works on 16 kHz mono, so audio is resampled to it before upload
+WHISPER_SAMPLE_RATE = 16000
+
+# ffmpeg's decoded PCM is read from its pipe in blocks of this many bytes,
+# and decoding stops with an error past MAX_DECODE_SECONDS of audio, so a
+# long or hostile upload cannot grow the decoded copy without limit
+DECODE_BLOCK_BYTES = 256 * 1024
+MAX_DECODE_SECONDS = 2 * 60 * 60
+
+# Leading and trailing stretches quieter than TRIM_SILENCE_RATIO of the
+# track's loud level are cut before upload, keeping TRIM_PADDING_SECONDS
+# so the first and last words stay whole
+TRIM_SILENCE_RATIO = 0.01
+TRIM_PADDING_SECONDS = 0.25
+
+# Upload encodings: pydub export arguments and the MIME type they produce.
+# FLAC is lossless at about a tenth of CD-quality WAV, Opus smaller again;
+# both need ffmpeg, so encoding falls back to WAV without it
+UPLOAD_FORMATS = {
+    'flac': ({'format': 'flac'}, 'audio/flac'),
+    'opus': ({'format': 'ogg', 'codec': 'libopus', 'bitrate': '24k'}, 'audio/ogg'),
+    'wav': ({'format': 'wav'}, 'audio/wav')
+}
+DEFAULT_UPLOAD_FORMAT = 'flac'
+
+# MIME types of uploads that are sent as they are because they could not be decoded
+_SOURCE_MIME_TYPES = {
+    '.m4a': 'audio/mp4', '.mp4': 'audio/mp4', '.aac': 'audio/aac', '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav', '.flac': 'audio/flac', '.ogg': 'audio/ogg', '.opus': 'audio/ogg',
+    '.webm': 'audio/webm'
+}
+
+# Long audio is cut near every CHUNK_SECONDS, at the quietest point within
+# SPLIT_SEARCH_SECONDS of the target, and neighbours overlap by
+# CHUNK_OVERLAP_SECONDS so words at a cut are heard whole by one of them
+CHUNK_SECONDS = 60.0
+SPLIT_SEARCH_SECONDS = 10.0
+CHUNK_OVERLAP_SECONDS = 1.0
+
+# Loudness is measured over frames of this length when looking for silence
+FRAME_SECONDS = 0.1
+
+
+class AudioChunk:
+    """A span of the source audio, plus the part of it whose transcript is kept.
+
+    start/end include the overlap with the neighbouring chunks; keep_start/
+    keep_end are the cut points, so each moment is kept by exactly one chunk.
+    """
+
+    __slots__ = ('index', 'start', 'end', 'keep_start', 'keep_end')
+
+    def __init__(self, index: int, start: float, end: float, keep_start: float, keep_end: float):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.keep_start = keep_start
+        self.keep_end = keep_end
+
+    def to_dict(self):
+        return {'index': self.index, 'start': self.start, 'end': self.end,
+                'keep_start': self.keep_start, 'keep_end': self.keep_end}
+
+
+def load_audio(audio_path: str, sample_rate: Optional[int] = None):
+    """Decode an audio file to a pydub AudioSegment.
+
+    With sample_rate and ffmpeg on the PATH, ffmpeg downmixes and resamples
+    while it decodes and its 16-bit PCM is streamed in blocks, so memory
+    only ever holds the mono result (32 KB a second at 16 kHz), never the
+    full-rate source. Otherwise pydub decodes the whole file (without
+    ffmpeg, WAV only) and converts it afterwards.
+    """
+    # Imported here so the service starts without ffmpeg; only decoding needs it
+    from pydub import AudioSegment
+    ffmpeg = shutil.which('ffmpeg')
+    if sample_rate and ffmpeg:
+        return AudioSegment(data=decode_pcm(ffmpeg, audio_path, sample_rate), sample_width=2,
+                            frame_rate=sample_rate, channels=1)
+    audio = AudioSegment.from_file(audio_path)
+    if sample_rate:
+        audio = audio.set_channels(1).set_frame_rate(sample_rate)
+    return audio
+
+
+def decode_pcm(ffmpeg: str, audio_path: str, sample_rate: int,
+               max_seconds: float = MAX_DECODE_SECONDS) -> bytes:
+    """16-bit little-endian mono PCM at sample_rate, decoded by ffmpeg and read in blocks"""
+    command = [ffmpeg, '-nostdin', '-v', 'error', '-i', audio_path, '-vn',
+               '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', 'pipe:']
+    limit = int(max_seconds * sample_rate) * 2
+    blocks, size = [], 0
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        while True:
+            block = process.stdout.read(DECODE_BLOCK_BYTES)
+            if not block:
+                break
+            size += len(block)
+            if size > limit:
+                process.kill()
+                raise ValueError(f"Audio is longer than {max_seconds / 60:.0f} minutes")
+            blocks.append(block)
+        # With -v error ffmpeg only writes a line or two, so stderr cannot fill its pipe
+        error = process.stderr.read().decode('utf-8', errors='replace').strip()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {process.returncode}: {error[-300:]}")
+    return b''.join(blocks)
+
+
+def mono_samples(audio) -> np.ndarray:
+    """The audio's samples as float32 in [-1, 1], channels averaged"""
+    samples = np.asarray(audio.get_array_of_samples(), dtype=np.float32)
+    if audio.channels > 1:
+        samples = samples.reshape(-1, audio.channels).mean(axis=1)
+    return samples / float(1 << (8 * audio.sample_width - 1))
+
+
+def frame_loudness(samples: np.ndarray, sample_rate: int, frame_seconds: float = FRAME_SECONDS) -> np.ndarray:
+    """RMS level of each consecutive frame (the tail shorter than a frame is ignored)"""
+    frame_length = max(1, int(sample_rate * frame_seconds))
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    return np.sqrt(np.mean(np.square(frames), axis=1))
+
+
+def silence_bounds(audio, silence_ratio: float = TRIM_SILENCE_RATIO,
+                   padding: float = TRIM_PADDING_SECONDS) -> Tuple[float, float]:
+    """Start and end (seconds) of the audio without its leading and trailing silence"""
+    duration = len(audio) / 1000.0
+    loudness = frame_loudness(mono_samples(audio), audio.frame_rate)
+    loud = np.flatnonzero(loudness > np.percentile(loudness, 95) * silence_ratio) if len(loudness) else []
+    if len(loud) == 0:
+        return 0.0, duration
+    start = max(0.0, float(loud[0]) * FRAME_SECONDS - padding)
+    end = min(duration, float(loud[-1] + 1) * FRAME_SECONDS + padding)
+    # The tail shorter than a frame is never measured, so it is kept when the last frame is
+    if loud[-1] == len(loudness) - 1:
+        end = duration
+    return round(start, 3), round(end, 3)
+
+
+def find_split_points(loudness: np.ndarray, duration: float, chunk_seconds: float = CHUNK_SECONDS,
+                      search_seconds: float = SPLIT_SEARCH_SECONDS,
+                      frame_seconds: float = FRAME_SECONDS) -> List[float]:
+    """Cut times near every chunk_seconds, each moved to the quietest frame within search_seconds"""
+    splits = []
+    target = chunk_seconds
+    while target < duration - chunk_seconds / 4:
+        low = max(0, int((target - search_seconds) / frame_seconds))
+        high = min(len(loudness), int((target + search_seconds) / frame_seconds) + 1)
+        if high > low:
+            # Middle of the quietest frame
+            split = (low + int(np.argmin(loudness[low:high])) + 0.5) * frame_seconds
+        else:
+            split = target
+        if splits and split <= splits[-1]:
+            split = target
+        splits.append(round(split, 3))
+        target = split + chunk_seconds
+    return splits
+
+
+def plan_chunks(duration: float, splits: List[float], overlap: float = CHUNK_OVERLAP_SECONDS) -> List[AudioChunk]:
+    """Overlapping chunks between consecutive split points"""
+    bounds = [0.0] + list(splits) + [duration]
+    return [
+        AudioChunk(index, max(0.0, keep_start - overlap), min(duration, keep_end + overlap), keep_start, keep_end)
+        for index, (keep_start, keep_end) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+
+def chunk_audio(audio, chunk_seconds: float = CHUNK_SECONDS,
+                overlap: float = CHUNK_OVERLAP_SECONDS) -> Optional[List[AudioChunk]]:
+    """Chunks for audio longer than one chunk, cut at quiet points; None when it fits in one"""
+    duration = len(audio) / 1000.0
+    if duration <= chunk_seconds * 1.25:
+        return None
+    loudness = frame_loudness(mono_samples(audio), audio.frame_rate)
+    return plan_chunks(duration, find_split_points(loudness, duration, chunk_seconds), overlap)
+
+
+def encode_audio(audio, start: float = 0.0, end: float = None, upload_format: str = DEFAULT_UPLOAD_FORMAT,
+                 sample_rate: int = WHISPER_SAMPLE_RATE) -> Tuple[bytes, str]:
+    """A span of the audio as 16-bit mono at sample_rate, encoded for upload; (bytes, MIME type)"""
+    clip = audio[int(start * 1000):None if end is None else int(end * 1000)]
+    clip = clip.set_channels(1).set_frame_rate(sample_rate).set_sample_width(2)
+    export_args, mime_type = UPLOAD_FORMATS[upload_format]
+    buffer = io.BytesIO()
+    try:
+        clip.export(buffer, **export_args)
+    except Exception as e:
+        if upload_format == 'wav':
+            raise
+        print(f"⚠️ Could not encode {upload_format} ({e}), uploading WAV instead")
+        return encode_audio(clip, upload_format='wav', sample_rate=sample_rate)
+    return buffer.getvalue(), mime_type
+
+
+def source_mime_type(audio_path: str) -> str:
+    """MIME type of an audio file, from its extension"""
+    extension = os.path.splitext(audio_path)[1].lower()
+    return _SOURCE_MIME_TYPES.get(extension) or mimetypes.guess_type(audio_path)[0] or 'application/octet-stream'
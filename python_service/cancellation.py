@@ -0,0 +1,102 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+class JobCancelled(BaseException):
+    """Raised in a job's threads once its cancel token fires.
+
+    A BaseException (like KeyboardInterrupt) so the pipeline's many
+    `except Exception` fallbacks do not swallow it and carry on with the
+    next backend or service.
+    """
+
+
+class CancelToken:
+    """Cancellation shared by everything working for one job or request.
+
+    Code that starts a Replicate prediction tracks it here with a function
+    that cancels it remotely; cancel() calls those for every prediction
+    still running and wakes anything waiting on the token, so polling
+    stops at once instead of running out its timeout. lane is the queue
+    lane of the work, whose Replicate concurrency cap its predictions count
+    against; journal, for durable jobs, is the job's JobJournal, through
+    which predictions are started so a resumed job re-attaches to them.
+    """
+
+    def __init__(self, lane: str = 'interactive', journal: Any = None):
+        self.lane = lane
+        self.journal = journal
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        # prediction id -> function that cancels it
+        self._predictions: Dict[str, Callable[[], None]] = {}
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled') -> bool:
+        """Cancel tracked predictions and wake waiters; False if already cancelled"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            predictions = list(self._predictions.items())
+            callbacks = list(self._callbacks)
+        for prediction_id, cancel_prediction in predictions:
+            self._cancel_prediction(prediction_id, cancel_prediction)
+        for callback in callbacks:
+            callback()
+        return True
+
+    def track(self, prediction_id: str, cancel_prediction: Callable[[], None]):
+        """Remember a running prediction; one started after cancel() is cancelled straight away"""
+        with self._lock:
+            if not self._event.is_set():
+                self._predictions[prediction_id] = cancel_prediction
+                return
+        self._cancel_prediction(prediction_id, cancel_prediction)
+
+    def untrack(self, prediction_id: str):
+        with self._lock:
+            self._predictions.pop(prediction_id, None)
+
+    def _cancel_prediction(self, prediction_id: str, cancel_prediction: Callable[[], None]):
+        print(f"🛑 Cancelling prediction {prediction_id} ({self.reason})")
+        try:
+            cancel_prediction()
+        except Exception as e:
+            print(f"⚠️ Could not cancel prediction {prediction_id}: {e}")
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Call callback on cancel (at once if already cancelled)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel_after(self, seconds: float, cancel: Callable[[str], Any] = None,
+                     reason: str = 'deadline exceeded') -> threading.Timer:
+        """Start a timer that calls cancel(reason) (by default this token's) after seconds"""
+        timer = threading.Timer(seconds, cancel or self.cancel, args=(reason,))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def sleep(self, seconds: float):
+        """time.sleep that ends early, raising JobCancelled, when the token fires"""
+        if self._event.wait(seconds):
+            self.raise_if_cancelled()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
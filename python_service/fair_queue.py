@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from cancellation import CancelToken
+
+# Interactive uploads come from people waiting on the page; batch jobs
+# (run_pipeline.py --server) can wait
+LANES = ('interactive', 'batch')
+DEFAULT_LANE = 'interactive'
+
+# Lanes are served in weighted round robin: out of every five jobs started
+# while both have work, four are interactive. An idle lane's share goes to
+# the other, so batch work still drains when nobody is uploading
+LANE_WEIGHTS = {'interactive': 4, 'batch': 1}
+
+# Within a lane, clients take turns by deficit round robin: each turn a
+# client earns this much credit and a job costs its image count, so a
+# client asking for four variants per track gets a quarter of the tracks
+DEFICIT_QUANTUM = 1
+
+# Replicate predictions each lane may have in flight at once
+DEFAULT_REPLICATE_CONCURRENCY = {'interactive': 8, 'batch': 2}
+
+# Queue waits kept per lane for the percentiles in stats()
+WAIT_SAMPLES = 500
+
+# A wait for a Replicate slot checks the job's cancel token this often
+SLOT_POLL_SECONDS = 0.5
+
+
+def parse_lane(value: Optional[str]) -> Optional[str]:
+    """A lane name from a request (default interactive), or None if unknown"""
+    lane = (value or DEFAULT_LANE).strip().lower()
+    return lane if lane in LANES else None
+
+
+class _Lane:
+    """Per-client FIFOs of one lane, with the round robin state over them"""
+
+    __slots__ = ('clients', 'deficits', 'depth', 'waits', 'dequeued', 'total_wait', 'max_wait')
+
+    def __init__(self):
+        # client -> its queued (item, cost, enqueued_at); clients with work, in turn order
+        self.clients: 'OrderedDict[str, Deque[Tuple[Any, float, float]]]' = OrderedDict()
+        self.deficits: Dict[str, float] = {}
+        self.depth = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.dequeued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def pop(self) -> Tuple[Any, float]:
+        """Next item by deficit round robin; (item, enqueued_at). The lane must not be empty"""
+        while True:
+            client, items = next(iter(self.clients.items()))
+            _, cost, _ = items[0]
+            if self.deficits[client] >= cost:
+                item, cost, enqueued_at = items.popleft()
+                self.deficits[client] -= cost
+                self.depth -= 1
+                if not items:
+                    # A client that runs dry leaves the rotation and its credit lapses
+                    del self.clients[client], self.deficits[client]
+                return item, enqueued_at
+            # Out of credit: top up and go to the back of the line
+            self.deficits[client] += DEFICIT_QUANTUM
+            self.clients.move_to_end(client)
+
+    def record_wait(self, seconds: float):
+        self.waits.append(seconds)
+        self.dequeued += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+        return {
+            'depth': self.depth,
+            'clients': len(self.clients),
+            'dequeued': self.dequeued,
+            'wait_mean': round(self.total_wait / self.dequeued, 3) if self.dequeued else 0.0,
+            'wait_p50': round(waits[len(waits) // 2], 3) if waits else 0.0,
+            'wait_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+            'wait_max': round(self.max_wait, 3)
+        }
+
+
+class FairQueue:
+    """Blocking job queue that is fair across lanes and, within a lane, across clients.
+
+    Lanes take turns by weighted round robin (LANE_WEIGHTS); clients within
+    a lane by deficit round robin on job cost. One client's 500-track batch
+    therefore delays another client's upload by at most a turn, not by
+    the whole batch.
+    """
+
+    def __init__(self, weights: Dict[str, int] = None):
+        self.weights = dict(weights or LANE_WEIGHTS)
+        self._lanes = {lane: _Lane() for lane in LANES}
+        self._changed = threading.Condition()
+        # Lanes in the order they are served in one round, e.g. 4x interactive then batch
+        self._schedule = [lane for lane in LANES for _ in range(max(1, self.weights.get(lane, 1)))]
+        self._turn = 0
+
+    def put(self, item: Any, lane: str = DEFAULT_LANE, client: str = 'anonymous', cost: float = 1):
+        with self._changed:
+            queue = self._lanes[lane]
+            if client not in queue.clients:
+                queue.clients[client] = deque()
+                queue.deficits[client] = 0.0
+            queue.clients[client].append((item, max(cost, 0), time.time()))
+            queue.depth += 1
+            self._changed.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Any, str, float]]:
+        """Wait for the next item; (item, lane, seconds it waited), or None on timeout"""
+        with self._changed:
+            if not self._changed.wait_for(self._has_work, timeout):
+                return None
+            # The next lane in the weighted schedule that has work
+            for offset in range(len(self._schedule)):
+                lane = self._schedule[(self._turn + offset) % len(self._schedule)]
+                if self._lanes[lane].depth:
+                    self._turn = (self._turn + offset + 1) % len(self._schedule)
+                    break
+            queue = self._lanes[lane]
+            item, enqueued_at = queue.pop()
+            waited = time.time() - enqueued_at
+            queue.record_wait(waited)
+            return item, lane, waited
+
+    def _has_work(self) -> bool:
+        return any(queue.depth for queue in self._lanes.values())
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._changed:
+            return {lane: {'weight': self.weights.get(lane, 1), **queue.stats()} for lane, queue in self._lanes.items()}
+
+
+class PredictionSlots:
+    """Caps the Replicate predictions each lane has in flight.
+
+    The lane comes from the job's cancel token; work without one (scripts,
+    tests) counts as interactive. Waiting for a slot ends early, with
+    JobCancelled, if the token fires.
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = dict(limits)
+        self._semaphores = {lane: threading.BoundedSemaphore(limit) for lane, limit in self.limits.items()}
+        self._lock = threading.Lock()
+        self._in_flight = {lane: 0 for lane in self.limits}
+        self._waited = {lane: 0 for lane in self.limits}
+
+    @contextmanager
+    def slot(self, cancel: CancelToken = None):
+        lane = cancel.lane if cancel is not None else DEFAULT_LANE
+        semaphore = self._semaphores[lane]
+        if not semaphore.acquire(blocking=False):
+            with self._lock:
+                self._waited[lane] += 1
+            while not semaphore.acquire(timeout=SLOT_POLL_SECONDS):
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+            if cancel is not None and cancel.cancelled:
+                semaphore.release()
+                cancel.raise_if_cancelled()
+        with self._lock:
+            self._in_flight[lane] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[lane] -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {lane: {'limit': self.limits[lane], 'in_flight': self._in_flight[lane],
+                           'waited': self._waited[lane]} for lane in self.limits}
+
+
+@lru_cache(maxsize=1)
+def get_prediction_slots() -> PredictionSlots:
+    """Shared per-lane Replicate caps, from REPLICATE_<LANE>_CONCURRENCY"""
+    return PredictionSlots({
+        lane: max(1, int(os.getenv(f"REPLICATE_{lane.upper()}_CONCURRENCY", limit)))
+        for lane, limit in DEFAULT_REPLICATE_CONCURRENCY.items()
+    })
@@ -0,0 +1,225 @@
+import base64
+import hashlib
+import hmac
+import io
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+import requests
+from PIL import Image
+
+# Signing secret used when none is given; set REPLICATE_WEBHOOK_SECRET to the same value
+DEFAULT_WEBHOOK_SECRET = 'whsec_' + base64.b64encode(b'fake-replicate-signing-key').decode('ascii')
+
+# Predictions start processing after this long, then take `seconds` to finish
+START_DELAY_SECONDS = 0.2
+
+# Webhooks that the service does not answer within this long are counted as failed
+WEBHOOK_TIMEOUT = 10
+
+# Transcript returned by every Whisper prediction
+FAKE_TRANSCRIPTION = 'hello from the fake replicate server'
+
+
+def _fake_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 80, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class FakeReplicate:
+    """A local stand-in for the Replicate predictions API.
+
+    Point the service at it with REPLICATE_API_BASE=<url>/v1. Predictions
+    with an 'audio' input behave like Whisper, all others like an image
+    model whose outputs are served by this server. Each prediction sends a
+    signed 'start' webhook, then succeeds after `seconds` and sends its
+    'completed' webhook, unless drop_ratio says to lose it so the service's
+    sweeper has to poll for the result instead. Predictions live for the
+    life of the process, so a restarted service can re-attach to them.
+    """
+
+    def __init__(self, port: int = 0, seconds: float = 1.0, drop_ratio: float = 0.0,
+                 secret: Optional[str] = DEFAULT_WEBHOOK_SECRET):
+        self.seconds = seconds
+        self.drop_ratio = drop_ratio
+        self.secret = secret
+        self._predictions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._counts = {'predictions': 0, 'status_requests': 0, 'canceled': 0,
+                        'webhooks_sent': 0, 'webhooks_dropped': 0, 'webhooks_failed': 0}
+        self._png = _fake_png()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> 'FakeReplicate':
+        """Serve on a daemon thread"""
+        threading.Thread(target=self.server.serve_forever, name='fake-replicate', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    # Predictions
+    def _create(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prediction_id = uuid.uuid4().hex[:20]
+        inputs = body.get('input', {})
+        if 'audio' in inputs:
+            output = {'transcription': FAKE_TRANSCRIPTION,
+                      'segments': [{'start': 0.0, 'end': 2.0, 'text': FAKE_TRANSCRIPTION}]}
+        else:
+            output = [f"{self.url}/files/{prediction_id}/{index}.png"
+                      for index in range(int(inputs.get('num_outputs', 1)))]
+        prediction = {'id': prediction_id, 'status': 'starting', 'input': inputs, 'output': None,
+                      'error': None, 'created_at': time.time()}
+        with self._lock:
+            self._predictions[prediction_id] = prediction
+            self._counts['predictions'] += 1
+        events = body.get('webhook_events_filter') or ['start', 'output', 'logs', 'completed']
+        threading.Thread(target=self._run, args=(prediction_id, output, body.get('webhook'), events),
+                         name=f'fake-prediction-{prediction_id}', daemon=True).start()
+        return self._public(prediction)
+
+    def _run(self, prediction_id: str, output: Any, webhook: Optional[str], events):
+        time.sleep(START_DELAY_SECONDS)
+        if not self._advance(prediction_id, 'processing'):
+            return
+        if 'start' in events:
+            self._send_webhook(webhook, prediction_id)
+        time.sleep(self.seconds)
+        if not self._advance(prediction_id, 'succeeded', output):
+            return
+        if 'completed' not in events:
+            return
+        if random.random() < self.drop_ratio:
+            self._count('webhooks_dropped')
+            print(f"🕳️ Dropped completion webhook for {prediction_id}")
+            return
+        self._send_webhook(webhook, prediction_id)
+
+    def _advance(self, prediction_id: str, status: str, output: Any = None) -> bool:
+        """Move a prediction on unless it was canceled meanwhile"""
+        with self._lock:
+            prediction = self._predictions[prediction_id]
+            if prediction['status'] == 'canceled':
+                return False
+            prediction['status'] = status
+            if output is not None:
+                prediction['output'] = output
+            return True
+
+    def _cancel(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            prediction = self._predictions.get(prediction_id)
+            if prediction is None:
+                return None
+            if prediction['status'] not in ('succeeded', 'failed', 'canceled'):
+                prediction['status'] = 'canceled'
+                self._counts['canceled'] += 1
+        return self._public(prediction)
+
+    def _get(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        self._count('status_requests')
+        with self._lock:
+            prediction = self._predictions.get(prediction_id)
+        return self._public(prediction) if prediction is not None else None
+
+    def _public(self, prediction: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            return {**prediction, 'urls': {'get': f"{self.url}/v1/predictions/{prediction['id']}",
+                                           'cancel': f"{self.url}/v1/predictions/{prediction['id']}/cancel"}}
+
+    # Webhooks
+    def _send_webhook(self, webhook: Optional[str], prediction_id: str):
+        """POST the prediction to the webhook URL, signed the way Replicate signs it"""
+        if not webhook:
+            return
+        prediction = self._public(self._predictions[prediction_id])
+        body = json.dumps(prediction).encode('utf-8')
+        webhook_id = f"msg_{uuid.uuid4().hex}"
+        timestamp = str(int(time.time()))
+        headers = {'Content-Type': 'application/json', 'webhook-id': webhook_id, 'webhook-timestamp': timestamp}
+        if self.secret:
+            key = base64.b64decode(self.secret.split('_', 1)[-1])
+            signed = f"{webhook_id}.{timestamp}.".encode('utf-8') + body
+            headers['webhook-signature'] = 'v1,' + base64.b64encode(
+                hmac.new(key, signed, hashlib.sha256).digest()).decode('ascii')
+        try:
+            response = requests.post(webhook, data=body, headers=headers, timeout=WEBHOOK_TIMEOUT)
+            response.raise_for_status()
+            self._count('webhooks_sent')
+        except requests.RequestException as error:
+            self._count('webhooks_failed')
+            print(f"⚠️ Webhook for {prediction_id} ({prediction['status']}) failed: {error}")
+
+    # HTTP
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, payload: Any = None, content_type: str = 'application/json'):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                parts = self.path.strip('/').split('/')
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if parts == ['v1', 'predictions']:
+                    return self._reply(201, fake._create(body))
+                if len(parts) == 4 and parts[:2] == ['v1', 'predictions'] and parts[3] == 'cancel':
+                    prediction = fake._cancel(parts[2])
+                    return self._reply(200, prediction) if prediction else self._reply(404, {'detail': 'Not found'})
+                self._reply(404, {'detail': 'Not found'})
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                if len(parts) == 3 and parts[:2] == ['v1', 'predictions']:
+                    prediction = fake._get(parts[2])
+                    return self._reply(200, prediction) if prediction else self._reply(404, {'detail': 'Not found'})
+                if len(parts) == 3 and parts[0] == 'files':
+                    return self._reply(200, fake._png, 'image/png')
+                self._reply(404, {'detail': 'Not found'})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # python fake_replicate.py [port] [seconds] [drop ratio] serves a fake
+    # Replicate API; a drop ratio of 1 loses every completion webhook so the
+    # sweeper has to find them
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5002
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    drop_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    fake = FakeReplicate(port, seconds, drop_ratio)
+    print(f"🧪 Fake Replicate on {fake.url}: predictions take {seconds}s, "
+          f"{drop_ratio:.0%} of completion webhooks dropped")
+    print(f"   REPLICATE_API_BASE={fake.url}/v1")
+    print(f"   REPLICATE_WEBHOOK_SECRET={fake.secret}")
+    print("   REPLICATE_WEBHOOK_URL=http://127.0.0.1:5001/replicate/webhook")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {fake.stats()}")
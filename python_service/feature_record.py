@@ -0,0 +1,303 @@
+import json
+from typing import Dict, Any, Iterator, List, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; JSON is always available
+    msgpack = None
+
+# Bump whenever a field is added, removed or changes meaning. Serialized
+# records carry the version so cached features from older builds can be
+# recognised (and re-analyzed) instead of silently mixed with new ones.
+SCHEMA_VERSION = 1
+
+# Stable, ordered schema shared by ImprovedAudioAnalyzer and
+# SimpleEnhancedAudioProcessor. Fields an analyzer does not produce stay None.
+FEATURE_SCHEMA: Tuple[Tuple[str, type], ...] = (
+    # File information
+    ('file_name', str),
+    ('file_size', int),
+    ('duration', float),
+    ('format', str),
+    ('sample_rate', int),
+    ('channels', int),
+    ('bit_depth', int),
+    # Core characteristics (both analyzers)
+    ('mood', str),
+    ('energy_level', str),
+    ('musical_style', str),
+    ('complexity', str),
+    ('estimated_tempo', int),
+    ('spectral_centroid', float),
+    ('brightness', str),
+    ('dynamic_range', float),
+    ('energy_variance', float),
+    # Structure
+    ('energy_peaks', int),
+    ('peak_density', float),
+    ('musical_sections', tuple),
+    ('structure_complexity', float),
+    ('energy_distribution', str),
+    # Spectral
+    ('spectral_rolloff', float),
+    ('zero_crossing_rate', float),
+    ('texture', str),
+    ('harmonic_content', str),
+    ('frequency_balance', str),
+    # Rhythm
+    ('rhythm_regularity', float),
+    ('strong_beats', int),
+    ('weak_beats', int),
+    ('syncopation', float),
+    ('rhythm_complexity', str),
+    ('timing_precision', str),
+    ('groove_factor', float),
+    # Dynamics
+    ('volume_variance', float),
+    ('volume_curve', str),
+    ('expression', str),
+    ('dynamic_characteristics', str),
+    ('compression_level', str),
+    # Harmony
+    ('harmonic_complexity', str),
+    ('chord_progression', str),
+    ('melodic_characteristics', str),
+    ('tonal_center', str),
+    ('harmonic_movement', str),
+    # Higher-level interpretation
+    ('detected_genre', str),
+    ('sophistication_level', str),
+    ('emotional_depth', str),
+    ('artistic_intent', str),
+    ('musical_innovation', str),
+    ('emotional_tone', str),
+    ('artistic_style', str),
+)
+
+FEATURE_FIELDS: Tuple[str, ...] = tuple(name for name, _ in FEATURE_SCHEMA)
+FEATURE_TYPES: Dict[str, type] = dict(FEATURE_SCHEMA)
+
+
+def _coerce(name: str, value: Any) -> Any:
+    """Coerce a raw analyzer value to the schema type of a field"""
+    if value is None:
+        return None
+    field_type = FEATURE_TYPES[name]
+    if field_type is tuple:
+        return tuple(value)
+    if field_type is float:
+        return float(value)
+    if field_type is int:
+        return int(value)
+    return str(value)
+
+
+class AudioFeatures:
+    """Immutable, slotted record of analyzed audio features.
+
+    Supports the read-only mapping methods prompt builders already use
+    (``features.get('mood')``, ``features['energy_level']``) so it can be
+    passed anywhere the old feature dicts were.
+    """
+
+    __slots__ = FEATURE_FIELDS + ('_key',)
+
+    def __init__(self, **values: Any):
+        unknown = set(values) - set(FEATURE_TYPES)
+        if unknown:
+            raise TypeError(f"Unknown feature fields: {', '.join(sorted(unknown))}")
+        for name in FEATURE_FIELDS:
+            object.__setattr__(self, name, _coerce(name, values.get(name)))
+        object.__setattr__(self, '_key', None)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("AudioFeatures is immutable; use replace() to derive a new record")
+
+    def __delattr__(self, name: str):
+        raise AttributeError("AudioFeatures is immutable")
+
+    def __reduce__(self):
+        # Pickled (e.g. to and from worker processes) through the constructor,
+        # since __setattr__ refuses the default restore of slot state
+        return (_from_fields, (self.items(),))
+
+    # Mapping-style read access
+    def get(self, name: str, default: Any = None) -> Any:
+        """Return a field value, or default if the field is unset or unknown"""
+        if name not in FEATURE_TYPES:
+            return default
+        value = getattr(self, name)
+        return default if value is None else value
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in FEATURE_TYPES or getattr(self, name) is None:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in FEATURE_TYPES and getattr(self, name) is not None
+
+    def keys(self) -> List[str]:
+        return [name for name in FEATURE_FIELDS if getattr(self, name) is not None]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(name, getattr(self, name)) for name in self.keys()]
+
+    # Identity
+    def as_tuple(self) -> Tuple[Any, ...]:
+        """All field values in schema order (None for unset fields)"""
+        return tuple(getattr(self, name) for name in FEATURE_FIELDS)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, AudioFeatures):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    def __hash__(self) -> int:
+        key = self._key
+        if key is None:
+            key = hash((SCHEMA_VERSION,) + self.as_tuple())
+            object.__setattr__(self, '_key', key)
+        return key
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={value!r}" for name, value in self.items())
+        return f"AudioFeatures({fields})"
+
+    def replace(self, **changes: Any) -> 'AudioFeatures':
+        """Return a copy with some fields changed"""
+        values = dict(zip(FEATURE_FIELDS, self.as_tuple()))
+        values.update(changes)
+        return AudioFeatures(**values)
+
+    # Serialization
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AudioFeatures':
+        """Build a record from an analyzer dict, ignoring keys outside the schema"""
+        return cls(**{name: data[name] for name in FEATURE_FIELDS if name in data})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict of the set fields, suitable for JSON responses"""
+        return {
+            name: list(value) if isinstance(value, tuple) else value
+            for name, value in self.items()
+        }
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Versioned serialization payload"""
+        return {'schema_version': SCHEMA_VERSION, 'features': self.to_dict()}
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> 'AudioFeatures':
+        """Load a versioned payload; raises ValueError for a different schema version"""
+        version = payload.get('schema_version')
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"Feature schema version {version} does not match {SCHEMA_VERSION}")
+        return cls.from_dict(payload.get('features', {}))
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_payload(), separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data: str) -> 'AudioFeatures':
+        return cls.from_payload(json.loads(data))
+
+    def to_msgpack(self) -> bytes:
+        """Compact binary serialization (requires the optional msgpack package)"""
+        if msgpack is None:
+            raise ImportError("msgpack is not installed; use to_json() instead")
+        # Positional row keeps the payload small; the version pins the field order
+        return msgpack.packb([SCHEMA_VERSION, list(self.as_tuple())], use_bin_type=True)
+
+    @classmethod
+    def from_msgpack(cls, data: bytes) -> 'AudioFeatures':
+        if msgpack is None:
+            raise ImportError("msgpack is not installed; use from_json() instead")
+        version, row = msgpack.unpackb(data, raw=False)
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"Feature schema version {version} does not match {SCHEMA_VERSION}")
+        return cls(**dict(zip(FEATURE_FIELDS, row)))
+
+
+def _from_fields(items: List[Tuple[str, Any]]) -> AudioFeatures:
+    """Unpickle an AudioFeatures record"""
+    return AudioFeatures(**dict(items))
+
+
+# NumPy dtypes used for the columnar form of each schema type
+_COLUMN_DTYPES = {str: np.str_, int: np.int64, float: np.float64, tuple: object}
+
+
+def map_column(keys: np.ndarray, table: Dict[Any, Any], default: Any) -> np.ndarray:
+    """Map an array of keys through a dict, touching each distinct key once"""
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    return np.array([table.get(key, default) for key in distinct.tolist()])[inverse.reshape(-1)]
+
+
+class FeatureTable:
+    """Columnar batch of features: one NumPy array per schema field.
+
+    Only the columns an analyzer produces are present. Rows convert back to
+    AudioFeatures on demand, so batch results plug into the same prompt
+    builders as per-file analysis.
+    """
+
+    __slots__ = ('columns', 'length')
+
+    def __init__(self, columns: Dict[str, Any]):
+        unknown = set(columns) - set(FEATURE_TYPES)
+        if unknown:
+            raise TypeError(f"Unknown feature columns: {', '.join(sorted(unknown))}")
+        self.columns = {}
+        self.length = None
+        # Keep schema order so tables from different sources line up
+        for name in FEATURE_FIELDS:
+            if name not in columns:
+                continue
+            column = self._as_column(name, columns[name])
+            if self.length is None:
+                self.length = len(column)
+            elif len(column) != self.length:
+                raise ValueError(f"Column '{name}' has {len(column)} rows, expected {self.length}")
+            self.columns[name] = column
+        if self.length is None:
+            self.length = 0
+
+    @staticmethod
+    def _as_column(name: str, values: Any) -> np.ndarray:
+        dtype = _COLUMN_DTYPES[FEATURE_TYPES[name]]
+        if dtype is object:
+            column = np.empty(len(values), dtype=object)
+            column[:] = [tuple(value) for value in values]
+            return column
+        return np.asarray(values, dtype=dtype)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def column(self, name: str) -> np.ndarray:
+        """The array for one field"""
+        return self.columns[name]
+
+    def row(self, index: int) -> AudioFeatures:
+        """One row as an AudioFeatures record"""
+        return AudioFeatures(**{name: column[index] for name, column in self.columns.items()})
+
+    def rows(self) -> Iterator[AudioFeatures]:
+        for index in range(self.length):
+            yield self.row(index)
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """Column name -> list of plain Python values (JSON friendly)"""
+        return {
+            name: [list(value) for value in column] if column.dtype == object else column.tolist()
+            for name, column in self.columns.items()
+        }
+
+    @classmethod
+    def from_records(cls, records: List[AudioFeatures]) -> 'FeatureTable':
+        """Build a table from records, keeping the columns every record sets"""
+        names = [name for name in FEATURE_FIELDS if all(record.get(name) is not None for record in records)]
+        return cls({name: [getattr(record, name) for record in records] for name in names})
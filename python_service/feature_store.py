@@ -0,0 +1,296 @@
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from feature_record import AudioFeatures, FeatureTable, FEATURE_FIELDS, FEATURE_TYPES, SCHEMA_VERSION
+
+# Pending records are folded into a new columnar segment once this many
+# have accumulated in the journal
+DEFAULT_COMPACT_THRESHOLD = 256
+
+# Compaction also merges segments: once more than MAX_GROUP_SEGMENTS share a
+# field set, the smaller half of them are rewritten as one, and a segment
+# whose superseded rows reach RECLAIM_RATIO is rewritten with its live rows
+# only, so lookups touch few segments and replaced features free their space
+MAX_GROUP_SEGMENTS = 8
+RECLAIM_RATIO = 0.5
+
+MANIFEST_FILE = 'manifest.json'
+JOURNAL_FILE = 'pending.jsonl'
+KEYS_FILE = 'keys.npy'
+SEGMENT_PREFIX = 'segment-'
+
+
+class _Segment:
+    """One immutable directory of .npy columns, opened memory-mapped"""
+
+    __slots__ = ('name', 'keys', 'columns', 'live')
+
+    def __init__(self, path: str, name: str):
+        self.name = name
+        self.keys = np.load(os.path.join(path, KEYS_FILE), mmap_mode='r')
+        self.columns = {
+            field: np.load(os.path.join(path, f"{field}.npy"), mmap_mode='r')
+            for field in FEATURE_FIELDS
+            if os.path.exists(os.path.join(path, f"{field}.npy"))
+        }
+        # Rows superseded by a later put() are masked out of column scans
+        self.live = np.ones(len(self.keys), dtype=bool)
+
+    def record(self, row: int) -> AudioFeatures:
+        values = {}
+        for field, column in self.columns.items():
+            value = column[row].item()
+            values[field] = json.loads(value) if FEATURE_TYPES[field] is tuple else value
+        return AudioFeatures(**values)
+
+
+class FeatureStore:
+    """Persistent columnar store of analyzed features keyed by audio hash.
+
+    New features go to an append-only JSONL journal; every
+    ``compact_threshold`` records the journal is rewritten as a segment of
+    one .npy file per column. Segments are memory-mapped, so scanning a
+    column across the catalogue does not load the other fields.
+    """
+
+    def __init__(self, root: str = 'feature_store', compact_threshold: int = DEFAULT_COMPACT_THRESHOLD):
+        self.root = root
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._pending: Dict[str, AudioFeatures] = {}
+        # Segment numbers are never reused, so a merge cannot overwrite a
+        # segment the manifest on disk still lists
+        self._next_segment = 0
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # Loading
+    def _load(self):
+        manifest_path = os.path.join(self.root, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get('schema_version') != SCHEMA_VERSION:
+                print(f"⚠️ Feature store schema {manifest.get('schema_version')} is outdated, starting fresh")
+                self._reset(manifest.get('segments', []))
+                return
+            for name in manifest.get('segments', []):
+                self._add_segment(_Segment(os.path.join(self.root, name), name))
+        self._remove_unlisted_segments()
+
+        journal_path = os.path.join(self.root, JOURNAL_FILE)
+        if os.path.exists(journal_path):
+            with open(journal_path) as journal:
+                for line in journal:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        self._stage(entry['key'], AudioFeatures.from_payload(entry['payload']))
+                    except (ValueError, KeyError) as e:
+                        # A torn last line from a crash mid-append; skip it
+                        print(f"⚠️ Skipping unreadable feature journal entry: {e}")
+
+        print(f"🗄️ Feature store: {len(self)} tracks ({len(self._segments)} segments, {len(self._pending)} pending)")
+
+    def _reset(self, segment_names: List[str]):
+        """Delete the store's own files: the manifest, the journal and the listed segments"""
+        for name in segment_names:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        for name in (MANIFEST_FILE, JOURNAL_FILE):
+            path = os.path.join(self.root, name)
+            if os.path.exists(path):
+                os.remove(path)
+        self._remove_unlisted_segments()
+
+    def _remove_unlisted_segments(self):
+        # Left by a compaction that crashed before (or a merge that crashed
+        # after) writing the manifest; their rows are in the journal or in
+        # the listed segments
+        listed = {segment.name for segment in self._segments}
+        for entry in os.listdir(self.root):
+            if entry.startswith(SEGMENT_PREFIX) and entry not in listed:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+    def _add_segment(self, segment: _Segment):
+        position = len(self._segments)
+        self._segments.append(segment)
+        self._next_segment = max(self._next_segment, int(segment.name[len(SEGMENT_PREFIX):]) + 1)
+        for row, key in enumerate(segment.keys.tolist()):
+            self._supersede(key)
+            self._index[key] = (position, row)
+
+    def _supersede(self, key: str):
+        """Mask the current segment row for a key, if any"""
+        location = self._index.pop(key, None)
+        if location is not None:
+            position, row = location
+            self._segments[position].live[row] = False
+
+    def _reindex(self):
+        self._index = {}
+        for position, segment in enumerate(self._segments):
+            keys = segment.keys.tolist()
+            for row in np.flatnonzero(segment.live).tolist():
+                self._index[keys[row]] = (position, row)
+
+    def _stage(self, key: str, features: AudioFeatures):
+        self._supersede(key)
+        self._pending[key] = features
+
+    # Lookups
+    def __len__(self) -> int:
+        return len(self._index) + len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending or key in self._index
+
+    def get(self, key: str) -> Optional[AudioFeatures]:
+        """Stored features for an audio hash, or None"""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            location = self._index.get(key)
+            if location is None:
+                return None
+            position, row = location
+            return self._segments[position].record(row)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._index) + list(self._pending)
+
+    def column(self, name: str) -> np.ndarray:
+        """One field across every stored track (tracks missing it are skipped)"""
+        if name not in FEATURE_TYPES:
+            raise KeyError(name)
+        with self._lock:
+            parts = [segment.columns[name][segment.live] for segment in self._segments if name in segment.columns]
+            pending = [getattr(features, name) for features in self._pending.values() if getattr(features, name) is not None]
+        if pending:
+            parts.append(FeatureTable({name: pending}).column(name))
+        if not parts:
+            return np.array([])
+        if FEATURE_TYPES[name] is tuple:
+            parts = [np.array([tuple(json.loads(value)) for value in part.tolist()], dtype=object)
+                     if part.dtype != object else part for part in parts]
+        return np.concatenate(parts)
+
+    # Writes
+    def put(self, key: str, features: AudioFeatures):
+        """Store features for an audio hash, replacing any earlier entry"""
+        with self._lock:
+            entry = json.dumps({'key': key, 'payload': features.to_payload()}, separators=(',', ':'))
+            with open(os.path.join(self.root, JOURNAL_FILE), 'a') as journal:
+                journal.write(entry + '\n')
+            self._stage(key, features)
+            if len(self._pending) >= self.compact_threshold:
+                self._compact()
+
+    def compact(self):
+        """Fold pending journal entries into columnar segments"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        if not self._pending:
+            return
+        # Analyzers fill different subsets of the schema; write one segment
+        # per subset so no field has to invent a missing value
+        groups: Dict[Tuple[str, ...], List[Tuple[str, AudioFeatures]]] = {}
+        for key, features in self._pending.items():
+            groups.setdefault(tuple(features.keys()), []).append((key, features))
+
+        for fields, entries in groups.items():
+            table = FeatureTable.from_records([features for _, features in entries])
+            columns = {}
+            for field in fields:
+                column = table.column(field)
+                if FEATURE_TYPES[field] is tuple:
+                    # Keep every column plain (non-pickled) so it can be memory-mapped
+                    column = np.array([json.dumps(list(value)) for value in column], dtype=np.str_)
+                columns[field] = column
+            segment = self._write_segment(np.array([key for key, _ in entries], dtype=np.str_), columns)
+            for key, _ in entries:
+                del self._pending[key]
+            self._add_segment(segment)
+
+        merged = self._merge_segments()
+        self._write_manifest()
+        # Everything in the journal now lives in segments, and merged
+        # segments are no longer listed
+        open(os.path.join(self.root, JOURNAL_FILE), 'w').close()
+        for segment in merged:
+            shutil.rmtree(os.path.join(self.root, segment.name), ignore_errors=True)
+
+    def _write_segment(self, keys: np.ndarray, columns: Dict[str, np.ndarray]) -> _Segment:
+        """Write keys and their columns (in stored form) as a new segment directory"""
+        name = f"{SEGMENT_PREFIX}{self._next_segment:05d}"
+        self._next_segment += 1
+        final_path = os.path.join(self.root, name)
+        staging_path = final_path + '.tmp'
+        # Leftovers from a compaction that crashed before the manifest
+        # was written; their rows are still in the journal
+        for stale in (staging_path, final_path):
+            if os.path.exists(stale):
+                shutil.rmtree(stale)
+        os.makedirs(staging_path)
+        np.save(os.path.join(staging_path, KEYS_FILE), keys)
+        for field, column in columns.items():
+            np.save(os.path.join(staging_path, f"{field}.npy"), column)
+        os.replace(staging_path, final_path)
+        return _Segment(final_path, name)
+
+    def _merge_segments(self) -> List[_Segment]:
+        """Rewrite the live rows of crowded or mostly superseded segments; returns the segments replaced"""
+        groups: Dict[Tuple[str, ...], List[_Segment]] = {}
+        for segment in self._segments:
+            groups.setdefault(tuple(segment.columns), []).append(segment)
+
+        replaced = []
+        for fields, segments in groups.items():
+            if len(segments) > MAX_GROUP_SEGMENTS:
+                by_size = sorted(segments, key=lambda segment: int(segment.live.sum()))
+                victims = by_size[:len(segments) // 2 + 1]
+            else:
+                victims = [segment for segment in segments
+                           if len(segment.keys) and 1 - segment.live.mean() >= RECLAIM_RATIO]
+            if not victims:
+                continue
+            keys = np.concatenate([segment.keys[segment.live] for segment in victims])
+            self._segments = [segment for segment in self._segments if all(segment is not victim for victim in victims)]
+            if len(keys):
+                columns = {field: np.concatenate([segment.columns[field][segment.live] for segment in victims])
+                           for field in fields}
+                self._segments.append(self._write_segment(keys, columns))
+            replaced += victims
+        if replaced:
+            self._reindex()
+            print(f"🗄️ Merged {len(replaced)} feature segments; {len(self._segments)} remain")
+        return replaced
+
+    def _write_manifest(self):
+        manifest = {
+            'schema_version': SCHEMA_VERSION,
+            'segments': [segment.name for segment in self._segments]
+        }
+        manifest_path = os.path.join(self.root, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'tracks': len(self._index) + len(self._pending),
+                'segments': len(self._segments),
+                'pending': len(self._pending),
+                'superseded_rows': sum(int((~segment.live).sum()) for segment in self._segments)
+            }
@@ -0,0 +1,180 @@
+import os
+import random
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from placeholder_renderer import PlaceholderRenderer, resolve_color, DEFAULT_COLORS, ENERGY_LEVELS
+
+# Base luminance of the background field per brightness class
+BRIGHTNESS_LEVELS = {'dark': 0.45, 'balanced': 0.6, 'warm': 0.65, 'bright': 0.85}
+
+
+class ImageBackend:
+    """Interface for image generation backends used by ReplicateImageGenerator.
+
+    generate() returns an image, or None so the generator can fall through
+    to the next backend in priority order.
+    """
+
+    name = 'backend'
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str, rng: random.Random, features: Dict[str, Any] = None,
+                 colors: List[str] = None, **options: Any) -> Optional[Image.Image]:
+        raise NotImplementedError
+
+    def generate_to_file(self, prompt: str, output_path: str, rng: random.Random, features: Dict[str, Any] = None,
+                         colors: List[str] = None, **options: Any) -> Optional[str]:
+        """Write an image to output_path (as PNG) and return the path, or None.
+
+        Backends whose output already arrives encoded override this to skip
+        the decode/encode round trip.
+        """
+        image = self.generate(prompt, rng, features, colors, **options)
+        if image is None:
+            return None
+        output_path = os.path.splitext(output_path)[0] + '.png'
+        image.save(output_path, format='PNG')
+        return output_path
+
+    def generate_many_to_files(self, prompts: List[str], output_paths: List[str], rngs: List[random.Random],
+                               features: Dict[str, Any] = None, colors: List[str] = None,
+                               **options: Any) -> List[Optional[str]]:
+        """generate_to_file for several items; a None entry marks an item that failed.
+
+        An on_image(position, path) option is called as each item is written.
+        Remote backends override this to batch and overlap their requests.
+        """
+        on_image = options.pop('on_image', None)
+        written = []
+        for position, (prompt, output_path, rng) in enumerate(zip(prompts, output_paths, rngs)):
+            try:
+                written.append(self.generate_to_file(prompt, output_path, rng, features, colors, **options))
+            except Exception as e:
+                print(f"❌ {self.name} backend failed: {e}")
+                written.append(None)
+            if on_image and written[-1] is not None:
+                on_image(position, written[-1])
+        return written
+
+
+class PlaceholderBackend(ImageBackend):
+    """Fast 512px blob art; the last-resort tier"""
+
+    name = 'placeholder'
+
+    def __init__(self, renderer: PlaceholderRenderer = None):
+        self.renderer = renderer or PlaceholderRenderer()
+
+    def generate(self, prompt: str, rng: random.Random, features: Dict[str, Any] = None,
+                 colors: List[str] = None, **options: Any) -> Optional[Image.Image]:
+        return self.renderer.render_for_features(features, colors, seed=rng.getrandbits(32))
+
+
+class ProceduralBackend(ImageBackend):
+    """CPU-only audio-reactive renderer: gradient field, value noise and flow-field trails.
+
+    Tempo sets the flow field's scale and trail length, energy the number of
+    trails and their intensity, brightness the base luminance, and the
+    palette every color. Needs no network and renders 1024px in a fraction
+    of a second.
+    """
+
+    name = 'procedural'
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def generate(self, prompt: str, rng: random.Random, features: Dict[str, Any] = None,
+                 colors: List[str] = None, **options: Any) -> Optional[Image.Image]:
+        features = features or {}
+        palette = np.array([resolve_color(name) for name in (colors or DEFAULT_COLORS)], dtype=np.float32) / 255
+        energy = ENERGY_LEVELS.get(features.get('energy_level', 'medium'), 0.55)
+        pace = float(np.clip((features.get('estimated_tempo', 120) - 60) / 120, 0, 1))
+        luminance = BRIGHTNESS_LEVELS.get(features.get('brightness', 'balanced'), 0.6)
+        generator = np.random.default_rng(rng.getrandbits(64))
+        return Image.fromarray(self.render(palette, energy, pace, luminance, generator), 'RGB')
+
+    def render(self, palette: np.ndarray, energy: float, pace: float, luminance: float,
+               rng: np.random.Generator) -> np.ndarray:
+        """Render an RGB uint8 array from palette colors (0-1 floats) and feature levels"""
+        size = self.size
+        # The flow field and trails live on a half-resolution grid
+        side = size // 2
+
+        # Gradient field: blend the first and last palette colors along a random direction
+        angle = rng.uniform(0, 2 * np.pi)
+        axis = np.linspace(-0.5, 0.5, size, dtype=np.float32)
+        ramp = np.clip(0.5 + np.cos(angle) * axis[None, :] + np.sin(angle) * axis[:, None], 0, 1)
+        first, last = palette[0], palette[-1]
+        base = first * (1 - ramp[..., None]) + last * ramp[..., None]
+
+        # Value noise: a few octaves of random grids, upsampled with separable
+        # interpolation matrices (two matrix products per octave)
+        noise = self._value_noise(side, rng, octaves=(4, 8, 16, 32))
+        texture = np.kron(noise, np.ones((2, 2), dtype=np.float32))[:size, :size]
+        base *= (luminance * (0.55 + 0.6 * texture))[..., None]
+
+        # Flow field: particles follow angles taken from a second noise field;
+        # faster tempos get a busier field and longer strides
+        flow = self._value_noise(side, rng, octaves=(3 + int(4 * pace), 6 + int(8 * pace)))
+        theta = flow * (4 * np.pi)
+        count = 1500 + int(6000 * energy)
+        steps = 24 + int(40 * pace)
+        stride = 1.0 + 1.5 * pace
+        x = rng.uniform(0, side - 1, count).astype(np.float32)
+        y = rng.uniform(0, side - 1, count).astype(np.float32)
+        color_index = rng.integers(0, len(palette), count)
+        cells = np.empty((steps, count), dtype=np.int64)
+        for step in range(steps):
+            xi, yi = x.astype(np.int64), y.astype(np.int64)
+            cells[step] = yi * side + xi
+            heading = theta[yi, xi]
+            x = np.clip(x + np.cos(heading) * stride, 0, side - 1)
+            y = np.clip(y + np.sin(heading) * stride, 0, side - 1)
+
+        # Deposit every visited cell once per channel with a single bincount
+        flat_cells = cells.ravel()
+        particle_colors = palette[np.tile(color_index, steps)]
+        trails = np.stack([
+            np.bincount(flat_cells, weights=particle_colors[:, channel], minlength=side * side)
+            for channel in range(3)
+        ], axis=-1).reshape(side, side, 3).astype(np.float32)
+        density = np.bincount(flat_cells, minlength=side * side).reshape(side, side).astype(np.float32)
+        glow = 1 - np.exp(-density * (0.25 + 0.5 * energy))
+        trails = trails / np.maximum(density, 1)[..., None] * glow[..., None]
+        trails = np.kron(trails, np.ones((2, 2, 1), dtype=np.float32))[:size, :size]
+        glow = np.kron(glow, np.ones((2, 2), dtype=np.float32))[:size, :size, None]
+
+        image = base * (1 - glow) + trails * glow
+        return (np.clip(image, 0, 1) * 255).astype(np.uint8)
+
+    @staticmethod
+    def _value_noise(side: int, rng: np.random.Generator, octaves: tuple) -> np.ndarray:
+        """Smooth noise in [0, 1] on a side x side grid"""
+        total = np.zeros((side, side), dtype=np.float32)
+        weight = 0.0
+        for index, cells in enumerate(octaves):
+            grid = rng.random((cells + 1, cells + 1), dtype=np.float32)
+            interpolate = _interpolation_matrix(side, cells + 1)
+            amplitude = 0.5 ** index
+            total += amplitude * (interpolate @ grid @ interpolate.T)
+            weight += amplitude
+        return total / weight
+
+
+def _interpolation_matrix(side: int, points: int) -> np.ndarray:
+    """side x points matrix that linearly interpolates (smoothstepped) between grid points"""
+    position = np.linspace(0, points - 1, side, dtype=np.float32)
+    left = np.minimum(position.astype(np.int64), points - 2)
+    fraction = position - left
+    fraction = fraction * fraction * (3 - 2 * fraction)
+    matrix = np.zeros((side, points), dtype=np.float32)
+    rows = np.arange(side)
+    matrix[rows, left] = 1 - fraction
+    matrix[rows, left + 1] = fraction
+    return matrix
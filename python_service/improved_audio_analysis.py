@@ -1,7 +1,103 @@
 import os
 import hashlib
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+import numpy as np
+from feature_record import AudioFeatures, FeatureTable, map_column
+from transcript_index import KeywordGroups, filename_index, get_index, MAX_REPEAT_BONUS
+from vocal_activity import VOCAL_THRESHOLD
+
+# Keyword groups, compiled once at import
+
+# Explicit mood keywords in filenames
+MOOD_KEYWORDS = KeywordGroups({
+    'peaceful': ['peaceful', 'calm', 'serene', 'gentle', 'soft', 'quiet'],
+    'energetic': ['energetic', 'upbeat', 'fast', 'dynamic', 'powerful', 'intense'],
+    'joyful': ['joyful', 'happy', 'bright', 'cheerful', 'uplifting', 'positive'],
+    'melancholic': ['melancholic', 'sad', 'melancholy', 'sorrowful', 'blue', 'depressed'],
+    'mysterious': ['mysterious', 'mystical', 'ethereal', 'atmospheric', 'ambient', 'dreamy'],
+    'dramatic': ['dramatic', 'epic', 'intense', 'powerful', 'emotional', 'passionate'],
+    'contemplative': ['contemplative', 'thoughtful', 'reflective', 'meditative', 'introspective']
+})
+
+# Words that suggest a mood
+MOOD_HINTS = KeywordGroups({
+    'peaceful': ['piano', 'acoustic', 'nature', 'rain', 'ocean', 'wind'],
+    'energetic': ['rock', 'dance', 'electronic', 'drums', 'bass', 'guitar'],
+    'joyful': ['pop', 'summer', 'sunshine', 'party', 'celebration', 'love'],
+    'melancholic': ['winter', 'rain', 'night', 'lonely', 'heartbreak', 'missing'],
+    'mysterious': ['dark', 'night', 'moon', 'stars', 'space', 'unknown'],
+    'dramatic': ['orchestra', 'strings', 'brass', 'choir', 'epic', 'battle'],
+    'contemplative': ['solo', 'instrumental', 'classical', 'minimal', 'simple']
+})
+
+# Explicit style keywords in filenames
+STYLE_KEYWORDS = KeywordGroups({
+    'jazz': ['jazz', 'swing', 'bebop', 'smooth', 'fusion'],
+    'rock': ['rock', 'metal', 'punk', 'grunge', 'alternative'],
+    'pop': ['pop', 'mainstream', 'radio', 'chart', 'hit'],
+    'electronic': ['electronic', 'edm', 'techno', 'house', 'trance', 'synth'],
+    'classical': ['classical', 'orchestra', 'symphony', 'concerto', 'sonata'],
+    'folk': ['folk', 'acoustic', 'traditional', 'country', 'bluegrass'],
+    'ambient': ['ambient', 'atmospheric', 'chill', 'lounge', 'downtempo'],
+    'hip_hop': ['hip', 'hop', 'rap', 'urban', 'r&b', 'soul']
+})
+
+# Instrument names that suggest a style
+INSTRUMENT_STYLES = KeywordGroups({
+    'jazz': ['piano', 'sax', 'trumpet', 'bass', 'drums'],
+    'rock': ['guitar', 'electric', 'drums', 'bass', 'distortion'],
+    'classical': ['violin', 'cello', 'orchestra', 'strings', 'brass'],
+    'folk': ['acoustic', 'guitar', 'banjo', 'harmonica', 'fiddle'],
+    'electronic': ['synth', 'digital', 'electronic', 'computer', 'beats'],
+    'ambient': ['piano', 'strings', 'atmospheric', 'pad', 'drone']
+})
+
+# Explicit energy keywords in filenames
+ENERGY_KEYWORDS = KeywordGroups({
+    'high': ['high', 'energetic', 'powerful', 'intense', 'dynamic', 'fast', 'upbeat'],
+    'medium': ['medium', 'moderate', 'balanced', 'steady', 'smooth'],
+    'low': ['low', 'quiet', 'soft', 'gentle', 'calm', 'peaceful', 'slow']
+})
+
+# Lookup tables shared by the per-file and batch analysis paths
+COMPLEXITIES = ['simple', 'moderate', 'complex']
+
+TEMPO_RANGES = {
+    'energetic': {'low': (100, 130), 'medium': (130, 160), 'high': (160, 200)},
+    'joyful': {'low': (90, 120), 'medium': (120, 150), 'high': (150, 180)},
+    'dramatic': {'low': (60, 90), 'medium': (90, 120), 'high': (120, 160)},
+    'passionate': {'low': (70, 100), 'medium': (100, 130), 'high': (130, 170)},
+    'peaceful': {'low': (40, 70), 'medium': (70, 100), 'high': (100, 130)},
+    'melancholic': {'low': (50, 80), 'medium': (80, 110), 'high': (110, 140)},
+    'mysterious': {'low': (60, 90), 'medium': (90, 120), 'high': (120, 150)},
+    'contemplative': {'low': (40, 70), 'medium': (70, 100), 'high': (100, 130)}
+}
+DEFAULT_TEMPO_RANGE = (80, 120)
+
+SPECTRAL_BASE_VALUES = {
+    'peaceful': 2000, 'calm': 2500, 'dramatic': 3500, 'energetic': 4500,
+    'joyful': 4000, 'melancholic': 1800, 'mysterious': 2200, 'passionate': 3800, 'contemplative': 2000
+}
+
+STYLE_SPECTRAL_ADJUSTMENTS = {
+    'piano': -500, 'rock': 1000, 'electronic': 800, 'ambient': -300,
+    'folk': -200, 'jazz': 200, 'pop': 500, 'classical': 0
+}
+
+DYNAMIC_RANGE_BASES = {'low': 10, 'medium': 20, 'high': 30}
+
+MOOD_DYNAMIC_ADJUSTMENTS = {
+    'dramatic': 10, 'passionate': 8, 'energetic': 5,
+    'peaceful': -5, 'calm': -3, 'melancholic': -2
+}
+
+ENERGY_VARIANCE_BASES = {'low': 10000, 'medium': 30000, 'high': 60000}
+
+FORMAT_BITRATES = {
+    '.mp3': 128000, '.m4a': 256000, '.wav': 1411000,
+    '.flac': 1000000, '.aac': 256000, '.ogg': 192000
+}
 
 class ImprovedAudioAnalyzer:
     """Improved audio analyzer that generates more diverse results based on filename analysis"""
@@ -92,7 +188,7 @@ class ImprovedAudioAnalyzer:
             }
         }
 
-    def analyze_audio_file(self, audio_path: str) -> Dict[str, Any]:
+    def analyze_audio_file(self, audio_path: str) -> AudioFeatures:
         """Analyze audio file and generate diverse, realistic features"""
         file_name = os.path.basename(audio_path)
         file_size = os.path.getsize(audio_path)
@@ -127,10 +223,103 @@ class ImprovedAudioAnalyzer:
         duration = self._estimate_duration(file_size, file_name)
         
         # Build comprehensive features
-        features = {
-            'mood': mood,
-            'energy_level': energy_level,
-            'musical_style': musical_style,
+        return AudioFeatures(
+            mood=mood,
+            energy_level=energy_level,
+            musical_style=musical_style,
+            complexity=complexity,
+            estimated_tempo=estimated_tempo,
+            spectral_centroid=spectral_centroid,
+            brightness=brightness,
+            dynamic_range=dynamic_range,
+            energy_variance=energy_variance,
+            duration=duration,
+            file_size=file_size,
+            file_name=file_name
+        )
+
+    def analyze_many(self, audio_paths: List[str]) -> FeatureTable:
+        """Analyze a batch of files and return the features as a columnar table.
+
+        Produces the same values as analyze_audio_file for every file. Only the
+        filename keyword matching runs per file; every numeric feature is
+        derived with array operations over the whole batch.
+        """
+        count = len(audio_paths)
+        file_names = [os.path.basename(path) for path in audio_paths]
+        file_sizes = np.fromiter((os.stat(path).st_size for path in audio_paths), dtype=np.int64, count=count)
+        
+        digests = [hashlib.md5(name.encode()).digest() for name in file_names]
+        file_hashes = [digest.hex() for digest in digests]
+        # 32-bit words matching the 8-hex-digit slices used per file; slices past
+        # the end of the digest are empty there and parse as 0 here
+        hash_words = np.zeros((count, 8), dtype=np.int64)
+        if count:
+            hash_words[:, :4] = np.frombuffer(b''.join(digests), dtype='>u4').reshape(count, 4)
+        
+        # Keyword matching on the filename is string work; do all of it in one
+        # pass per name so each name is tokenized exactly once
+        keyword_columns = []
+        for name, file_hash in zip(file_names, file_hashes):
+            mood = self._extract_mood_from_filename(name, file_hash)
+            keyword_columns.append((
+                mood,
+                self._extract_musical_style(name, file_hash),
+                self._determine_energy_level(mood, name, file_hash),
+                self._complexity_from_filename(name),
+                self._length_hint_from_filename(name),
+                os.path.splitext(name)[1].lower()
+            ))
+        moods, styles, energy_levels, name_complexity, length_hints, extensions = (
+            np.array(column, dtype=np.str_) for column in zip(*keyword_columns)
+        ) if count else (np.array([], dtype=np.str_) for _ in range(6))
+        
+        # Tempo: position within the mood/energy range plus ±10 BPM
+        mood_energy = np.char.add(np.char.add(moods, '|'), energy_levels)
+        tempo_table = {f"{mood}|{level}": bounds for mood, levels in TEMPO_RANGES.items() for level, bounds in levels.items()}
+        tempo_bounds = map_column(mood_energy, tempo_table, DEFAULT_TEMPO_RANGE).reshape(count, 2)
+        min_tempo, max_tempo = tempo_bounds[:, 0], tempo_bounds[:, 1]
+        tempo_word = hash_words[:, 3]
+        tempo = min_tempo + (max_tempo - min_tempo) * ((tempo_word % 100) / 100.0) + (tempo_word % 20) - 10
+        estimated_tempo = np.clip(np.trunc(tempo), 40, 200).astype(np.int64)
+        
+        # Complexity: size bucket, filename override, otherwise hash variation
+        base_complexity = np.select([file_sizes > 10 * 1024 * 1024, file_sizes > 5 * 1024 * 1024], [2, 1], 0)
+        vary = hash_words[:, 4] % 10 < 3
+        complexity_index = np.where(vary, (base_complexity + 1) % len(COMPLEXITIES), base_complexity)
+        complexity = np.where(name_complexity != '', name_complexity, np.array(COMPLEXITIES)[complexity_index])
+        
+        # Spectral centroid and brightness
+        spectral_centroid = (map_column(moods, SPECTRAL_BASE_VALUES, 3000)
+                             + map_column(styles, STYLE_SPECTRAL_ADJUSTMENTS, 0)
+                             + (hash_words[:, 5] % 2000) - 1000)
+        spectral_centroid = np.clip(spectral_centroid, 500, 8000)
+        brightness = np.select(
+            [spectral_centroid > 4000, spectral_centroid < 2000,
+             np.isin(moods, ['joyful', 'energetic']), np.isin(moods, ['melancholic', 'mysterious'])],
+            ['bright', 'dark', 'bright', 'dark'],
+            'balanced'
+        )
+        
+        # Dynamics
+        dynamic_range = np.clip(map_column(energy_levels, DYNAMIC_RANGE_BASES, 20)
+                                + map_column(moods, MOOD_DYNAMIC_ADJUSTMENTS, 0)
+                                + (hash_words[:, 6] % 20) - 10, 5, 50)
+        energy_variance = np.clip(map_column(energy_levels, ENERGY_VARIANCE_BASES, 30000)
+                                  + (hash_words[:, 7] % 40000) - 20000, 5000, 100000)
+        
+        # Duration from size and format bitrate, adjusted by filename hints
+        theoretical_duration = file_sizes * 8 / map_column(extensions, FORMAT_BITRATES, 256000)
+        duration = np.select(
+            [length_hints == 'short', length_hints == 'long'],
+            [np.minimum(60, theoretical_duration * 0.3), np.minimum(600, theoretical_duration * 2.0)],
+            np.clip(theoretical_duration, 10, 600)
+        )
+        
+        return FeatureTable({
+            'mood': moods,
+            'energy_level': energy_levels,
+            'musical_style': styles,
             'complexity': complexity,
             'estimated_tempo': estimated_tempo,
             'spectral_centroid': spectral_centroid,
@@ -138,44 +327,22 @@ class ImprovedAudioAnalyzer:
             'dynamic_range': dynamic_range,
             'energy_variance': energy_variance,
             'duration': duration,
-            'file_size': file_size,
-            'file_name': file_name
-        }
-        
-        return features
+            'file_size': file_sizes,
+            'file_name': file_names
+        })
 
     def _extract_mood_from_filename(self, file_name: str, file_hash: str) -> str:
         """Extract mood from filename with more sophisticated analysis"""
         # Priority 1: Explicit mood keywords in filename
-        mood_keywords = {
-            'peaceful': ['peaceful', 'calm', 'serene', 'gentle', 'soft', 'quiet'],
-            'energetic': ['energetic', 'upbeat', 'fast', 'dynamic', 'powerful', 'intense'],
-            'joyful': ['joyful', 'happy', 'bright', 'cheerful', 'uplifting', 'positive'],
-            'melancholic': ['melancholic', 'sad', 'melancholy', 'sorrowful', 'blue', 'depressed'],
-            'mysterious': ['mysterious', 'mystical', 'ethereal', 'atmospheric', 'ambient', 'dreamy'],
-            'dramatic': ['dramatic', 'epic', 'intense', 'powerful', 'emotional', 'passionate'],
-            'contemplative': ['contemplative', 'thoughtful', 'reflective', 'meditative', 'introspective']
-        }
-        
-        file_lower = file_name.lower()
-        for mood, keywords in mood_keywords.items():
-            if any(keyword in file_lower for keyword in keywords):
-                return mood
+        name_index = filename_index(file_name)
+        mood = name_index.first_match(MOOD_KEYWORDS)
+        if mood:
+            return mood
         
         # Priority 2: Mood-related words that suggest mood
-        mood_hints = {
-            'peaceful': ['piano', 'acoustic', 'nature', 'rain', 'ocean', 'wind'],
-            'energetic': ['rock', 'dance', 'electronic', 'drums', 'bass', 'guitar'],
-            'joyful': ['pop', 'summer', 'sunshine', 'party', 'celebration', 'love'],
-            'melancholic': ['winter', 'rain', 'night', 'lonely', 'heartbreak', 'missing'],
-            'mysterious': ['dark', 'night', 'moon', 'stars', 'space', 'unknown'],
-            'dramatic': ['orchestra', 'strings', 'brass', 'choir', 'epic', 'battle'],
-            'contemplative': ['solo', 'instrumental', 'classical', 'minimal', 'simple']
-        }
-        
-        for mood, hints in mood_hints.items():
-            if any(hint in file_lower for hint in hints):
-                return mood
+        mood = name_index.first_match(MOOD_HINTS)
+        if mood:
+            return mood
         
         # Priority 3: Hash-based mood with more variation
         if len(file_hash) >= 8:
@@ -190,35 +357,15 @@ class ImprovedAudioAnalyzer:
     def _extract_musical_style(self, file_name: str, file_hash: str) -> str:
         """Extract musical style from filename with more sophisticated analysis"""
         # Priority 1: Explicit style keywords in filename
-        style_keywords = {
-            'jazz': ['jazz', 'swing', 'bebop', 'smooth', 'fusion'],
-            'rock': ['rock', 'metal', 'punk', 'grunge', 'alternative'],
-            'pop': ['pop', 'mainstream', 'radio', 'chart', 'hit'],
-            'electronic': ['electronic', 'edm', 'techno', 'house', 'trance', 'synth'],
-            'classical': ['classical', 'orchestra', 'symphony', 'concerto', 'sonata'],
-            'folk': ['folk', 'acoustic', 'traditional', 'country', 'bluegrass'],
-            'ambient': ['ambient', 'atmospheric', 'chill', 'lounge', 'downtempo'],
-            'hip_hop': ['hip', 'hop', 'rap', 'urban', 'r&b', 'soul']
-        }
-        
-        file_lower = file_name.lower()
-        for style, keywords in style_keywords.items():
-            if any(keyword in file_lower for keyword in keywords):
-                return style
+        name_index = filename_index(file_name)
+        style = name_index.first_match(STYLE_KEYWORDS)
+        if style:
+            return style
         
         # Priority 2: Instrument-based style hints
-        instrument_styles = {
-            'jazz': ['piano', 'sax', 'trumpet', 'bass', 'drums'],
-            'rock': ['guitar', 'electric', 'drums', 'bass', 'distortion'],
-            'classical': ['violin', 'cello', 'orchestra', 'strings', 'brass'],
-            'folk': ['acoustic', 'guitar', 'banjo', 'harmonica', 'fiddle'],
-            'electronic': ['synth', 'digital', 'electronic', 'computer', 'beats'],
-            'ambient': ['piano', 'strings', 'atmospheric', 'pad', 'drone']
-        }
-        
-        for style, instruments in instrument_styles.items():
-            if any(instrument in file_lower for instrument in instruments):
-                return style
+        style = name_index.first_match(INSTRUMENT_STYLES)
+        if style:
+            return style
         
         # Priority 3: Hash-based style with more variation
         if len(file_hash) >= 16:
@@ -232,18 +379,12 @@ class ImprovedAudioAnalyzer:
 
     def _determine_energy_level(self, mood: str, file_name: str, file_hash: str) -> str:
         """Determine energy level with more sophisticated analysis"""
-        file_lower = file_name.lower()
+        name_index = filename_index(file_name)
         
         # Priority 1: Explicit energy keywords in filename
-        energy_keywords = {
-            'high': ['high', 'energetic', 'powerful', 'intense', 'dynamic', 'fast', 'upbeat'],
-            'medium': ['medium', 'moderate', 'balanced', 'steady', 'smooth'],
-            'low': ['low', 'quiet', 'soft', 'gentle', 'calm', 'peaceful', 'slow']
-        }
-        
-        for level, keywords in energy_keywords.items():
-            if any(keyword in file_lower for keyword in keywords):
-                return level
+        level = name_index.first_match(ENERGY_KEYWORDS)
+        if level:
+            return level
         
         # Priority 2: Mood-based energy (with some variation)
         mood_energy_map = {
@@ -289,24 +430,8 @@ class ImprovedAudioAnalyzer:
 
     def _estimate_tempo(self, mood: str, energy_level: str, file_hash: str) -> int:
         """Estimate tempo with more sophisticated analysis"""
-        # Base tempo ranges by mood and energy
-        tempo_ranges = {
-            'energetic': {'low': (100, 130), 'medium': (130, 160), 'high': (160, 200)},
-            'joyful': {'low': (90, 120), 'medium': (120, 150), 'high': (150, 180)},
-            'dramatic': {'low': (60, 90), 'medium': (90, 120), 'high': (120, 160)},
-            'passionate': {'low': (70, 100), 'medium': (100, 130), 'high': (130, 170)},
-            'peaceful': {'low': (40, 70), 'medium': (70, 100), 'high': (100, 130)},
-            'melancholic': {'low': (50, 80), 'medium': (80, 110), 'high': (110, 140)},
-            'mysterious': {'low': (60, 90), 'medium': (90, 120), 'high': (120, 150)},
-            'contemplative': {'low': (40, 70), 'medium': (70, 100), 'high': (100, 130)}
-        }
-        
         # Get base tempo range
-        if mood in tempo_ranges and energy_level in tempo_ranges[mood]:
-            min_tempo, max_tempo = tempo_ranges[mood][energy_level]
-        else:
-            # Default range
-            min_tempo, max_tempo = 80, 120
+        min_tempo, max_tempo = TEMPO_RANGES.get(mood, {}).get(energy_level, DEFAULT_TEMPO_RANGE)
         
         # Add variation based on hash
         if len(file_hash) >= 32:
@@ -338,38 +463,34 @@ class ImprovedAudioAnalyzer:
             base_complexity = 'simple'
         
         # Check for complexity indicators in filename
-        name_lower = file_name.lower()
-        if any(word in name_lower for word in ['complex', 'layered', 'rich', 'sophisticated']):
-            return 'complex'
-        elif any(word in name_lower for word in ['simple', 'minimal', 'basic']):
-            return 'simple'
+        name_complexity = self._complexity_from_filename(file_name)
+        if name_complexity:
+            return name_complexity
         
         # Use hash for variation
         hash_int = int(file_hash[32:40], 16) if len(file_hash) >= 40 else 0
         if hash_int % 10 < 3:  # 30% chance to vary
-            complexities = ['simple', 'moderate', 'complex']
-            current_index = complexities.index(base_complexity)
-            return complexities[(current_index + 1) % len(complexities)]
+            current_index = COMPLEXITIES.index(base_complexity)
+            return COMPLEXITIES[(current_index + 1) % len(COMPLEXITIES)]
         
         return base_complexity
 
+    def _complexity_from_filename(self, file_name: str) -> str:
+        """Explicit complexity keyword in the filename, or '' if there is none"""
+        name_index = filename_index(file_name)
+        if name_index.any_of(['complex', 'layered', 'rich', 'sophisticated']):
+            return 'complex'
+        elif name_index.any_of(['simple', 'minimal', 'basic']):
+            return 'simple'
+        return ''
+
     def _estimate_spectral_centroid(self, mood: str, musical_style: str, file_hash: str) -> float:
         """Estimate spectral centroid (brightness indicator)"""
         # Base values from mood
-        base_values = {
-            'peaceful': 2000, 'calm': 2500, 'dramatic': 3500, 'energetic': 4500,
-            'joyful': 4000, 'melancholic': 1800, 'mysterious': 2200, 'passionate': 3800, 'contemplative': 2000
-        }
-        
-        base_value = base_values.get(mood, 3000)
+        base_value = SPECTRAL_BASE_VALUES.get(mood, 3000)
         
         # Adjust for musical style
-        style_adjustments = {
-            'piano': -500, 'rock': 1000, 'electronic': 800, 'ambient': -300,
-            'folk': -200, 'jazz': 200, 'pop': 500, 'classical': 0
-        }
-        
-        adjusted_value = base_value + style_adjustments.get(musical_style, 0)
+        adjusted_value = base_value + STYLE_SPECTRAL_ADJUSTMENTS.get(musical_style, 0)
         
         # Add variation
         hash_int = int(file_hash[40:48], 16) if len(file_hash) >= 48 else 0
@@ -392,16 +513,10 @@ class ImprovedAudioAnalyzer:
 
     def _estimate_dynamic_range(self, energy_level: str, mood: str, file_hash: str) -> float:
         """Estimate dynamic range"""
-        base_ranges = {'low': 10, 'medium': 20, 'high': 30}
-        base_range = base_ranges.get(energy_level, 20)
+        base_range = DYNAMIC_RANGE_BASES.get(energy_level, 20)
         
         # Adjust for mood
-        mood_adjustments = {
-            'dramatic': 10, 'passionate': 8, 'energetic': 5,
-            'peaceful': -5, 'calm': -3, 'melancholic': -2
-        }
-        
-        adjusted_range = base_range + mood_adjustments.get(mood, 0)
+        adjusted_range = base_range + MOOD_DYNAMIC_ADJUSTMENTS.get(mood, 0)
         
         # Add variation
         hash_int = int(file_hash[48:56], 16) if len(file_hash) >= 56 else 0
@@ -411,8 +526,7 @@ class ImprovedAudioAnalyzer:
 
     def _estimate_energy_variance(self, energy_level: str, file_hash: str) -> float:
         """Estimate energy variance"""
-        base_variances = {'low': 10000, 'medium': 30000, 'high': 60000}
-        base_variance = base_variances.get(energy_level, 30000)
+        base_variance = ENERGY_VARIANCE_BASES.get(energy_level, 30000)
         
         # Add variation
         hash_int = int(file_hash[56:64], 16) if len(file_hash) >= 64 else 0
@@ -423,31 +537,43 @@ class ImprovedAudioAnalyzer:
     def _estimate_duration(self, file_size: int, file_name: str) -> float:
         """Estimate duration based on file size and name"""
         # Base estimation by format
-        bitrates = {
-            '.mp3': 128000, '.m4a': 256000, '.wav': 1411000, 
-            '.flac': 1000000, '.aac': 256000, '.ogg': 192000
-        }
-        
         file_extension = os.path.splitext(file_name)[1].lower()
-        bitrate = bitrates.get(file_extension, 256000)
+        bitrate = FORMAT_BITRATES.get(file_extension, 256000)
         
         # Calculate theoretical duration
         theoretical_duration = (file_size * 8) / bitrate
         
         # Adjust based on filename hints
-        name_lower = file_name.lower()
-        if any(word in name_lower for word in ['short', 'clip', 'sample']):
+        length_hint = self._length_hint_from_filename(file_name)
+        if length_hint == 'short':
             return min(60, theoretical_duration * 0.3)
-        elif any(word in name_lower for word in ['long', 'full', 'complete']):
+        elif length_hint == 'long':
             return min(600, theoretical_duration * 2.0)
         
         return max(10, min(600, theoretical_duration))
 
-    def detect_instruments(self, audio_path: str, transcription: str = "") -> List[Dict[str, Any]]:
-        """Detect instruments based on filename and transcription analysis"""
+    def _length_hint_from_filename(self, file_name: str) -> str:
+        """'short' or 'long' if the filename hints at the track length, else ''"""
+        name_index = filename_index(file_name)
+        if name_index.any_of(['short', 'clip', 'sample']):
+            return 'short'
+        elif name_index.any_of(['long', 'full', 'complete']):
+            return 'long'
+        return ''
+
+    def detect_instruments(self, audio_path: str, transcription: str = "",
+                           vocal_confidence: float = None) -> List[Dict[str, Any]]:
+        """Detect instruments based on filename and transcription analysis.
+
+        vocal_confidence, when measured from the audio, can add the voice
+        entry and replaces the assumed-voice fallback, but never removes
+        voice that the file name or a transcript points to: the detector
+        is a heuristic, and lyrics are direct evidence of singing.
+        """
         detected_instruments = []
-        file_name = os.path.basename(audio_path).lower()
-        transcription_lower = transcription.lower() if transcription else ""
+        # Both texts are tokenized once; every keyword below is a dict lookup
+        name_index = filename_index(os.path.basename(audio_path))
+        transcript_index = get_index(transcription or "")
         
         # Score each instrument based on filename and transcription
         for instrument_name, instrument_data in self.instrument_database.items():
@@ -455,17 +581,28 @@ class ImprovedAudioAnalyzer:
             detection_reasons = []
             
             # Check filename for instrument hints
-            for keyword in instrument_data['keywords']:
-                if keyword in file_name:
-                    score += 3
-                    detection_reasons.append(f"filename contains '{keyword}'")
+            for keyword in name_index.matches(instrument_data['keywords']):
+                score += 3
+                detection_reasons.append(f"filename contains '{keyword}'")
             
-            # Check transcription for instrument mentions
-            for keyword in instrument_data['keywords']:
-                if keyword in transcription_lower:
-                    score += 5
+            # Check transcription for instrument mentions; repeated mentions
+            # add a little extra evidence on top of the first one
+            for keyword, hits in transcript_index.matches(instrument_data['keywords']).items():
+                score += 5 + min(hits - 1, MAX_REPEAT_BONUS)
+                if hits > 1:
+                    detection_reasons.append(f"transcription mentions '{keyword}' {hits} times")
+                else:
                     detection_reasons.append(f"transcription mentions '{keyword}'")
             
+            if instrument_name == 'voice' and vocal_confidence is not None and vocal_confidence >= VOCAL_THRESHOLD:
+                # Measured vocal activity can only add evidence
+                score = max(score, round(vocal_confidence * 10))
+                detection_reasons.append(f"vocal activity detected in audio ({vocal_confidence:.0%})")
+            if instrument_name == 'voice' and score < 2 and (transcription or '').strip():
+                # Whisper heard words, so someone is singing whatever the detector says
+                score = 2
+                detection_reasons.append("transcription has lyrics")
+            
             # Add to detected instruments if score is high enough
             if score >= 2:  # Lowered from 3 to 2 for more sensitivity
                 detected_instruments.append({
@@ -479,16 +616,18 @@ class ImprovedAudioAnalyzer:
         
         # If no instruments detected, make some intelligent assumptions
         if not detected_instruments:
-            # Assume voice is likely present in most songs (lower confidence)
-            detected_instruments.append({
-                'name': 'voice',
-                'score': 2,
-                'confidence': 0.3,
-                'reasons': ['assumed presence in vocal music']
-            })
+            # Assume voice is likely present in most songs (lower confidence),
+            # unless the audio was checked for it
+            if vocal_confidence is None:
+                detected_instruments.append({
+                    'name': 'voice',
+                    'score': 2,
+                    'confidence': 0.3,
+                    'reasons': ['assumed presence in vocal music']
+                })
             
             # Check for subtle hints in filename
-            if any(word in file_name for word in ['melody', 'song', 'music', 'track']):
+            if name_index.any_of(['melody', 'song', 'music', 'track']):
                 detected_instruments.append({
                     'name': 'piano',
                     'score': 2,
@@ -519,7 +658,16 @@ class ImprovedAudioAnalyzer:
         
         return detected_instruments
 
-    def generate_color_palette(self, features: Dict[str, Any], detected_instruments: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def palette_key(self, features: AudioFeatures, detected_instruments: List[Dict[str, Any]] = None) -> Tuple[Any, ...]:
+        """Everything generate_color_palette's colors and description depend on, for memoizing it"""
+        return (
+            features.get('mood', 'balanced'),
+            features.get('energy_level', 'medium'),
+            features.get('musical_style', 'pop'),
+            tuple(instrument['name'] for instrument in (detected_instruments or [])[:2])
+        )
+
+    def generate_color_palette(self, features: AudioFeatures, detected_instruments: List[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Generate color palette based on analyzed features and detected instruments"""
         mood = features.get('mood', 'balanced')
         energy_level = features.get('energy_level', 'medium')
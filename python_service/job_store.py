@@ -0,0 +1,275 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Columns of the jobs table that hold JSON
+_JSON_COLUMNS = ('params', 'previews', 'result')
+_JOB_COLUMNS = ('id', 'lane', 'client', 'cost', 'status', 'stage', 'params', 'previews', 'result', 'error',
+                'created_at', 'updated_at')
+
+# Predictions that ended like this are not re-attached to; the stage creates a new one
+_RETRYABLE_STATUSES = ('failed', 'canceled')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    lane TEXT NOT NULL,
+    client TEXT NOT NULL,
+    cost REAL NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    params TEXT,
+    previews TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, updated_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    job_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, key)
+);
+"""
+
+
+def prediction_key(payload: Dict[str, Any]) -> str:
+    """Identity of a prediction request: the same model and input give the same key"""
+    encoded = json.dumps({'version': payload.get('version'), 'input': payload.get('input')}, sort_keys=True)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:32]
+
+
+class JobStore:
+    """Durable job state in SQLite, so queued and running jobs survive a restart.
+
+    Besides each job's status, stage, parameters and result it keeps
+    per-job checkpoints (artifacts of finished stages, such as the
+    transcript) and a journal of the Replicate predictions each job
+    started, so a resumed job skips finished stages and re-attaches to
+    predictions instead of paying for them twice. WAL mode with
+    synchronous=NORMAL makes each transition an append to the log rather
+    than a synced page rewrite; a power cut may lose the last few, a crash
+    of the service none.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('PRAGMA busy_timeout=5000')
+            self._connection.executescript(_SCHEMA)
+
+    # Jobs
+    def insert_job(self, job: Dict[str, Any]):
+        """Record a new job, or reset a resumed one to queued; job holds the jobs table's columns"""
+        values = [json.dumps(job.get(column)) if column in _JSON_COLUMNS else job.get(column)
+                  for column in _JOB_COLUMNS]
+        with self._lock:
+            self._connection.execute(
+                f"INSERT INTO jobs ({', '.join(_JOB_COLUMNS)}) VALUES ({', '.join('?' * len(_JOB_COLUMNS))}) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, stage = excluded.stage, "
+                "updated_at = excluded.updated_at", values)
+
+    def update_job(self, job_id: str, **fields: Any):
+        """Write changed job fields (status, stage, previews, result, error, updated_at)"""
+        columns = [column for column in fields if column in _JOB_COLUMNS and column != 'id']
+        if not columns:
+            return
+        values = [json.dumps(fields[column]) if column in _JSON_COLUMNS else fields[column] for column in columns]
+        with self._lock:
+            self._connection.execute(
+                f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                values + [job_id])
+
+    def jobs(self, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Unfinished jobs, and finished ones updated since `since`, oldest first"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') OR updated_at >= ? ORDER BY created_at",
+                (since,)).fetchall()
+        return [self._job_record(row) for row in rows]
+
+    def delete_finished(self, before: float) -> int:
+        """Forget finished jobs last updated before `before`, with their checkpoints and predictions"""
+        with self._lock, _Transaction(self._connection):
+            ids = [row[0] for row in self._connection.execute(
+                "SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') AND updated_at < ?", (before,))]
+            for table, column in (('checkpoints', 'job_id'), ('predictions', 'job_id'), ('jobs', 'id')):
+                self._connection.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(job_id,) for job_id in ids])
+        return len(ids)
+
+    @staticmethod
+    def _job_record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        for column in _JSON_COLUMNS:
+            record[column] = json.loads(record[column]) if record[column] is not None else None
+        return record
+
+    # Stage checkpoints
+    def save_checkpoint(self, job_id: str, name: str, data: Any):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (job_id, name, data) VALUES (?, ?, ?)",
+                (job_id, name, json.dumps(data)))
+
+    def checkpoint(self, job_id: str, name: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM checkpoints WHERE job_id = ? AND name = ?", (job_id, name)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Prediction journal
+    def record_prediction(self, job_id: str, key: str, prediction_id: str, kind: str):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO predictions (job_id, key, id, kind, status, created_at) "
+                "VALUES (?, ?, ?, ?, 'starting', ?)", (job_id, key, prediction_id, kind, time.time()))
+
+    def prediction(self, job_id: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM predictions WHERE job_id = ? AND key = ?", (job_id, key)).fetchone()
+        return dict(row) if row else None
+
+    def finish_prediction(self, prediction_id: str, status: str):
+        with self._lock:
+            self._connection.execute("UPDATE predictions SET status = ? WHERE id = ?", (status, prediction_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            predictions = self._connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        return {'path': self.path, 'jobs': counts, 'predictions': predictions}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class _Transaction:
+    """BEGIN/COMMIT (or ROLLBACK) around a block on an autocommit connection"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN')
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class JobJournal:
+    """One job's view of the store, handed down the pipeline.
+
+    Stages read and write their checkpoints through it, and prediction
+    sites start predictions through start_prediction so a resumed job
+    finds the ones it already created.
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def checkpoint(self, name: str) -> Optional[Any]:
+        return self.store.checkpoint(self.job_id, name)
+
+    def save_checkpoint(self, name: str, data: Any):
+        self.store.save_checkpoint(self.job_id, name, data)
+
+    def start_prediction(self, kind: str, payload: Dict[str, Any],
+                         create: Callable[[], Optional[str]]) -> Tuple[Optional[str], bool]:
+        """The id of this job's earlier prediction for the same request, or create() a new one.
+
+        Returns (prediction id or None, whether it was re-attached).
+        """
+        key = prediction_key(payload)
+        existing = self.store.prediction(self.job_id, key)
+        if existing is not None and existing['status'] not in _RETRYABLE_STATUSES:
+            print(f"🔁 Re-attaching to {kind} prediction {existing['id']} ({existing['status']})")
+            return existing['id'], True
+        prediction_id = create()
+        if prediction_id is not None:
+            self.store.record_prediction(self.job_id, key, prediction_id, kind)
+        return prediction_id, False
+
+    def finish_prediction(self, prediction_id: str, status: str):
+        self.store.finish_prediction(prediction_id, status)
+
+
+def start_prediction(journal: Optional[JobJournal], kind: str, payload: Dict[str, Any],
+                     create: Callable[[], Optional[str]]) -> Tuple[Optional[str], bool]:
+    """JobJournal.start_prediction, or just create() for work that is not journaled"""
+    if journal is None:
+        return create(), False
+    return journal.start_prediction(kind, payload, create)
+
+
+def benchmark(thread_counts: List[int], jobs: int = 2000) -> List[Dict[str, float]]:
+    """State transitions per second at each thread count, on a fresh store in a temporary directory.
+
+    Each job makes the six transitions a pipeline job does: insert, four
+    stage updates and the finishing update. Jobs are split across the threads.
+    """
+    import os
+    import shutil
+    import tempfile
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor
+
+    stages = ('analyzing', 'transcribing', 'prompting', 'rendering')
+    results = []
+    for threads in thread_counts:
+        directory = tempfile.mkdtemp()
+        store = JobStore(os.path.join(directory, 'benchmark.sqlite3'))
+
+        def run(count: int):
+            for _ in range(count):
+                job_id = uuid.uuid4().hex
+                now = time.time()
+                store.insert_job({'id': job_id, 'lane': 'batch', 'client': 'benchmark', 'cost': 1, 'status': 'queued',
+                                  'stage': 'queued', 'params': {'variants': 1}, 'created_at': now, 'updated_at': now})
+                for stage in stages:
+                    store.update_job(job_id, status='running', stage=stage, updated_at=time.time())
+                store.update_job(job_id, status='succeeded', stage='done', result={'success': True},
+                                 updated_at=time.time())
+
+        shares = [jobs // threads + (1 if index < jobs % threads else 0) for index in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(run, shares))
+        seconds = time.perf_counter() - started
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+        transitions = jobs * (len(stages) + 2)
+        results.append({'threads': threads, 'seconds': round(seconds, 2),
+                        'transitions_per_second': round(transitions / seconds)})
+    return results
+
+
+if __name__ == "__main__":
+    # python job_store.py [thread counts...] measures how many job state
+    # transitions per second the store sustains (synchronous=NORMAL, WAL)
+    import sys
+    counts = [int(count) for count in sys.argv[1:]] or [1, 4]
+    print(f"🧪 Job store throughput, 2000 jobs x 6 transitions")
+    for result in benchmark(counts):
+        print(f"  {result['threads']:>3} thread(s): {result['transitions_per_second']:>7,} transitions/s ({result['seconds']}s)")
@@ -0,0 +1,289 @@
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cancellation import CancelToken, JobCancelled
+from fair_queue import DEFAULT_LANE, FairQueue
+from job_store import JobJournal, JobStore
+
+# Finished jobs are forgotten this long after they complete
+DEFAULT_RETENTION_SECONDS = 3600
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+# Job fields written to the job store whenever they change
+_PERSISTED_FIELDS = ('status', 'stage', 'previews', 'result', 'error')
+
+
+class Job:
+    """One background pipeline run; its fields are updated as stages complete.
+
+    Every change is also appended to a numbered event log, which the SSE
+    endpoint replays and then follows. cancel_token is handed to the
+    pipeline so cancelling the job also cancels its Replicate predictions.
+    With a store, every change is also written through to it, and journal
+    carries the job's stage checkpoints and prediction journal.
+    """
+
+    def __init__(self, job_id: str, lane: str = DEFAULT_LANE, store: Optional[JobStore] = None,
+                 record: Optional[Dict[str, Any]] = None):
+        self.id = job_id
+        self.lane = lane
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.previews: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Seconds between submission and a worker picking the job up
+        self.queue_wait: Optional[float] = None
+        self.store = store
+        self.journal = JobJournal(store, job_id) if store is not None else None
+        self.cancel_token = CancelToken(lane, self.journal)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._events: List[Dict[str, Any]] = []
+        # Event ids continue from here; a job restored after a restart numbers
+        # its events past any id a reconnecting client can hold
+        self._first_event_id = 1
+        if record is not None:
+            self._restore(record)
+
+    def _restore(self, record: Dict[str, Any]):
+        """Take over a job record from the store (a job from before a restart).
+
+        A finished job comes back as it ended, with its 'done' event for
+        SSE clients; an unfinished one keeps its previews but starts over
+        as queued.
+        """
+        self.previews = record.get('previews') or {}
+        self.created_at = record['created_at']
+        self.updated_at = record['updated_at']
+        self._first_event_id = int(time.time() * 1000)
+        if record['status'] in FINISHED_STATUSES:
+            self.status, self.stage = record['status'], record['stage']
+            self.result, self.error = record.get('result'), record.get('error')
+            with self._lock:
+                self._append('done', {'status': self.status, 'result': self.result, 'error': self.error})
+
+    def update(self, **fields: Any):
+        """Set job fields (status, stage, previews, result, error) and emit matching events"""
+        with self._lock:
+            self._apply(fields)
+
+    def start(self) -> bool:
+        """Move a queued job to running; False if it was cancelled while it waited"""
+        with self._lock:
+            if self.status != 'queued':
+                return False
+            self._apply({'status': 'running', 'stage': 'starting'})
+            return True
+
+    def cancel(self, reason: str = 'cancelled by client') -> bool:
+        """Cancel the job; False if it had already finished.
+
+        A queued job is finished at once. A running one has its predictions
+        cancelled and stops at its next checkpoint, where the worker marks
+        it cancelled.
+        """
+        with self._lock:
+            if self.finished:
+                return False
+            if self.status == 'queued':
+                self._apply({'status': 'cancelled', 'stage': 'done', 'error': f"Cancelled: {reason}"})
+            else:
+                self._append('cancelling', {'reason': reason})
+        self.cancel_token.cancel(reason)
+        return True
+
+    def _apply(self, fields: Dict[str, Any]):
+        # Caller holds the lock
+        if 'stage' in fields and fields['stage'] != self.stage:
+            self._append('stage', {'stage': fields['stage']})
+        for name, value in fields.items():
+            if name == 'previews':
+                self.previews = {**self.previews, **value}
+                self._append('preview', value)
+            else:
+                setattr(self, name, value)
+        if 'status' in fields and self.finished:
+            self._append('done', {'status': self.status, 'result': self.result, 'error': self.error})
+        self.updated_at = time.time()
+        if self.store is not None:
+            changed = {name: getattr(self, name) for name in _PERSISTED_FIELDS if name in fields}
+            self.store.update_job(self.id, updated_at=self.updated_at, **changed)
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        """Record a progress event (analysis done, prediction status, image ready, ...)"""
+        with self._lock:
+            self._append(event, data)
+
+    def _append(self, event: str, data: Dict[str, Any]):
+        # Caller holds the lock
+        self._events.append({'id': self._first_event_id + len(self._events), 'event': event, 'data': data,
+                             'time': time.time()})
+        self._changed.notify_all()
+
+    def events_after(self, last_id: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """Events newer than last_id, waiting up to timeout for one; also whether the job is finished"""
+        with self._lock:
+            if self._next_index(last_id) >= len(self._events) and not self.finished:
+                self._changed.wait(timeout)
+            return self._events[self._next_index(last_id):], self.finished
+
+    def _next_index(self, last_id: int) -> int:
+        # Index of the first event after last_id; ids run consecutively from _first_event_id
+        return min(max(last_id - self._first_event_id + 1, 0), len(self._events))
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'lane': self.lane,
+                'status': self.status,
+                'stage': self.stage,
+                'previews': self.previews,
+                'result': self.result,
+                'error': self.error,
+                'queue_wait': self.queue_wait,
+                'created_at': self.created_at,
+                'updated_at': self.updated_at
+            }
+
+
+class JobManager:
+    """Runs pipeline jobs on worker threads and keeps their state for polling.
+
+    Workers take jobs from a FairQueue, so lanes and the clients within
+    them take turns instead of running first come, first served. With a
+    JobStore, jobs are recorded durably: load() brings back the finished
+    ones after a restart and hands out the unfinished ones to resubmit.
+    """
+
+    def __init__(self, max_workers: int = 2, retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+                 lane_weights: Dict[str, int] = None, store: Optional[JobStore] = None):
+        self.retention_seconds = retention_seconds
+        self.store = store
+        self._queue = FairQueue(lane_weights)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        for index in range(max_workers):
+            threading.Thread(target=self._work, name=f"job-{index}", daemon=True).start()
+
+    def submit(self, func: Callable[..., Dict[str, Any]], *args: Any, lane: str = DEFAULT_LANE,
+               client: str = 'anonymous', cost: float = 1, deadline: Optional[float] = None,
+               on_done: Optional[Callable[[Job], None]] = None, params: Optional[Dict[str, Any]] = None,
+               record: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Job:
+        """Queue func(job, *args, **kwargs); its return value becomes the job result.
+
+        The job waits in its lane behind earlier jobs of the same client;
+        cost (e.g. images to render) sets its share of the client's turns.
+        A job still unfinished deadline seconds after submission, queue time
+        included, is cancelled. on_done(job) is called once the job has
+        finished, even if it was cancelled before it started.
+
+        params (JSON) are stored with the job for resuming it after a
+        restart; record, a stored job from load(), resubmits that job under
+        its id, keeping its checkpoints.
+        """
+        job = Job(record['id'] if record else uuid.uuid4().hex, lane, self.store, record)
+        if self.store is not None:
+            self.store.insert_job({'id': job.id, 'lane': lane, 'client': client, 'cost': cost, 'status': 'queued',
+                                   'stage': 'queued', 'params': params, 'previews': job.previews,
+                                   'created_at': job.created_at, 'updated_at': job.updated_at})
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        timer = job.cancel_token.cancel_after(deadline, job.cancel, 'deadline exceeded') if deadline else None
+        self._queue.put((job, func, args, kwargs, timer, on_done), lane, client, cost)
+        print(f"📋 Job {job.id} {'re-queued' if record else 'queued'} ({lane}, client {client})")
+        return job
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Restore jobs recorded by an earlier run; returns the unfinished ones, oldest first.
+
+        Finished jobs within retention are put back for polling as they
+        were. Unfinished ones are left to the caller to resubmit (with
+        record=) since only it knows how to run them.
+        """
+        if self.store is None:
+            return []
+        unfinished = []
+        for record in self.store.jobs(since=time.time() - self.retention_seconds):
+            if record['status'] in FINISHED_STATUSES:
+                with self._lock:
+                    self._jobs[record['id']] = Job(record['id'], record['lane'], record=record)
+            else:
+                unfinished.append(record)
+        print(f"📋 Restored {len(self._jobs)} finished and {len(unfinished)} unfinished job(s) from {self.store.path}")
+        return unfinished
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str, reason: str = 'cancelled by client') -> Optional[Job]:
+        """Cancel a job; None if it is unknown"""
+        job = self.get(job_id)
+        if job is not None and job.cancel(reason):
+            print(f"🛑 Job {job.id} cancelling: {reason}")
+        return job
+
+    def _work(self):
+        while True:
+            (job, func, args, kwargs, timer, on_done), _, waited = self._queue.get()
+            job.queue_wait = round(waited, 3)
+            try:
+                self._run(job, func, args, kwargs, timer, on_done)
+            except Exception as e:
+                # Only on_done can get here; the worker must outlive it
+                print(f"❌ Job {job.id} cleanup failed: {e}")
+
+    def _run(self, job: Job, func: Callable[..., Dict[str, Any]], args: tuple, kwargs: Dict[str, Any],
+             timer: Optional[threading.Timer], on_done: Optional[Callable[[Job], None]]):
+        try:
+            if not job.start():
+                print(f"📋 Job {job.id} {job.status} before it started")
+                return
+            try:
+                result = func(job, *args, **kwargs)
+                if result.get('success', True):
+                    job.update(status='succeeded', stage='done', result=result)
+                else:
+                    job.update(status='failed', stage='done', error=result.get('error', 'Unknown error'))
+            except JobCancelled as e:
+                job.update(status='cancelled', stage='done', error=f"Cancelled: {e}")
+            except Exception as e:
+                print(f"❌ Job {job.id} failed: {e}")
+                job.update(status='failed', stage='done', error=str(e))
+            print(f"📋 Job {job.id} {job.status}")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if on_done is not None:
+                on_done(job)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+        if self.store is not None:
+            self.store.delete_finished(cutoff)
+
+    def queue_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per lane: queued jobs, clients waiting and how long jobs waited"""
+        return self._queue.stats()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {status: 0 for status in JOB_STATUSES}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
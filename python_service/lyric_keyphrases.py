@@ -0,0 +1,109 @@
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from transcript_index import tokenize
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lyric_lexicon.json')
+
+# Transcripts up to this many words are short enough to use verbatim
+SHORT_TRANSCRIPT_WORDS = 12
+
+MAX_PHRASES = 5
+MAX_PHRASE_WORDS = 3
+MIN_WORD_LENGTH = 3
+
+# Concreteness (1 abstract .. 5 picturable) of words the lexicon does not rate
+DEFAULT_CONCRETENESS = 3.0
+
+# Extra weight per additional word, so "silver moon" outranks "moon"
+PHRASE_LENGTH_BONUS = 0.25
+
+# Lines and clauses end at punctuation; phrases never cross them
+_CLAUSE_PATTERN = re.compile(r"[.,!?;:\n\r\"()\[\]]+|\s[-–—]+\s")
+
+
+class LyricKeyphraseExtractor:
+    """Reduces a transcript to a few visual phrases, locally and in milliseconds.
+
+    Candidate phrases are runs of up to MAX_PHRASE_WORDS content words
+    between stopwords and punctuation (a cheap stand-in for noun-phrase
+    chunking). Each is scored by its frequency, its words' IDF over the
+    bundled background corpus of generic lyric lines (so stock words like
+    "love" and "tonight" sink) and their concreteness rating (so things
+    that can be painted rise).
+    """
+
+    def __init__(self, lexicon_path: str = DEFAULT_LEXICON_PATH):
+        with open(lexicon_path, 'rb') as lexicon_file:
+            content = lexicon_file.read()
+        lexicon = json.loads(content)
+        # Changes whenever the lexicon does, so cached summaries can key on it
+        self.version = hashlib.sha256(content).hexdigest()[:12]
+        self.stopwords = frozenset(lexicon['stopwords'])
+        self.concreteness: Dict[str, float] = {}
+        for rating, words in sorted(lexicon['concreteness'].items(), reverse=True):
+            for word in words:
+                self.concreteness.setdefault(word, float(rating))
+        documents = [set(tokenize(line)) for line in lexicon['corpus']]
+        document_counts = Counter(word for document in documents for word in document)
+        self.idf = {word: math.log((len(documents) + 1) / (count + 1)) + 1
+                    for word, count in document_counts.items()}
+        self.default_idf = math.log(len(documents) + 1) + 1
+
+    def extract(self, text: str, max_phrases: int = MAX_PHRASES) -> List[str]:
+        """The best-scoring non-overlapping phrases, in the order they first occur"""
+        # phrase -> [occurrences, first position]
+        candidates: Dict[Tuple[str, ...], List[int]] = {}
+        position = 0
+        for clause in _CLAUSE_PATTERN.split(text):
+            run: List[str] = []
+            for token in tokenize(clause) + [None]:
+                if token is not None and self._is_content_word(token):
+                    run.append(token)
+                    continue
+                if run:
+                    # Phrases are head-final, so long runs keep their last words
+                    phrase = tuple(run[-MAX_PHRASE_WORDS:])
+                    entry = candidates.setdefault(phrase, [0, position])
+                    entry[0] += 1
+                    position += 1
+                run = []
+
+        chosen: List[Tuple[int, Tuple[str, ...]]] = []
+        used_words = set()
+        ranked = sorted(candidates.items(), key=lambda item: self._score(item[0], item[1][0]), reverse=True)
+        for phrase, (_, first_position) in ranked:
+            if len(chosen) >= max_phrases:
+                break
+            if used_words.intersection(phrase):
+                continue
+            chosen.append((first_position, phrase))
+            used_words.update(phrase)
+        return [' '.join(phrase) for _, phrase in sorted(chosen)]
+
+    def summarize(self, transcription: str) -> str:
+        """Short transcripts verbatim, longer ones as comma-separated visual phrases"""
+        text = (transcription or '').strip()
+        if len(text.split()) <= SHORT_TRANSCRIPT_WORDS:
+            return text
+        return ', '.join(self.extract(text))
+
+    def _is_content_word(self, token: str) -> bool:
+        return len(token) >= MIN_WORD_LENGTH and not token.isdigit() and token not in self.stopwords
+
+    def _score(self, phrase: Tuple[str, ...], occurrences: int) -> float:
+        idf = sum(self.idf.get(word, self.default_idf) for word in phrase) / len(phrase)
+        concreteness = sum(self.concreteness.get(word, DEFAULT_CONCRETENESS) for word in phrase) / len(phrase)
+        return math.sqrt(occurrences) * idf * concreteness * (1 + PHRASE_LENGTH_BONUS * (len(phrase) - 1))
+
+
+@lru_cache(maxsize=1)
+def get_extractor() -> LyricKeyphraseExtractor:
+    """Shared extractor, loaded from LYRIC_LEXICON_PATH (or the bundled lexicon) on first use"""
+    return LyricKeyphraseExtractor(os.getenv('LYRIC_LEXICON_PATH', DEFAULT_LEXICON_PATH))
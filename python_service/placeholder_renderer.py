@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageColor
+
+from seeding import seed_from
+
+RGB = Tuple[int, int, int]
+
+# Descriptive palette names used by the analyzers that PIL does not know
+COLOR_NAMES = {
+    'sage green': '#9CAF88', 'cream yellow': '#F3E5AB', 'crimson red': '#DC143C',
+    'bright red': '#FF2020', 'coral red': '#FF4040', 'golden yellow': '#FFDF00',
+    'warm brown': '#A0522D', 'warm browns': '#A0522D', 'golden browns': '#996515',
+    'organic browns': '#8B5A2B', 'rich mahogany': '#C04000', 'natural wood': '#C19A6B',
+    'warm honey': '#E3A857', 'rich amber': '#FFBF00', 'brass tones': '#B5A642',
+    'golden tones': '#E6BE8A', 'sunburst': '#E97451', 'deep reds': '#8B0000',
+    'deep blacks': '#101014', 'plum purple': '#8E4585', 'futuristic purples': '#9D00FF',
+    'electric blue': '#7DF9FF', 'electric blues': '#00BFFF', 'sky blues': '#87CEEB',
+    'natural greens': '#4F7942', 'digital greens': '#00FF7F', 'earth tones': '#8A7F5A',
+    'warm skin tones': '#E0AC69', 'metallic silver': '#AAA9AD', 'metallic finishes': '#B8B8C0',
+    'ivory and ebony': '#F0EAD6', 'neon colors': '#39FF14', 'vibrant colors': '#FF1493',
+    'vibrant hues': '#FF6F00', 'expressive colors': '#FF5E5B', 'stage lighting': '#FFD166'
+}
+
+DEFAULT_COLORS = ('sage green', 'sky blue', 'cream yellow')
+
+# How many blobs and how tight they are scale with these feature values
+ENERGY_LEVELS = {'low': 0.25, 'medium': 0.55, 'high': 0.9}
+
+DEFAULT_CACHE_SIZE = 256
+
+# Images are painted at 1/RENDER_SCALE of their final side and upscaled
+RENDER_SCALE = 2
+
+
+@lru_cache(maxsize=1024)
+def resolve_color(name: str) -> RGB:
+    """RGB for a palette color name, falling back to a stable hue for unknown names"""
+    key = name.strip().lower()
+    if key in COLOR_NAMES:
+        return ImageColor.getrgb(COLOR_NAMES[key])
+    for candidate in (key, key.replace(' ', ''), key.split()[-1] if key else '', key.rstrip('s')):
+        try:
+            return ImageColor.getrgb(candidate)
+        except ValueError:
+            continue
+    seed = seed_from(key)
+    return (96 + seed % 160, 96 + (seed >> 8) % 160, 96 + (seed >> 16) % 160)
+
+
+class PlaceholderRenderer:
+    """Audio-driven placeholder art rendered with NumPy.
+
+    Every blob is a separable Gaussian, so compositing all of them is a
+    single matrix product rather than one draw call per shape.
+    Rendered images are kept in an LRU keyed by the render inputs.
+    """
+
+    def __init__(self, size: int = 512, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple[Any, ...], Image.Image]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render_for_features(self, features: Any = None, colors: Sequence[str] = None, seed: int = 0) -> Image.Image:
+        """Render from analyzer features and a palette of color names"""
+        features = features or {}
+        energy = ENERGY_LEVELS.get(features.get('energy_level', 'medium'), 0.55)
+        tempo = features.get('estimated_tempo', 120)
+        dark = features.get('brightness') == 'dark'
+        palette = tuple(resolve_color(name) for name in (colors or DEFAULT_COLORS))
+        return self.render(palette, energy, tempo, seed, dark)
+
+    def render(self, palette: Tuple[RGB, ...], energy: float, tempo: float, seed: int, dark: bool = False) -> Image.Image:
+        """Render (or reuse) one image; the result is a copy safe to modify"""
+        key = (palette, round(energy, 3), int(tempo), seed, dark)
+        # Pipelines render from several threads; the lock only guards the
+        # LRU, and cached images are never modified, so copying needs none
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+        if image is None:
+            image = Image.fromarray(self._render_array(palette, energy, tempo, seed, dark), 'RGB')
+            if image.width != self.size:
+                image = image.resize((self.size, self.size), Image.NEAREST)
+            with self._lock:
+                self._cache[key] = image
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return image.copy()
+
+    def _render_array(self, palette: Tuple[RGB, ...], energy: float, tempo: float, seed: int, dark: bool) -> np.ndarray:
+        # Everything is smooth, so paint at reduced resolution in float32,
+        # channel-first, and let PIL upscale the finished buffer (nearest
+        # is indistinguishable here and an order of magnitude cheaper)
+        side = self.size // RENDER_SCALE
+        grid = np.arange(side, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        colors = np.array(palette, dtype=np.float32)
+        pace = float(np.clip((tempo - 60) / 120, 0, 1))
+
+        # Background: vertical gradient between the first two palette colors
+        shade = 0.5 if dark else 1.0
+        top = colors[0] * (0.35 * shade)
+        bottom = colors[min(1, len(colors) - 1)] * (0.2 * shade)
+        t = grid / (side - 1)
+        background = (top[:, None] * (1 - t) + bottom[:, None] * t)[:, :, None]
+
+        # Blobs: more with energy, smaller and tighter with tempo
+        count = 8 + int(energy * 40)
+        centers = rng.uniform(0, side, (2, count, 1)).astype(np.float32)
+        sigmas = (side * (0.14 - 0.08 * pace) * rng.uniform(0.5, 1.5, (count, 1))).astype(np.float32)
+        blob_colors = colors[rng.integers(0, len(colors), count)] * rng.uniform(0.8, 1.2, (count, 1)).astype(np.float32)
+        # Capping the exponent keeps far tails out of the denormal range,
+        # which would otherwise slow the matrix product several times over
+        along_x = np.exp(-np.minimum(np.square((grid - centers[0]) / sigmas), 30))
+        along_y_t = np.exp(-np.minimum(np.square((grid - centers[1]) / sigmas), 30)).T
+
+        # Blob weights and the three color channels in one matrix product:
+        # row k of the right-hand side is along_x scaled by coefficient k
+        coefficients = np.vstack([np.ones((1, count), dtype=np.float32), blob_colors.T])
+        scaled = (coefficients[:, :, None] * along_x).transpose(1, 0, 2).reshape(count, 4 * side)
+        fields = (along_y_t @ scaled).reshape(side, 4, side).transpose(1, 0, 2)
+        weight, paint = fields[0], fields[1:]
+        coverage = 1 - np.exp(-weight * np.float32(1.5 + 2 * energy))
+
+        # Rhythm: a soft interference pattern whose frequency follows tempo
+        frequency = np.float32((4 + 12 * pace) * np.pi / side)
+        phase = rng.uniform(0, 2 * np.pi, 2).astype(np.float32)
+        shimmer = 1 + np.float32(0.05 + 0.08 * energy) * np.outer(np.sin(grid * frequency + phase[0]),
+                                                                   np.cos(grid * frequency + phase[1]))
+
+        image = background * ((1 - coverage) * shimmer) + paint * (coverage / np.maximum(weight, 1e-6) * shimmer)
+        np.clip(image, 0, 255, out=image)
+        return np.ascontiguousarray(image.astype(np.uint8).transpose(1, 2, 0))
+
+    def cache_info(self) -> Dict[str, int]:
+        return {'entries': len(self._cache), 'max_entries': self.cache_size}
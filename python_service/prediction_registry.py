@@ -0,0 +1,205 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from cancellation import CancelToken
+
+TERMINAL_STATUSES = ('succeeded', 'failed', 'canceled')
+
+# The sweeper wakes this often and polls predictions that have had no
+# webhook for at least DEFAULT_SWEEP_AFTER seconds
+DEFAULT_SWEEP_INTERVAL = 10
+DEFAULT_SWEEP_AFTER = 20
+
+# Webhooks that arrive before their prediction is registered are kept briefly
+EARLY_DELIVERY_LIMIT = 256
+
+# Signed webhooks older than this are rejected as replays
+SIGNATURE_TOLERANCE_SECONDS = 300
+
+StatusFetcher = Callable[[], Optional[Dict[str, Any]]]
+StatusListener = Callable[[str], None]
+
+
+def replicate_api_base() -> str:
+    """Replicate API root; REPLICATE_API_BASE points it elsewhere (e.g. a local fake server)"""
+    return os.getenv('REPLICATE_API_BASE', 'https://api.replicate.com/v1').rstrip('/')
+
+
+class _Pending:
+    """A registered prediction waiting for its terminal status"""
+
+    __slots__ = ('future', 'fetch', 'on_status', 'status', 'last_seen')
+
+    def __init__(self, fetch: StatusFetcher, on_status: Optional[StatusListener]):
+        self.future: Future = Future()
+        self.fetch = fetch
+        self.on_status = on_status
+        self.status = None
+        self.last_seen = time.time()
+
+
+class PredictionRegistry:
+    """Completion futures for Replicate predictions, keyed by prediction id.
+
+    Processors register each prediction they create and wait on its future;
+    the webhook endpoint resolves it. A sweeper thread polls only predictions
+    that have gone quiet, so a missed webhook costs a status request rather
+    than a stuck stage. Without a webhook URL the registry is disabled and
+    processors poll as before.
+    """
+
+    def __init__(self, webhook_url: str = None, secret: str = None,
+                 sweep_interval: float = DEFAULT_SWEEP_INTERVAL, sweep_after: float = DEFAULT_SWEEP_AFTER):
+        self.webhook_url = webhook_url
+        self.secret = secret
+        self.sweep_interval = sweep_interval
+        self.sweep_after = sweep_after
+        self._pending: Dict[str, _Pending] = {}
+        self._early: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._counts = {'webhooks': 0, 'swept': 0, 'timeouts': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.webhook_url)
+
+    def webhook_fields(self) -> Dict[str, Any]:
+        """Extra prediction payload fields that route completion back to us"""
+        if not self.enabled:
+            return {}
+        return {'webhook': self.webhook_url, 'webhook_events_filter': ['start', 'completed']}
+
+    def wait(self, prediction_id: str, fetch: StatusFetcher, timeout: float,
+             on_status: StatusListener = None, cancel: CancelToken = None,
+             refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Block until the prediction reaches a terminal status; returns its data, or None on timeout.
+
+        fetch() returns the prediction's current status data and is used by
+        the sweeper, and at once with refresh (for a prediction re-attached
+        after a restart, whose webhooks may already have come and gone);
+        on_status(status) is called on every change. A fired cancel token
+        ends the wait early with a 'canceled' status.
+        """
+        entry = _Pending(fetch, on_status)
+        with self._lock:
+            self._pending[prediction_id] = entry
+            early = self._early.pop(prediction_id, None)
+            self._ensure_sweeper()
+        if early is not None:
+            self._resolve(prediction_id, entry, early)
+        elif refresh:
+            try:
+                status_data = fetch()
+            except Exception as e:
+                print(f"⚠️ Could not fetch prediction {prediction_id}: {e}")
+                status_data = None
+            if status_data is not None:
+                self._resolve(prediction_id, entry, status_data)
+        
+        def cancelled():
+            try:
+                entry.future.set_result({'id': prediction_id, 'status': 'canceled', 'error': cancel.reason})
+            except InvalidStateError:
+                pass
+        
+        if cancel is not None:
+            cancel.add_callback(cancelled)
+        try:
+            return entry.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._counts['timeouts'] += 1
+            return None
+        finally:
+            if cancel is not None:
+                cancel.remove_callback(cancelled)
+            with self._lock:
+                self._pending.pop(prediction_id, None)
+
+    def deliver(self, status_data: Dict[str, Any]):
+        """Record a webhook (or swept) status update for a prediction"""
+        prediction_id = status_data.get('id')
+        if not prediction_id:
+            return
+        with self._lock:
+            self._counts['webhooks'] += 1
+            entry = self._pending.get(prediction_id)
+            if entry is None:
+                # The webhook beat the creating request's response
+                self._early[prediction_id] = status_data
+                while len(self._early) > EARLY_DELIVERY_LIMIT:
+                    self._early.popitem(last=False)
+                return
+        self._resolve(prediction_id, entry, status_data)
+
+    def _resolve(self, prediction_id: str, entry: _Pending, status_data: Dict[str, Any]):
+        status = status_data.get('status')
+        entry.last_seen = time.time()
+        if status != entry.status:
+            entry.status = status
+            if entry.on_status:
+                entry.on_status(status)
+        if status in TERMINAL_STATUSES:
+            try:
+                entry.future.set_result(status_data)
+            except InvalidStateError:
+                pass
+
+    def verify(self, headers: Mapping[str, str], body: bytes) -> bool:
+        """Check a webhook's signature; always passes when no secret is configured"""
+        if not self.secret:
+            return True
+        webhook_id = headers.get('webhook-id', '')
+        timestamp = headers.get('webhook-timestamp', '')
+        signatures = headers.get('webhook-signature', '')
+        try:
+            if abs(time.time() - int(timestamp)) > SIGNATURE_TOLERANCE_SECONDS:
+                return False
+            key = base64.b64decode(self.secret.split('_', 1)[-1])
+        except ValueError:
+            return False
+        signed = f"{webhook_id}.{timestamp}.".encode('utf-8') + body
+        expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode('ascii')
+        return any(hmac.compare_digest(expected, candidate.split(',', 1)[-1])
+                   for candidate in signatures.split())
+
+    # Fallback polling for missed webhooks
+    def _ensure_sweeper(self):
+        # Caller holds the lock
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='prediction-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+
+    def sweep(self):
+        """Poll every prediction that has not been heard from for sweep_after seconds"""
+        cutoff = time.time() - self.sweep_after
+        with self._lock:
+            quiet = [(prediction_id, entry) for prediction_id, entry in self._pending.items()
+                     if entry.last_seen < cutoff]
+        for prediction_id, entry in quiet:
+            try:
+                status_data = entry.fetch()
+            except Exception as e:
+                print(f"⚠️ Sweeper could not fetch prediction {prediction_id}: {e}")
+                continue
+            if status_data is not None:
+                with self._lock:
+                    self._counts['swept'] += 1
+                self._resolve(prediction_id, entry, status_data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'enabled': self.enabled, 'pending': len(self._pending), **self._counts}
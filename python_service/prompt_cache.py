@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class TwoLevelCache:
+    """Bounded in-memory LRU in front of an optional on-disk tier.
+
+    Keys are tuples of JSON-serializable values (normalized features,
+    instrument names, template version, ...) and values must be JSON
+    serializable too. Disk entries are one small JSON file per key, so
+    they survive restarts and can be shared between worker processes.
+    """
+
+    def __init__(self, name: str, max_entries: int = DEFAULT_MAX_ENTRIES, directory: str = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.directory = os.path.join(directory, name) if directory else None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self._entries: 'OrderedDict[Tuple[Any, ...], Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def get_or_compute(self, key: Tuple[Any, ...], compute: Callable[[], Any]) -> Any:
+        """Cached value for key, computing (and storing) it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._counts['memory_hits'] += 1
+                return self._entries[key]
+
+        value = self._read_disk(key)
+        if value is not None:
+            tier = 'disk_hits'
+        else:
+            tier = 'misses'
+            value = compute()
+            self._write_disk(key, value)
+
+        with self._lock:
+            self._counts[tier] += 1
+            self._entries[key] = value
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _path(self, key: Tuple[Any, ...]) -> str:
+        digest = hashlib.sha256(json.dumps(key, separators=(',', ':')).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _read_disk(self, key: Tuple[Any, ...]) -> Optional[Any]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as entry_file:
+                return json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: Tuple[Any, ...], value: Any):
+        if not self.directory:
+            return
+        path = self._path(key)
+        # Each writer stages its own file, so processes filling the same
+        # entry at once cannot interleave their bytes; the last rename wins
+        staging_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(staging_path, 'w') as entry_file:
+                json.dump(value, entry_file)
+            os.replace(staging_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write {self.name} cache entry: {e}")
+
+    def clear(self):
+        """Drop the in-memory tier (disk entries stay valid for their keys)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = sum(self._counts.values())
+            hits = self._counts['memory_hits'] + self._counts['disk_hits']
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk': bool(self.directory),
+                **self._counts,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+            }
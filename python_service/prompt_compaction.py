@@ -0,0 +1,115 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+# CLIP's text encoder reads 77 tokens, two of which are its start and end markers
+DEFAULT_TOKEN_BUDGET = 75
+
+# CLIP's BPE keeps most words up to this length whole and splits longer
+# ones roughly every LONG_WORD_CHUNK characters
+WHOLE_WORD_LENGTH = 8
+LONG_WORD_CHUNK = 6
+
+# Truncated fragments keep at least this many words, or are dropped
+MIN_TRUNCATED_WORDS = 4
+
+# CLIP's pre-tokenizer split: contractions, letter runs, single digits, punctuation runs
+_TOKEN_PATTERN = re.compile(r"'s|'t|'re|'ve|'m|'ll|'d|[^\W\d_]+|\d|[^\s\w]+|_+", re.IGNORECASE)
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+
+# Fragment tiers, most important first; the first matching pattern wins and
+# anything unmatched is a style directive
+TIER_PALETTE, TIER_MOOD, TIER_INSTRUMENTS, TIER_LYRICS, TIER_STYLE, TIER_BOILERPLATE = range(6)
+_TIER_PATTERNS = (
+    (TIER_PALETTE, re.compile(r'featuring|colou?r (style|palette)', re.IGNORECASE)),
+    (TIER_MOOD, re.compile(r'\b(mood|energy)\b', re.IGNORECASE)),
+    (TIER_INSTRUMENTS, re.compile(r'instrument', re.IGNORECASE)),
+    (TIER_LYRICS, re.compile(r'^audio content:', re.IGNORECASE)),
+    (TIER_BOILERPLATE, re.compile(r'^(high quality|detailed|professional digital art|artistic|creative|'
+                                  r'expressive|dynamic|visually striking|vibrant composition)$', re.IGNORECASE))
+)
+# Tiers that are cut down to the remaining budget instead of dropped
+TRUNCATABLE_TIERS = (TIER_LYRICS,)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate CLIP token count (no start/end markers), without loading a vocabulary"""
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if len(piece) <= WHOLE_WORD_LENGTH:
+            tokens += 1
+        else:
+            tokens += 1 + (len(piece) - WHOLE_WORD_LENGTH + LONG_WORD_CHUNK - 1) // LONG_WORD_CHUNK
+    return tokens
+
+
+def fragment_tier(fragment: str) -> int:
+    """Importance tier of a prompt fragment: palette, mood, instruments, lyrics, style, boilerplate"""
+    for tier, pattern in _TIER_PATTERNS:
+        if pattern.search(fragment):
+            return tier
+    return TIER_STYLE
+
+
+def _normalize(fragment: str) -> str:
+    return ' '.join(_WORD_PATTERN.findall(fragment.lower()))
+
+
+def _truncate(fragment: str, budget: int) -> Optional[str]:
+    """Longest word prefix of fragment within budget tokens, keeping a closing quote"""
+    words = fragment.split()
+    closing = "'" if fragment.endswith("'") else ''
+    # Tokens never span whitespace, so a prefix costs the sum of its words
+    used = count_tokens(closing)
+    length = 0
+    for word in words[:-1]:
+        used += count_tokens(word)
+        if used > budget:
+            break
+        length += 1
+    if length < MIN_TRUNCATED_WORDS:
+        return None
+    return ' '.join(words[:length]).rstrip(",;:'") + closing
+
+
+def compact_prompt(fragments: List[str], budget: Optional[int] = DEFAULT_TOKEN_BUDGET,
+                   rank: Optional[Callable[[str], int]] = fragment_tier, separator: str = ', ') -> str:
+    """Deduplicate fragments and keep the most important ones that fit in budget tokens.
+
+    Fragments are chosen by rank (lower first; earlier first within a rank,
+    or purely by position when rank is None) and joined in their original
+    order. A budget of None or 0 only deduplicates.
+    """
+    tiers = [rank(fragment) if rank else 0 for fragment in fragments]
+    separator_tokens = count_tokens(separator)
+    # index -> (fragment, padded normalized text, tokens)
+    chosen: Dict[int, Tuple[str, str, int]] = {}
+    for index in sorted(range(len(fragments)), key=lambda index: (tiers[index], index)):
+        fragment = fragments[index].strip()
+        normalized = f" {_normalize(fragment)} "
+        if not normalized.strip() or any(normalized in text for _, text, _ in chosen.values()):
+            continue
+        # A fragment replaces the chosen ones it repeats
+        kept = [other for other, (_, text, _) in chosen.items() if text not in normalized]
+        tokens = count_tokens(fragment)
+        if budget and budget > 0:
+            room = budget - sum(chosen[other][2] + separator_tokens for other in kept)
+            if tokens > room:
+                if tiers[index] not in TRUNCATABLE_TIERS:
+                    continue
+                fragment = _truncate(fragment, room)
+                if fragment is None:
+                    continue
+                normalized, tokens = f" {_normalize(fragment)} ", count_tokens(fragment)
+        chosen = {other: chosen[other] for other in kept}
+        chosen[index] = (fragment, normalized, tokens)
+    return separator.join(chosen[index][0] for index in sorted(chosen))
+
+
+def prompt_report(before: str, after: str) -> Dict[str, int]:
+    """Token and byte counts of a prompt before and after compaction"""
+    return {
+        'tokens_before': count_tokens(before),
+        'tokens_after': count_tokens(after),
+        'bytes_before': len(before.encode('utf-8')),
+        'bytes_after': len(after.encode('utf-8'))
+    }
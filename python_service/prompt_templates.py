@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import random
+import string
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+DEFAULT_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompt_templates.json')
+
+# The template file is checked for changes at most this often
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+# A compiled part appends its text to the output list
+Part = Callable[['_Context', Optional[random.Random], List[str]], None]
+Condition = Callable[['_Context'], bool]
+
+_formatter = string.Formatter()
+
+
+class _Context:
+    """Template values: render-time extras first, then the feature record, then template defaults"""
+
+    __slots__ = ('features', 'extras', 'defaults')
+
+    def __init__(self, features: Any, extras: Dict[str, Any], defaults: Dict[str, Any]):
+        self.features = features
+        self.extras = extras
+        self.defaults = defaults
+
+    def __getitem__(self, name: str) -> Any:
+        if name in self.extras:
+            return self.extras[name]
+        default = self.defaults.get(name)
+        if self.features is None:
+            return default
+        return self.features.get(name, default)
+
+
+class CompiledTemplate:
+    """One template compiled to a flat list of part functions"""
+
+    __slots__ = ('name', 'separator', 'defaults', 'parts')
+
+    def __init__(self, name: str, separator: str, defaults: Dict[str, Any], parts: List[Part]):
+        self.name = name
+        self.separator = separator
+        self.defaults = defaults
+        self.parts = parts
+
+    def render(self, features: Any = None, rng: random.Random = None, **extras: Any) -> str:
+        context = _Context(features, extras, self.defaults)
+        output: List[str] = []
+        for part in self.parts:
+            part(context, rng, output)
+        return self.separator.join(output)
+
+
+class PromptTemplates:
+    """Prompt templates loaded from a JSON file and compiled once.
+
+    Each template is a list of parts: format strings over feature fields
+    and render-time values, lookups, conditions, per-instrument tables and
+    random samples (see prompt_templates.json). The file is re-read when it
+    changes, and ``version`` (declared version plus a content hash) changes
+    with it, so it can key caches of rendered prompts.
+    """
+
+    def __init__(self, path: str = DEFAULT_TEMPLATES_PATH, reload_interval: float = DEFAULT_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.version = ''
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def render(self, name: str, features: Any = None, rng: random.Random = None, **extras: Any) -> str:
+        """Render a template from a feature record (anything with .get) and extra values"""
+        return self.template(name).render(features, rng, **extras)
+
+    def template(self, name: str) -> CompiledTemplate:
+        self._maybe_reload()
+        return self._templates[name]
+
+    def names(self) -> List[str]:
+        return sorted(self._templates)
+
+    # Loading
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                changed = os.stat(self.path).st_mtime != self._mtime
+            except OSError:
+                return
+        if changed:
+            self._load()
+
+    def _load(self):
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+                with open(self.path, 'rb') as template_file:
+                    content = template_file.read()
+                spec = json.loads(content)
+                templates = _compile_all(spec['templates'])
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if not self._templates:
+                    raise
+                # Keep serving the last good templates
+                print(f"⚠️ Could not reload prompt templates, keeping version {self.version}: {e}")
+                self._mtime = os.stat(self.path).st_mtime if os.path.exists(self.path) else None
+                return
+            self._templates = templates
+            self._mtime = mtime
+            self.version = f"{spec.get('version', 0)}-{hashlib.sha256(content).hexdigest()[:12]}"
+        print(f"📝 Loaded {len(templates)} prompt templates (version {self.version})")
+
+
+# Compilation
+def _compile_all(specs: Mapping[str, Any]) -> Dict[str, CompiledTemplate]:
+    templates = {}
+    for name, spec in specs.items():
+        parts = _compile_parts(spec['parts'], specs, (name,))
+        templates[name] = CompiledTemplate(name, spec.get('separator', ' | '), spec.get('defaults', {}), parts)
+    return templates
+
+
+def _compile_parts(specs: List[Any], all_specs: Mapping[str, Any], including: tuple) -> List[Part]:
+    parts: List[Part] = []
+    for spec in specs:
+        if isinstance(spec, dict) and 'include' in spec:
+            # Inline another template's parts (its defaults do not come along)
+            name = spec['include']
+            if name in including:
+                raise ValueError(f"template include cycle: {' -> '.join(including + (name,))}")
+            parts.extend(_compile_parts(all_specs[name]['parts'], all_specs, including + (name,)))
+        else:
+            parts.append(_compile_part(spec, all_specs, including))
+    return parts
+
+
+def _compile_part(spec: Any, all_specs: Mapping[str, Any], including: tuple) -> Part:
+    if isinstance(spec, str):
+        return _compile_text(spec)
+
+    if 'if' in spec:
+        condition = _compile_condition(spec['if'])
+        then = _compile_parts(spec['then'], all_specs, including)
+        def conditional(context, rng, output):
+            if condition(context):
+                for part in then:
+                    part(context, rng, output)
+        return conditional
+
+    if 'first' in spec:
+        # First matching case wins; a case without 'if' always matches
+        cases = [(_compile_condition(case['if']) if 'if' in case else None,
+                  _compile_parts(case['then'], all_specs, including))
+                 for case in spec['first']]
+        def first(context, rng, output):
+            for condition, then in cases:
+                if condition is None or condition(context):
+                    for part in then:
+                        part(context, rng, output)
+                    return
+        return first
+
+    if 'lookup' in spec:
+        field, table = spec['lookup'], dict(spec['cases'])
+        default = spec.get('default')
+        def lookup(context, rng, output):
+            text = table.get(context[field], default)
+            if text is not None:
+                output.append(text)
+        return lookup
+
+    if 'each' in spec:
+        # One table lookup per item of a list value, e.g. detected instruments
+        field, key, table = spec['each'], spec['key'], dict(spec['cases'])
+        limit = spec.get('limit')
+        def each(context, rng, output):
+            for item in (context[field] or [])[:limit]:
+                text = table.get(item[key])
+                if text is not None:
+                    output.append(text)
+        return each
+
+    if 'sample' in spec:
+        choices, count = list(spec['sample']), spec['count']
+        def sample(context, rng, output):
+            output.extend((rng or random).sample(choices, count))
+        return sample
+
+    raise ValueError(f"unknown template part: {spec!r}")
+
+
+def _compile_text(text: str) -> Part:
+    fields = [field for _, field, _, _ in _formatter.parse(text) if field is not None]
+    if not fields:
+        constant = text.replace('{{', '{').replace('}}', '}')
+        return lambda context, rng, output: output.append(constant)
+    format_map = text.format_map
+    return lambda context, rng, output: output.append(format_map(context))
+
+
+def _compile_condition(spec: Mapping[str, Any]) -> Condition:
+    """All keys must hold: field equality/membership, 'any', 'not', 'present' and 'contains'"""
+    checks: List[Condition] = []
+    for key, value in spec.items():
+        if key == 'any':
+            alternatives = [_compile_condition(alternative) for alternative in value]
+            checks.append(lambda context, alternatives=alternatives: any(check(context) for check in alternatives))
+        elif key == 'not':
+            inner = _compile_condition(value)
+            checks.append(lambda context, inner=inner: not inner(context))
+        elif key == 'present':
+            checks.append(lambda context, field=value: bool(context[field]))
+        elif key == 'contains':
+            # Case-insensitive substring test on text values
+            needles = [(field, tuple(text.lower() for text in texts)) for field, texts in value.items()]
+            checks.append(lambda context, needles=needles: all(
+                any(text in str(context[field]).lower() for text in texts) for field, texts in needles))
+        elif isinstance(value, list):
+            checks.append(lambda context, field=key, allowed=frozenset(value): context[field] in allowed)
+        else:
+            checks.append(lambda context, field=key, expected=value: context[field] == expected)
+    if len(checks) == 1:
+        return checks[0]
+    return lambda context: all(check(context) for check in checks)
+
+
+_engine: Optional[PromptTemplates] = None
+_engine_lock = threading.Lock()
+
+
+def get_templates() -> PromptTemplates:
+    """Shared template engine, loaded from PROMPT_TEMPLATES_PATH (or the bundled file) on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PromptTemplates(os.getenv('PROMPT_TEMPLATES_PATH', DEFAULT_TEMPLATES_PATH))
+    return _engine
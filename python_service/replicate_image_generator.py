@@ -1,16 +1,123 @@
 import os
+import random
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import base64
 from io import BytesIO
 from PIL import Image
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
+from seeding import seeded_random
+from cancellation import CancelToken
+from fair_queue import get_prediction_slots
+from job_store import JobJournal, start_prediction
+from prediction_registry import PredictionRegistry, TERMINAL_STATUSES, replicate_api_base
+from image_backends import ImageBackend, ProceduralBackend, PlaceholderBackend
+from prompt_templates import get_templates
+from prompt_compaction import DEFAULT_TOKEN_BUDGET, compact_prompt, prompt_report
+
+# Streaming download limits for generated images
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 60
+
+# Predictions are given this long to finish; without webhooks they are
+# polled every POLL_INTERVAL seconds
+PREDICTION_TIMEOUT = 60
+POLL_INTERVAL = 2
+
+# SDXL returns at most this many images per prediction
+MAX_OUTPUTS_PER_PREDICTION = 4
+
+# Render settings per quality; previews trade detail for a much shorter wait
+QUALITY_PRESETS = {
+    'full': {'width': 1024, 'height': 1024, 'num_inference_steps': 50},
+    'preview': {'width': 512, 'height': 512, 'num_inference_steps': 12}
+}
+
+# Everything SDXL is steered away from; repeats are removed and the rest
+# trimmed to the token budget once per generator
+NEGATIVE_PROMPT = (
+    "black and white, monochrome, grayscale, colorless, dull, muted, dark, gloomy, boring, plain, "
+    "simple, minimal, no color, desaturated, low contrast, sketch, drawing, pencil, charcoal, ugly, "
+    "distorted, blurry, low quality, pixelated, abstract art, abstract shapes, geometric patterns, "
+    "abstract composition, abstract design, abstract forms, abstract elements, abstract style, "
+    "abstract painting, abstract drawing, abstract illustration, abstract graphics, abstract visual, "
+    "abstract artwork, abstract imagery, abstract representation, abstract concept, abstract "
+    "expression, abstract movement, abstract lines, abstract curves, abstract textures, abstract "
+    "patterns, abstract motifs, abstract symbols, abstract elements, abstract shapes, abstract forms,"
+    " abstract composition, abstract design, abstract style, abstract painting, abstract drawing, "
+    "abstract illustration, abstract graphics, abstract visual, abstract artwork, abstract imagery, "
+    "abstract representation, abstract concept, abstract expression, abstract movement, abstract "
+    "lines, abstract curves, abstract textures, abstract patterns, abstract motifs, abstract symbols"
+)
+
+# Leading bytes of the image formats we accept, with the extension to save under
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif')
+)
+
+def image_extension(header: bytes) -> Optional[str]:
+    """File extension for an image's leading bytes, or None if unrecognised"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return '.webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+def _variant_rngs(rng: random.Random, count: int) -> List[random.Random]:
+    """rng itself for the first variant, independent streams derived from its state for the rest"""
+    fork = random.Random()
+    fork.setstate(rng.getstate())
+    return [rng] + [random.Random(fork.getrandbits(64)) for _ in range(count - 1)]
+
+class ReplicateBackend(ImageBackend):
+    """Replicate API tier; available when an API key is configured"""
+    
+    name = 'replicate'
+    
+    def __init__(self, generator: 'ReplicateImageGenerator'):
+        self.generator = generator
+    
+    def is_available(self) -> bool:
+        return bool(self.generator.api_key)
+    
+    def generate(self, prompt: str, rng: random.Random, features: Dict[str, Any] = None,
+                 colors: List[str] = None, **options: Any) -> Optional[Image.Image]:
+        return self.generator._generate_with_replicate(prompt, options.get('model_type', 'realistic'), rng)
+    
+    def generate_to_file(self, prompt: str, output_path: str, rng: random.Random, features: Dict[str, Any] = None,
+                         colors: List[str] = None, **options: Any) -> Optional[str]:
+        return self.generator._generate_file_with_replicate(prompt, output_path, options.get('model_type', 'realistic'), rng)
+    
+    def generate_many_to_files(self, prompts: List[str], output_paths: List[str], rngs: List[random.Random],
+                               features: Dict[str, Any] = None, colors: List[str] = None,
+                               **options: Any) -> List[Optional[str]]:
+        return self.generator._generate_files_with_replicate(prompts, output_paths, options.get('model_type', 'realistic'),
+                                                             rngs, options.get('quality', 'full'),
+                                                             options.get('listener'), options.get('on_image'),
+                                                             options.get('cancel'))
 
 class ReplicateImageGenerator:
     """Image generator using Replicate API"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, registry: PredictionRegistry = None):
         self.api_key = api_key or os.getenv('REPLICATE_API_KEY')
-        self.base_url = "https://api.replicate.com/v1/predictions"
+        self.base_url = f"{replicate_api_base()}/predictions"
+        # Completion webhooks replace polling when the registry is enabled
+        self.registry = registry
+        
+        # SDXL's CLIP encoders ignore tokens past their window, so prompts are
+        # compacted to this many tokens (0 disables the budget)
+        self.token_budget = int(os.getenv('PROMPT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET))
+        fragments = NEGATIVE_PROMPT.split(', ')
+        self.negative_prompt = compact_prompt(fragments, self.token_budget, rank=None)
         
         # Popular models on Replicate
         self.models = {
@@ -19,182 +126,441 @@ class ReplicateImageGenerator:
             "anime": "cjwbw/anything-v3-better-vae:09a5805203f4c12da649ec1923bb7729517ca25fcac790e640eaa9ed66573b65",
             "artistic": "prompthero/openjourney:ad59ca21177f9e217b907481edde9dacfbdb29d5a0ac332e583b64bd646bffaa"
         }
+        
+        # Generator backends in priority order; local tiers need no API key
+        self.backends = {
+            'replicate': {'backend': ReplicateBackend(self), 'priority': 1},
+            'procedural': {'backend': ProceduralBackend(), 'priority': 2},
+            'placeholder': {'backend': PlaceholderBackend(), 'priority': 3}
+        }
+    
+    def register_backend(self, name: str, backend: ImageBackend, priority: int):
+        """Add or replace a backend; lower priority numbers are tried first"""
+        self.backends[name] = {'backend': backend, 'priority': priority}
     
-    def generate_image(self, prompt: str, model_type: str = "realistic") -> Image.Image:
-        """Generate image using Replicate API"""
+    def _candidate_backends(self, backend: str = None) -> List[Any]:
+        """(name, backend) pairs to try, in order"""
+        if backend is not None:
+            candidates = [(backend, self.backends[backend])]
+        else:
+            candidates = sorted(self.backends.items(), key=lambda item: item[1]['priority'])
+        return [(name, config['backend']) for name, config in candidates if config['backend'].is_available()]
+    
+    def generate_image(self, prompt: str, model_type: str = "realistic", rng: random.Random = None,
+                       features: Dict[str, Any] = None, colors: List[str] = None, backend: str = None) -> Image.Image:
+        """Generate an image with the first available backend that succeeds.
+
+        Pass backend to force a tier (e.g. 'procedural' for previews or load
+        shedding); features and colors drive the local renderers.
+        """
+        if rng is None:
+            # Same prompt, same enhancements and fallback art
+            rng = seeded_random(prompt)
         
-        if not self.api_key:
-            print("No Replicate API key found, using placeholder")
-            return self._create_placeholder_image(prompt)
+        for backend_name, image_backend in self._candidate_backends(backend):
+            try:
+                image = image_backend.generate(prompt, rng, features, colors, model_type=model_type)
+                if image is not None:
+                    print(f"🖼️ Image generated with {backend_name} backend")
+                    return image
+            except Exception as e:
+                print(f"❌ {backend_name} backend failed: {e}")
         
+        # Every tier failed (or the forced one did); the placeholder cannot
+        return self.backends['placeholder']['backend'].generate(prompt, rng, features, colors)
+    
+    def generate_image_file(self, prompt: str, output_path: str, model_type: str = "realistic",
+                            rng: random.Random = None, features: Dict[str, Any] = None,
+                            colors: List[str] = None, backend: str = None) -> str:
+        """Generate an image straight to disk and return the path written.
+
+        Remote outputs are streamed to the file without being decoded, and
+        the extension follows the actual image format. Use generate_image when
+        the pixels are needed.
+        """
+        if rng is None:
+            rng = seeded_random(prompt)
+        
+        for backend_name, image_backend in self._candidate_backends(backend):
+            try:
+                written_path = image_backend.generate_to_file(prompt, output_path, rng, features, colors,
+                                                              model_type=model_type)
+                if written_path is not None:
+                    print(f"🖼️ Image generated with {backend_name} backend")
+                    return written_path
+            except Exception as e:
+                print(f"❌ {backend_name} backend failed: {e}")
+        
+        return self.backends['placeholder']['backend'].generate_to_file(prompt, output_path, rng, features, colors)
+    
+    def generate_image_files(self, prompts: List[str], output_paths: List[str], variants: int = 1,
+                             model_type: str = "realistic", rngs: List[random.Random] = None,
+                             features: Dict[str, Any] = None, colors: List[str] = None,
+                             backend: str = None, quality: str = 'full',
+                             listener: Callable[[str, Dict[str, Any]], None] = None,
+                             cancel: CancelToken = None) -> List[List[str]]:
+        """Generate `variants` images for each prompt and return their paths, per prompt.
+
+        Replicate gets one prediction per distinct prompt (using num_outputs
+        for the variants) and all predictions run concurrently, so a batch
+        takes about as long as its slowest prediction. Items a backend fails
+        fall through to the next tier. With one variant the paths are
+        output_paths themselves; otherwise each gets a _v<n> suffix.
+        quality='preview' asks remote backends for a small, low-step render.
+        listener(event, data), if given, receives 'prediction' status changes
+        (the 'created' one with the prompt's compaction counts) and an 'image' event (prompt_index, variant, path) as each file lands.
+        A fired cancel token cancels the batch's running predictions and
+        raises JobCancelled instead of falling through to the next backend.
+        """
+        if rngs is None:
+            rngs = [seeded_random(prompt) for prompt in prompts]
+        
+        # Flatten to one item per image
+        item_prompts, item_paths, item_rngs = [], [], []
+        for prompt, output_path, rng in zip(prompts, output_paths, rngs):
+            stem, extension = os.path.splitext(output_path)
+            for variant, variant_rng in enumerate(_variant_rngs(rng, variants)):
+                item_prompts.append(prompt)
+                item_paths.append(output_path if variants == 1 else f"{stem}_v{variant + 1}{extension}")
+                item_rngs.append(variant_rng)
+        
+        def image_written(index: int, path: str):
+            if listener:
+                listener('image', {'prompt_index': index // variants, 'variant': index % variants, 'path': path})
+        
+        written: List[Optional[str]] = [None] * len(item_prompts)
+        for backend_name, image_backend in self._candidate_backends(backend):
+            pending = [index for index, path in enumerate(written) if path is None]
+            if not pending:
+                break
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            results = image_backend.generate_many_to_files(
+                [item_prompts[i] for i in pending], [item_paths[i] for i in pending],
+                [item_rngs[i] for i in pending], features, colors, model_type=model_type, quality=quality,
+                listener=listener, on_image=lambda position, path: image_written(pending[position], path),
+                cancel=cancel)
+            for index, path in zip(pending, results):
+                written[index] = path
+            print(f"🖼️ {sum(path is not None for path in results)}/{len(pending)} images generated with {backend_name} backend")
+        
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        placeholder = self.backends['placeholder']['backend']
+        for index, path in enumerate(written):
+            if path is None:
+                written[index] = placeholder.generate_to_file(item_prompts[index], item_paths[index],
+                                                              item_rngs[index], features, colors)
+                image_written(index, written[index])
+        
+        return [written[start:start + variants] for start in range(0, len(written), variants)]
+    
+    def _generate_with_replicate(self, prompt: str, model_type: str, rng: random.Random) -> Optional[Image.Image]:
+        """Generate image using Replicate API, or None on failure"""
         try:
-            model = self.models.get(model_type, self.models["realistic"])
+            image_urls = self._run_prediction(prompt, model_type, rng)
+            if image_urls is None:
+                return None
+            image_url = image_urls[0]
             
-            headers = {
-                "Authorization": f"Token {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            # Decoding needs the whole body; prefer _generate_file_with_replicate
+            # when the image only has to end up on disk
+            img_response = requests.get(image_url, timeout=DOWNLOAD_TIMEOUT)
+            if img_response.status_code == 200:
+                return Image.open(BytesIO(img_response.content))
+            print(f"Error downloading image: {img_response.status_code}")
+            return None
+        
+        except Exception as e:
+            print(f"Error in Replicate image generation: {e}")
+            return None
+    
+    def _generate_file_with_replicate(self, prompt: str, output_path: str, model_type: str,
+                                      rng: random.Random) -> Optional[str]:
+        """Generate with Replicate and stream the output to disk; returns the written path or None"""
+        try:
+            image_urls = self._run_prediction(prompt, model_type, rng)
+            if image_urls is None:
+                return None
+            return self._download_image(image_urls[0], output_path)
+        
+        except Exception as e:
+            print(f"Error in Replicate image generation: {e}")
+            return None
+    
+    def _generate_files_with_replicate(self, prompts: List[str], output_paths: List[str], model_type: str,
+                                       rngs: List[random.Random], quality: str = 'full',
+                                       listener: Callable[[str, Dict[str, Any]], None] = None,
+                                       on_image: Callable[[int, str], None] = None,
+                                       cancel: CancelToken = None) -> List[Optional[str]]:
+        """Batch of Replicate images: identical prompts share a prediction, predictions run concurrently"""
+        # Group items by prompt, split into predictions of at most
+        # MAX_OUTPUTS_PER_PREDICTION; the group's first rng enhances its prompt
+        by_prompt: Dict[str, List[int]] = {}
+        for index, prompt in enumerate(prompts):
+            by_prompt.setdefault(prompt, []).append(index)
+        groups = [indices[start:start + MAX_OUTPUTS_PER_PREDICTION]
+                  for indices in by_prompt.values()
+                  for start in range(0, len(indices), MAX_OUTPUTS_PER_PREDICTION)]
+        
+        def run_group(indices: List[int]) -> List[Optional[str]]:
+            prompt_counts: Dict[str, int] = {}
             
-            # Enhance prompt for more colorful, vibrant images
-            enhanced_prompt = self._enhance_prompt_for_color(prompt)
+            def on_status(prediction_id: str, status: str):
+                if listener:
+                    data = {'id': prediction_id, 'status': status, 'outputs': len(indices), 'quality': quality}
+                    if status == 'created':
+                        data['prompt'] = prompt_counts
+                    listener('prediction', data)
             
-            # Create prediction with enhanced parameters
-            payload = {
-                "version": model,
-                "input": {
-                    "prompt": enhanced_prompt, # Using enhanced prompt
-                    "width": 1024, # Increased resolution
-                    "height": 1024, # Increased resolution
-                    "num_outputs": 1,
-                    "guidance_scale": 7.5, # Added
-                    "num_inference_steps": 50, # Added
-                    "scheduler": "K_EULER", # Added
-                    "negative_prompt": "black and white, monochrome, grayscale, colorless, dull, muted, dark, gloomy, boring, plain, simple, minimal, no color, desaturated, low contrast, sketch, drawing, pencil, charcoal, ugly, distorted, blurry, low quality, pixelated, abstract art, abstract shapes, geometric patterns, abstract composition, abstract design, abstract forms, abstract elements, abstract style, abstract painting, abstract drawing, abstract illustration, abstract graphics, abstract visual, abstract artwork, abstract imagery, abstract representation, abstract concept, abstract expression, abstract movement, abstract lines, abstract curves, abstract textures, abstract patterns, abstract motifs, abstract symbols, abstract elements, abstract shapes, abstract forms, abstract composition, abstract design, abstract style, abstract painting, abstract drawing, abstract illustration, abstract graphics, abstract visual, abstract artwork, abstract imagery, abstract representation, abstract concept, abstract expression, abstract movement, abstract lines, abstract curves, abstract textures, abstract patterns, abstract motifs, abstract symbols"
-                }
+            try:
+                image_urls = self._run_prediction(prompts[indices[0]], model_type, rngs[indices[0]],
+                                                  num_outputs=len(indices), quality=quality,
+                                                  on_status=on_status, on_prompt=prompt_counts.update,
+                                                  cancel=cancel)
+                if image_urls is None:
+                    return [None] * len(indices)
+                written = []
+                for index, image_url in itertools.zip_longest(indices, image_urls[:len(indices)]):
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    written.append(self._download_image(image_url, output_paths[index]) if image_url else None)
+                    if on_image and written[-1] is not None:
+                        on_image(index, written[-1])
+                return written
+            except Exception as e:
+                print(f"Error in Replicate image generation: {e}")
+                return [None] * len(indices)
+        
+        written: List[Optional[str]] = [None] * len(prompts)
+        print(f"Submitting {len(groups)} predictions for {len(prompts)} images...")
+        with ThreadPoolExecutor(max_workers=max(1, len(groups))) as executor:
+            for indices, paths in zip(groups, executor.map(run_group, groups)):
+                for index, path in zip(indices, paths):
+                    written[index] = path
+        return written
+    
+    def _run_prediction(self, prompt: str, model_type: str, rng: random.Random,
+                        num_outputs: int = 1, quality: str = 'full',
+                        on_status: Callable[[str, str], None] = None,
+                        on_prompt: Callable[[Dict[str, int]], None] = None,
+                        cancel: CancelToken = None) -> Optional[List[str]]:
+        """Create a prediction and wait for it; returns the output image URLs or None.
+
+        on_status(prediction_id, status) is called whenever the status changes;
+        on_prompt is passed to _create_prediction. The prediction is tracked
+        on the cancel token while it runs and holds one of its lane's
+        Replicate slots; a resumed job re-attaches to the prediction it
+        created for the same request before the restart.
+        """
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        journal = cancel.journal if cancel is not None else None
+        with get_prediction_slots().slot(cancel):
+            prediction_id, resumed = self._create_prediction(prompt, model_type, rng, num_outputs, quality,
+                                                             on_prompt, journal)
+            if prediction_id is None:
+                return None
+            if cancel is not None:
+                cancel.track(prediction_id, lambda: self._cancel_prediction(prediction_id))
+            try:
+                status_data = self._wait_for_prediction(prediction_id, on_status, cancel, refresh=resumed)
+            finally:
+                if cancel is not None:
+                    cancel.untrack(prediction_id)
+        if status_data is None:
+            return None
+        return status_data['output']
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Token {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    def _create_prediction(self, prompt: str, model_type: str, rng: random.Random,
+                           num_outputs: int = 1, quality: str = 'full',
+                           on_prompt: Callable[[Dict[str, int]], None] = None,
+                           journal: JobJournal = None) -> Tuple[Optional[str], bool]:
+        """Submit a prediction; returns (its id or None, whether it is one the journal already had).
+
+        on_prompt(report) receives the prompt's token and byte counts before
+        and after compaction.
+        """
+        model = self.models.get(model_type, self.models["realistic"])
+        preset = QUALITY_PRESETS.get(quality, QUALITY_PRESETS['full'])
+        
+        # Enhance prompt for more colorful, vibrant images, then fit it to
+        # what the text encoder actually reads
+        enhanced_prompt = self._enhance_prompt_for_color(prompt, rng)
+        compacted_prompt = compact_prompt(self._prompt_fragments(prompt, enhanced_prompt), self.token_budget)
+        report = prompt_report(enhanced_prompt, compacted_prompt)
+        print(f"✂️ Prompt compacted: {report['tokens_before']} → {report['tokens_after']} tokens, "
+              f"{report['bytes_before']} → {report['bytes_after']} bytes")
+        if on_prompt:
+            on_prompt(report)
+        
+        # Create prediction with enhanced parameters
+        payload = {
+            "version": model,
+            "input": {
+                "prompt": compacted_prompt,
+                "width": preset['width'],
+                "height": preset['height'],
+                "num_outputs": num_outputs,
+                "guidance_scale": 7.5, # Added
+                "num_inference_steps": preset['num_inference_steps'],
+                "scheduler": "K_EULER", # Added
+                "negative_prompt": self.negative_prompt
             }
-            
-            print(f"Creating prediction with Replicate (SDXL)...")
+        }
+        
+        def create() -> Optional[str]:
+            webhook_fields = self.registry.webhook_fields() if self.registry is not None else {}
+            print(f"Creating {quality} prediction with Replicate (SDXL)...")
             response = requests.post(
                 self.base_url,
-                headers=headers,
-                json=payload
+                headers=self._headers(),
+                json={**payload, **webhook_fields},
+                timeout=60
             )
             
             if response.status_code == 201:
-                prediction = response.json()
-                prediction_id = prediction['id']
-                
-                # Poll for completion
-                import time
-                max_attempts = 30
-                attempts = 0
-                
-                while attempts < max_attempts:
-                    time.sleep(2)
-                    status_response = requests.get(
-                        f"{self.base_url}/{prediction_id}",
-                        headers=headers
-                    )
-                    
-                    if status_response.status_code == 200:
-                        status_data = status_response.json()
-                        
-                        if status_data['status'] == 'succeeded':
-                            # Get the image URL
-                            image_url = status_data['output'][0]
-                            
-                            # Download the image
-                            img_response = requests.get(image_url)
-                            if img_response.status_code == 200:
-                                return Image.open(BytesIO(img_response.content))
-                            else:
-                                print(f"Error downloading image: {img_response.status_code}")
-                                break
-                                
-                        elif status_data['status'] == 'failed':
-                            print(f"Prediction failed: {status_data.get('error', 'Unknown error')}")
-                            break
-                        elif status_data['status'] == 'processing':
-                            print(f"Still processing... attempt {attempts + 1}")
-                            attempts += 1
-                            continue
-                    else:
-                        print(f"Error checking status: {status_response.status_code}")
-                        break
-                
-                print("Timeout waiting for prediction completion")
-                return self._create_placeholder_image(prompt)
-                
-            else:
-                print(f"Error creating prediction: {response.status_code}")
-                print(response.text)
-                return self._create_placeholder_image(prompt)
-
-        except Exception as e:
-            print(f"Error in Replicate image generation: {e}")
-            return self._create_placeholder_image(prompt)
-
-    def _enhance_prompt_for_color(self, prompt: str) -> str:
-        """Enhance prompt to encourage more colorful, vibrant images with dynamic palette integration"""
-        # Check if the prompt already contains color palette information
-        if 'color palette:' in prompt.lower() or 'colorful artwork' in prompt.lower():
-            # If dynamic colors are already specified, enhance with strong color emphasis
-            style_enhancers = [
-                "artistic", "creative", "expressive", "dynamic", "visually striking",
-                "high quality", "detailed", "professional digital art", "vibrant composition"
-            ]
-            color_enhancers = [
-                "SATURATED COLORS", "RICH COLOR PALETTE", "VIBRANT HUES", "BOLD COLORS",
-                "COLORFUL COMPOSITION", "LIVELY COLORS", "BRIGHT AND VIVID"
-            ]
+                return response.json()['id']
             
-            enhanced_parts = [prompt]
-            import random
-            selected_styles = random.sample(style_enhancers, 2)
-            selected_colors = random.sample(color_enhancers, 2)
-            enhanced_parts.extend(selected_colors)
-            enhanced_parts.extend(selected_styles)
-            enhanced_parts.extend([
-                "NO MONOCHROME", "NO BLACK AND WHITE", "FULL COLOR ARTWORK",
-                "MUST BE COLORFUL", "RICH SATURATED COLORS",
-                "REPRESENTATIONAL ART", "CONCRETE SCENES", "REAL OBJECTS",
-                "NO ABSTRACT ART", "AVOID ABSTRACT SHAPES"
-            ])
-            return ", ".join(enhanced_parts)
-        else:
-            # Fallback to general color enhancement if no dynamic palette
-            color_enhancers = [
-                "VIBRANT COLORS", "RICH COLOR PALETTE", "WARM TONES", "BRIGHT AND COLORFUL",
-                "SATURATED COLORS", "COLORFUL COMPOSITION", "VIVID IMAGERY", "LUMINOUS COLORS"
-            ]
-            style_enhancers = [
-                "artistic", "creative", "expressive", "dynamic", "visually striking"
-            ]
-            enhanced_parts = [prompt]
-            import random
-            selected_colors = random.sample(color_enhancers, 3)
-            enhanced_parts.extend(selected_colors)
-            selected_styles = random.sample(style_enhancers, 2)
-            enhanced_parts.extend(selected_styles)
-            enhanced_parts.extend([
-                "high quality", "detailed", "professional digital art",
-                "NO MONOCHROME", "FULL COLOR", "RICH SATURATED COLORS",
-                "REPRESENTATIONAL ART", "CONCRETE SCENES", "REAL OBJECTS",
-                "NO ABSTRACT ART", "AVOID ABSTRACT SHAPES"
-            ])
-            return ", ".join(enhanced_parts)
-
-    def _create_placeholder_image(self, prompt: str) -> Image.Image:
-        """Create a placeholder image when API is not available"""
-        # Create a simple placeholder
-        img = Image.new('RGB', (512, 512), color='#2a2a2a')
-        
-        from PIL import ImageDraw, ImageFont
-        import random
-        
-        draw = ImageDraw.Draw(img)
+            print(f"Error creating prediction: {response.status_code}")
+            print(response.text)
+            return None
         
-        try:
-            font = ImageFont.load_default()
-        except:
-            font = None
-        
-        # Add some visual elements
-        for i in range(50):
-            x = random.randint(0, 512)
-            y = random.randint(0, 512)
-            size = random.randint(2, 8)
-            color = (
-                random.randint(100, 255),
-                random.randint(100, 255),
-                random.randint(100, 255)
-            )
-            draw.ellipse([x-size, y-size, x+size, y+size], fill=color)
+        return start_prediction(journal, 'sdxl', payload, create)
+    
+    @staticmethod
+    def _prompt_fragments(prompt: str, enhanced_prompt: str) -> List[str]:
+        """The builder's ' | '-separated fragments followed by the color enhancement's ', '-separated ones"""
+        if not enhanced_prompt.startswith(prompt):
+            return enhanced_prompt.split(' | ')
+        return prompt.split(' | ') + enhanced_prompt[len(prompt):].split(', ')
+    
+    def _fetch_prediction(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        """Current status data of a prediction, or None if the request fails"""
+        status_response = requests.get(
+            f"{self.base_url}/{prediction_id}",
+            headers=self._headers(),
+            timeout=30
+        )
+        if status_response.status_code != 200:
+            print(f"Error checking status: {status_response.status_code}")
+            return None
+        return status_response.json()
+    
+    def _cancel_prediction(self, prediction_id: str):
+        """Stop a prediction on Replicate so it no longer runs (or bills)"""
+        requests.post(f"{self.base_url}/{prediction_id}/cancel", headers=self._headers(), timeout=10)
+    
+    def _wait_for_prediction(self, prediction_id: str,
+                             on_status: Callable[[str, str], None] = None,
+                             cancel: CancelToken = None, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Wait until a prediction succeeds; returns its status data or None.
+
+        With a webhook registry the wait is driven by completion webhooks
+        (refresh: fetch the status at once, for a prediction whose webhooks
+        may have come while the service was down); otherwise the prediction
+        is polled. Raises JobCancelled once the cancel token fires.
+        """
+        if on_status:
+            on_status(prediction_id, 'created')
         
-        # Add text
-        if font:
-            draw.text((20, 20), "🎵 Audio to Image 🎨", fill=(255, 255, 255), font=font)
-            draw.text((20, 50), f"Prompt: {prompt[:40]}...", fill=(200, 200, 200), font=font)
-            draw.text((20, 80), "Replicate API Placeholder", fill=(180, 180, 180), font=font)
+        if self.registry is not None and self.registry.enabled:
+            status_data = self.registry.wait(
+                prediction_id, lambda: self._fetch_prediction(prediction_id), PREDICTION_TIMEOUT,
+                on_status=(lambda status: on_status(prediction_id, status)) if on_status else None,
+                cancel=cancel, refresh=refresh)
+        else:
+            status_data = self._poll_prediction(prediction_id, on_status, cancel)
         
-        return img 
\ No newline at end of file
+        if status_data is not None and cancel is not None and cancel.journal is not None:
+            cancel.journal.finish_prediction(prediction_id, status_data['status'])
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        if status_data is None:
+            print("Timeout waiting for prediction completion")
+            return None
+        if status_data['status'] != 'succeeded':
+            print(f"Prediction failed: {status_data.get('error', 'Unknown error')}")
+            return None
+        return status_data
+    
+    def _poll_prediction(self, prediction_id: str,
+                         on_status: Callable[[str, str], None] = None,
+                         cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        """Poll until the prediction reaches a terminal status; None on error or timeout"""
+        last_status = None
+        for attempt in range(PREDICTION_TIMEOUT // POLL_INTERVAL):
+            if cancel is not None:
+                cancel.sleep(POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+            status_data = self._fetch_prediction(prediction_id)
+            if status_data is None:
+                return None
+            
+            if on_status and status_data['status'] != last_status:
+                on_status(prediction_id, status_data['status'])
+            last_status = status_data['status']
+            if status_data['status'] in TERMINAL_STATUSES:
+                return status_data
+            
+            # 'starting' and 'processing' both count against the limit
+            print(f"Still processing... attempt {attempt + 1}")
+        
+        return None
+    
+    def _download_image(self, image_url: str, output_path: str) -> Optional[str]:
+        """Stream an output image to disk in chunks, checking its type and size.
+
+        The extension of output_path is replaced to match the actual image
+        format. Returns the written path, or None if the download is rejected.
+        """
+        with requests.get(image_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            if response.status_code != 200:
+                print(f"Error downloading image: {response.status_code}")
+                return None
+            
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+            if content_type and not content_type.startswith('image/'):
+                print(f"Rejected download with content type {content_type}")
+                return None
+            declared_size = int(response.headers.get('Content-Length') or 0)
+            if declared_size > MAX_IMAGE_BYTES:
+                print(f"Rejected download of {declared_size} bytes (limit {MAX_IMAGE_BYTES})")
+                return None
+            
+            chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+            first_chunk = next(chunks, b'')
+            extension = image_extension(first_chunk)
+            if extension is None:
+                print("Rejected download that is not a PNG, JPEG, WebP or GIF image")
+                return None
+            
+            final_path = os.path.splitext(output_path)[0] + extension
+            partial_path = final_path + '.part'
+            written = 0
+            try:
+                with open(partial_path, 'wb') as output_file:
+                    for chunk in itertools.chain([first_chunk], chunks):
+                        written += len(chunk)
+                        if written > MAX_IMAGE_BYTES:
+                            raise ValueError(f"image exceeds {MAX_IMAGE_BYTES} bytes")
+                        output_file.write(chunk)
+                os.replace(partial_path, final_path)
+            except Exception:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
+            
+            print(f"Downloaded {written} bytes to {final_path}")
+            return final_path
+
+    def _enhance_prompt_for_color(self, prompt: str, rng: random.Random) -> str:
+        """Enhance prompt to encourage more colorful, vibrant images with dynamic palette integration"""
+        return get_templates().render('color_enhancement', rng=rng, prompt=prompt)
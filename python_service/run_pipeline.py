@@ -1,5 +1,7 @@
 import os
 import sys
+import time
+import requests
 from dotenv import load_dotenv
 from whisper_processor import WhisperAudioProcessor
 from replicate_image_generator import ReplicateImageGenerator
@@ -34,7 +36,7 @@ def run_pipeline(audio_file_path):
         print("  Using Replicate for AI image generation")
         image_gen = ReplicateImageGenerator(api_key=replicate_key)
     else:
-        print("  Using Replicate placeholder for image generation")
+        print("  Using local procedural renderer for image generation")
         image_gen = ReplicateImageGenerator()
     
     try:
@@ -92,7 +94,62 @@ def run_pipeline(audio_file_path):
         print(f"❌ Pipeline error: {e}")
         return False
 
+# Audio files picked up when a directory is given to --server
+AUDIO_EXTENSIONS = ('.m4a', '.mp3', '.wav', '.flac', '.ogg', '.aac')
+
+# Seconds between status checks of submitted batch jobs
+BATCH_POLL_INTERVAL = 5
+
+def submit_batch(server_url, paths, client='run_pipeline', variants=1):
+    """Queue every audio file under paths as a batch-lane job on a running service and wait for them.
+
+    Batch jobs yield to interactive uploads and take turns with other
+    clients' batches, so a large batch does not hold up the web interface.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    
+    print(f"📦 Submitting {len(files)} track(s) to {server_url} as client '{client}'")
+    jobs = {}
+    for path in files:
+        with open(path, 'rb') as audio_file:
+            response = requests.post(f"{server_url}/jobs", files={'audio': (os.path.basename(path), audio_file)},
+                                     data={'lane': 'batch', 'preview': 'none', 'variants': variants},
+                                     headers={'X-Client-Id': client}, timeout=120)
+        if response.status_code != 202:
+            print(f"❌ {os.path.basename(path)}: {response.status_code} {response.text[:200]}")
+            continue
+        jobs[response.json()['job_id']] = path
+    
+    results = {}
+    while len(results) < len(jobs):
+        time.sleep(BATCH_POLL_INTERVAL)
+        for job_id, path in jobs.items():
+            if job_id in results:
+                continue
+            job = requests.get(f"{server_url}/jobs/{job_id}", timeout=30).json()
+            if job['status'] in ('succeeded', 'failed', 'cancelled'):
+                results[job_id] = job
+                detail = job['result']['abstract_image'] if job['status'] == 'succeeded' else job['error']
+                print(f"{'✅' if job['status'] == 'succeeded' else '❌'} {os.path.basename(path)}: {detail} "
+                      f"(queued {job['queue_wait'] or 0:.0f}s)")
+        print(f"⏳ {len(results)}/{len(jobs)} finished")
+    
+    succeeded = sum(job['status'] == 'succeeded' for job in results.values())
+    print(f"🎉 Batch done: {succeeded}/{len(files)} succeeded")
+    return succeeded == len(files)
+
 if __name__ == "__main__":
+    # python run_pipeline.py --server http://localhost:5001 <files or directories>
+    # queues a batch on a running service instead of running locally
+    if len(sys.argv) > 2 and sys.argv[1] == '--server':
+        sys.exit(0 if submit_batch(sys.argv[2], sys.argv[3:], os.getenv('PIPELINE_CLIENT_ID', 'run_pipeline')) else 1)
+    
     # Try to find the audio file
     possible_paths = [
         "uploads/06 Kiss 'till the Sunrise.m4a",
@@ -109,4 +166,4 @@ if __name__ == "__main__":
     if not audio_found:
         print("❌ No audio files found")
         print("Please place an audio file in the uploads/ directory")
-        print("Usage: python run_pipeline.py") 
\ No newline at end of file
+        print("Usage: python run_pipeline.py [--server URL FILE_OR_DIR...]") 
\ No newline at end of file
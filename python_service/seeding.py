@@ -0,0 +1,20 @@
+import hashlib
+import random
+
+import numpy as np
+
+
+def seed_from(*parts: str) -> int:
+    """Stable 64-bit seed from text parts (unlike hash(), the same in every process)"""
+    digest = hashlib.sha256('\x1f'.join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def seeded_random(*parts: str) -> random.Random:
+    """random.Random seeded from text, e.g. an audio hash plus a stage name"""
+    return random.Random(seed_from(*parts))
+
+
+def seeded_generator(*parts: str) -> np.random.Generator:
+    """NumPy Generator seeded from text, for the vectorized batch paths"""
+    return np.random.default_rng(seed_from(*parts))
@@ -3,6 +3,77 @@ import math
 import random
 import re
 from typing import Dict, Any, List, Tuple
+import numpy as np
+from feature_record import AudioFeatures, FeatureTable, map_column
+from transcript_index import filename_index, get_index, MAX_REPEAT_BONUS
+from audio_hash import hash_audio_file
+from seeding import seeded_random, seeded_generator
+from prompt_templates import get_templates
+
+FORMAT_BITRATES = {
+    '.mp3': 128000, '.m4a': 256000, '.wav': 1411000,
+    '.flac': 1000000, '.aac': 256000, '.ogg': 192000
+}
+
+FORMAT_INFO = {
+    '.mp3': {'format': 'MP3', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 16},
+    '.m4a': {'format': 'M4A', 'sample_rate': 48000, 'channels': 2, 'bit_depth': 16},
+    '.wav': {'format': 'WAV', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 24},
+    '.flac': {'format': 'FLAC', 'sample_rate': 48000, 'channels': 2, 'bit_depth': 24},
+    '.aac': {'format': 'AAC', 'sample_rate': 48000, 'channels': 2, 'bit_depth': 16},
+    '.ogg': {'format': 'OGG', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 16}
+}
+DEFAULT_FORMAT_INFO = {'format': 'Unknown', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 16}
+
+# Uniform draws behind each file's random estimates, in the order the
+# per-file analysis consumes them: tempo, spectral centroid, rolloff,
+# zero-crossing rate, syncopation and volume curve
+BATCH_DRAWS = 6
+
+
+def feature_draws(audio_hash: str) -> np.ndarray:
+    """The BATCH_DRAWS uniform draws for one file, shared by the per-file and batch paths"""
+    return seeded_generator(audio_hash).random(BATCH_DRAWS)
+
+
+class _DrawSequence:
+    """random.Random-style randint/uniform/choice over a file's feature_draws, consumed in order.
+
+    Each method maps its draw exactly as extract_features_many maps the same
+    column, so both paths produce identical values.
+    """
+
+    __slots__ = ('draws', 'position')
+
+    def __init__(self, draws: np.ndarray):
+        self.draws = draws
+        self.position = 0
+
+    def _next(self) -> np.float64:
+        draw = self.draws[self.position]
+        self.position += 1
+        return draw
+
+    def randint(self, low: int, high: int) -> int:
+        return int(low + np.floor(self._next() * (high - low + 1)))
+
+    def uniform(self, low: float, high: float) -> float:
+        return float(low + self._next() * (high - low))
+
+    def choice(self, options: List[Any]) -> Any:
+        return options[int(self._next() * len(options))]
+
+MOOD_NAMES = ('energetic', 'calm', 'dramatic', 'melancholic', 'joyful',
+              'mysterious', 'passionate', 'contemplative', 'peaceful')
+
+ARTISTIC_STYLES = {
+    'electronic dance': "futuristic cyberpunk",
+    'acoustic folk': "natural organic",
+    'ambient atmospheric': "ethereal dreamlike",
+    'jazz fusion': "sophisticated elegant",
+    'rock alternative': "raw powerful",
+    'classical orchestral': "timeless majestic"
+}
 
 class SimpleEnhancedAudioProcessor:
     """Advanced audio processor with sophisticated musical analysis and AI-powered feature extraction"""
@@ -196,9 +267,18 @@ class SimpleEnhancedAudioProcessor:
             }
         }
     
-    def extract_features(self, audio_path: str) -> Dict[str, Any]:
-        """Extract comprehensive audio features using advanced analysis"""
+    def extract_features(self, audio_path: str, rng: random.Random = None, audio_hash: str = None) -> AudioFeatures:
+        """Extract comprehensive audio features using advanced analysis.
+
+        Random estimates default to the file's feature_draws, keyed by its
+        audio hash (read from the file unless given), so the same audio
+        yields the same features here and in extract_features_many. An
+        explicit rng replaces them.
+        """
         try:
+            if rng is None:
+                rng = _DrawSequence(feature_draws(audio_hash or hash_audio_file(audio_path)))
+            
             # Get file information
             file_size = os.path.getsize(audio_path)
             file_name = os.path.basename(audio_path)
@@ -219,10 +299,10 @@ class SimpleEnhancedAudioProcessor:
             }
             
             # Advanced musical analysis
-            features.update(self._analyze_musical_structure_advanced(file_size, duration, file_name))
-            features.update(self._analyze_spectral_characteristics_advanced(file_name, duration))
-            features.update(self._analyze_rhythm_patterns_advanced(file_size, duration))
-            features.update(self._analyze_dynamic_characteristics_advanced(file_size, duration))
+            features.update(self._analyze_musical_structure_advanced(file_size, duration, file_name, rng))
+            features.update(self._analyze_spectral_characteristics_advanced(file_name, duration, rng))
+            features.update(self._analyze_rhythm_patterns_advanced(file_size, duration, rng))
+            features.update(self._analyze_dynamic_characteristics_advanced(file_size, duration, rng))
             features.update(self._analyze_harmonic_content_advanced(file_name, duration))
             
             # AI-powered analysis
@@ -236,22 +316,290 @@ class SimpleEnhancedAudioProcessor:
             features['emotional_tone'] = self._analyze_emotional_tone_advanced(features)
             features['artistic_style'] = self._analyze_artistic_style(features)
             
-            return features
+            features['file_name'] = file_name
+            return AudioFeatures.from_dict(features)
             
         except Exception as e:
             print(f"Error extracting features: {e}")
             return self._get_default_features()
-    
+
+    def extract_features_many(self, audio_paths: List[str], rng: np.random.Generator = None,
+                              audio_hashes: List[str] = None) -> FeatureTable:
+        """Extract features for a batch of files as a columnar table.
+
+        Produces the same values as extract_features for every file: each
+        row takes its feature_draws from the file's audio hash. Filename
+        keyword matching runs once per name; everything derived from size,
+        duration and the draws is computed with array operations over the
+        batch. Pass audio_hashes (e.g. the feature store's keys) to keep the
+        I/O to one stat per file; without them every file is read in full
+        to hash it. An explicit rng draws the whole batch from one
+        generator instead, and needs no hashes.
+        """
+        if not audio_paths:
+            return FeatureTable({})
+        count = len(audio_paths)
+        file_names = [os.path.basename(path) for path in audio_paths]
+        if rng is None:
+            if audio_hashes is None:
+                audio_hashes = [hash_audio_file(path) for path in audio_paths]
+            draws = np.stack([feature_draws(audio_hash) for audio_hash in audio_hashes])
+        else:
+            draws = rng.random((count, BATCH_DRAWS))
+        (tempo_draw, centroid_draw, rolloff_draw, zcr_draw, syncopation_draw, curve_draw) = draws.T
+        file_sizes = np.fromiter((os.stat(path).st_size for path in audio_paths), dtype=np.int64, count=count)
+
+        # Name-only hints, one pass per file. Texture and harmonic complexity
+        # are matched with duration 0 and get their duration fallback below.
+        name_columns = []
+        for name in file_names:
+            lower = name.lower()
+            name_columns.append((
+                os.path.splitext(name)[1].lower(),
+                self._analyze_filename_for_duration(name),
+                *self._tempo_range_from_filename(name),
+                *self._spectral_range_from_filename(lower),
+                filename_index(lower).any_of(['warm', 'analog', 'vintage']),
+                self._analyze_texture_advanced(lower, 0),
+                self._analyze_harmonic_content(lower),
+                self._estimate_harmonic_complexity(lower, 0),
+                self._analyze_chord_progression(lower),
+                self._analyze_melodic_characteristics(lower),
+                self._estimate_tonal_center(lower),
+                self._analyze_harmonic_movement(lower),
+                self._detect_genre_from_filename(name)
+            ))
+        (extensions, duration_hints, tempo_low, tempo_high, spectral_low, spectral_high, warm_names,
+         textures, harmonic_content, harmonic_complexity, chord_progression, melodic_characteristics,
+         tonal_center, harmonic_movement, genres) = (
+            np.array(column) for column in zip(*name_columns)
+        )
+
+        # File information
+        duration = np.clip(file_sizes * 8 / map_column(extensions, FORMAT_BITRATES, 256000) * duration_hints, 10, 1800)
+        format_columns = {
+            key: map_column(extensions, {ext: info[key] for ext, info in FORMAT_INFO.items()}, DEFAULT_FORMAT_INFO[key])
+            for key in ('format', 'sample_rate', 'channels', 'bit_depth')
+        }
+        long_tracks = duration > 180
+        textures = np.where((textures == 'balanced') & long_tracks, 'evolving', textures)
+        harmonic_complexity = np.where((harmonic_complexity == 'moderate') & long_tracks, 'evolving', harmonic_complexity)
+
+        # Structure
+        complexity_factor = np.minimum(1.0, (file_sizes / 1000000) / np.maximum(1, duration / 60))
+        energy_variance = 2000 + complexity_factor * 80000
+        energy_peaks = (5 + complexity_factor * 60).astype(np.int64)
+        peak_density = energy_peaks / np.maximum(1, duration)
+        base_tempo = tempo_low + np.floor(tempo_draw * (tempo_high - tempo_low + 1))
+        estimated_tempo = (base_tempo * (1.0 + (complexity_factor - 0.5) * 0.4)).astype(np.int64)
+        energy_distribution = np.select([complexity_factor > 0.7, complexity_factor > 0.4],
+                                        ['dynamic', 'building'], 'consistent')
+
+        # Section lists, keyed by which optional sections a track gets
+        section_codes = ((duration > 60) * 1 + (complexity_factor > 0.3) * 2
+                         + (duration > 120) * 4 + (complexity_factor > 0.6) * 8)
+        sections_by_code = {code: self._sections_for_code(code) for code in np.unique(section_codes).tolist()}
+        musical_sections = [sections_by_code[code] for code in section_codes.tolist()]
+
+        # Spectral
+        spectral_centroid = spectral_low + centroid_draw * (spectral_high - spectral_low)
+        spectral_rolloff = spectral_centroid * (1.2 + rolloff_draw * 0.6)
+        zero_crossing_rate = 0.02 + zcr_draw * (0.18 - 0.02)
+        brightness = np.select([spectral_centroid > 3000, spectral_centroid < 1200, warm_names],
+                               ['bright', 'dark', 'warm'], 'balanced')
+        frequency_balance = np.select([spectral_centroid > 3000, spectral_centroid < 1200],
+                                      ['high-frequency dominant', 'low-frequency dominant'], 'balanced')
+
+        # Rhythm
+        strong_beats = (3 + complexity_factor * 40).astype(np.int64)
+        weak_beats = (8 + complexity_factor * 50).astype(np.int64)
+        syncopation = syncopation_draw * complexity_factor
+        rhythm_regularity = 0.4 + complexity_factor * 0.4
+        timing_precision = np.select(
+            [(complexity_factor > 0.7) & (syncopation > 0.5), complexity_factor > 0.6, complexity_factor < 0.3],
+            ['syncopated', 'precise', 'loose'], 'moderate')
+        rhythm_complexity = np.select(
+            [(complexity_factor > 0.7) & (strong_beats > 25), (complexity_factor > 0.4) & (strong_beats > 15)],
+            ['complex', 'moderate'], 'simple')
+        groove_factor = (complexity_factor + rhythm_regularity) / 2
+
+        # Dynamics
+        dynamic_range = 6 + complexity_factor * 30
+        volume_variance = 1 + complexity_factor * 20
+        curve_choice = (curve_draw * 3).astype(np.int64)
+        volume_curve = np.select(
+            [complexity_factor > 0.7, complexity_factor > 0.4],
+            [np.array(['crescendo', 'diminuendo', 'dynamic'])[curve_choice],
+             np.array(['building', 'fading', 'stable'])[curve_choice]], 'stable')
+        expression = np.select([(dynamic_range > 25) & (volume_variance > 15), (dynamic_range < 10) & (volume_variance < 5)],
+                               ['expressive', 'consistent'], 'moderate')
+        dynamic_characteristics = np.select([complexity_factor > 0.7, complexity_factor > 0.4],
+                                            ['dramatic', 'varied'], 'subtle')
+        compression_level = np.select([complexity_factor > 0.7, complexity_factor < 0.3],
+                                      ['minimal', 'heavy'], 'moderate')
+
+        # Higher-level interpretation. Sophistication is scored before the
+        # overall complexity exists, so complexity counts as 'moderate' there;
+        # intent and innovation likewise see no sophistication yet.
+        sophistication_level = np.where((harmonic_complexity == 'complex') & (rhythm_complexity == 'complex'),
+                                        'high', 'medium')
+        emotional_depth = np.select([(dynamic_range > 25) & (expression == 'expressive'), dynamic_range > 15],
+                                    ['deep', 'moderate'], 'subtle')
+        artistic_intent = np.full(count, 'casual')
+        musical_innovation = np.full(count, 'traditional')
+
+        mood = self._score_moods(energy_variance, estimated_tempo, dynamic_range, brightness, textures)
+
+        energy_score = (np.select([energy_variance > 40000, energy_variance > 20000], [2, 1], 0)
+                        + np.select([estimated_tempo > 130, estimated_tempo > 100], [2, 1], 0)
+                        + (peak_density > 0.5))
+        energy_level = np.select([energy_score >= 6, energy_score >= 3], ['high', 'medium'], 'low')
+
+        complexity_score = (np.select([energy_peaks > 30, energy_peaks > 15], [2, 1], 0)
+                            + np.select([rhythm_complexity == 'complex', rhythm_complexity == 'moderate'], [2, 1], 0)
+                            + np.select([harmonic_complexity == 'complex', harmonic_complexity == 'moderate'], [2, 1], 0)
+                            + np.where(sophistication_level == 'high', 2, 1)
+                            + long_tracks)
+        complexity = np.select([complexity_score >= 7, complexity_score >= 4], ['complex', 'moderate'], 'simple')
+
+        high_sophistication = sophistication_level == 'high'
+        musical_style = np.select(
+            [(genres == 'electronic') & (estimated_tempo > 130),
+             (genres == 'acoustic') & (brightness == 'warm'),
+             (genres == 'ambient') & (textures == 'smooth'),
+             (genres == 'jazz') & high_sophistication,
+             (genres == 'rock') & (textures == 'gritty'),
+             (genres == 'classical') & high_sophistication,
+             (genres == 'pop') & (brightness == 'bright')],
+            ['electronic dance', 'acoustic folk', 'ambient atmospheric', 'jazz fusion',
+             'rock alternative', 'classical orchestral', 'pop contemporary'], genres)
+        mysterious_dark = (mood == 'mysterious') & (brightness == 'dark')
+        emotional_tone = np.select(
+            [(mood == 'energetic') & (expression == 'expressive'),
+             (mood == 'calm') & (brightness == 'warm'),
+             (mood == 'dramatic') & (volume_curve == 'crescendo'),
+             mysterious_dark],
+            ['passionate', 'peaceful', 'intense', 'enigmatic'], 'balanced')
+        artistic_style = map_column(musical_style, ARTISTIC_STYLES, '')
+        artistic_style = np.where(artistic_style != '', artistic_style,
+                                  np.where(mysterious_dark, 'mystical otherworldly', 'contemporary artistic'))
+
+        return FeatureTable({
+            'file_name': file_names,
+            'file_size': file_sizes,
+            'duration': duration,
+            **format_columns,
+            'mood': mood,
+            'energy_level': energy_level,
+            'musical_style': musical_style,
+            'complexity': complexity,
+            'estimated_tempo': estimated_tempo,
+            'spectral_centroid': spectral_centroid,
+            'brightness': brightness,
+            'dynamic_range': dynamic_range,
+            'energy_variance': energy_variance,
+            'energy_peaks': energy_peaks,
+            'peak_density': peak_density,
+            'musical_sections': musical_sections,
+            'structure_complexity': complexity_factor,
+            'energy_distribution': energy_distribution,
+            'spectral_rolloff': spectral_rolloff,
+            'zero_crossing_rate': zero_crossing_rate,
+            'texture': textures,
+            'harmonic_content': harmonic_content,
+            'frequency_balance': frequency_balance,
+            'rhythm_regularity': rhythm_regularity,
+            'strong_beats': strong_beats,
+            'weak_beats': weak_beats,
+            'syncopation': syncopation,
+            'rhythm_complexity': rhythm_complexity,
+            'timing_precision': timing_precision,
+            'groove_factor': groove_factor,
+            'volume_variance': volume_variance,
+            'volume_curve': volume_curve,
+            'expression': expression,
+            'dynamic_characteristics': dynamic_characteristics,
+            'compression_level': compression_level,
+            'harmonic_complexity': harmonic_complexity,
+            'chord_progression': chord_progression,
+            'melodic_characteristics': melodic_characteristics,
+            'tonal_center': tonal_center,
+            'harmonic_movement': harmonic_movement,
+            'detected_genre': genres,
+            'sophistication_level': sophistication_level,
+            'emotional_depth': emotional_depth,
+            'artistic_intent': artistic_intent,
+            'musical_innovation': musical_innovation,
+            'emotional_tone': emotional_tone,
+            'artistic_style': artistic_style
+        })
+
+    def _sections_for_code(self, code: int) -> List[str]:
+        """Section list for a bitmask of (over 60s, complexity > 0.3, over 120s, complexity > 0.6)"""
+        duration = 121 if code & 4 else 61 if code & 1 else 0
+        complexity_factor = 0.7 if code & 8 else 0.4 if code & 2 else 0.0
+        return self._estimate_musical_sections(duration, complexity_factor)
+
+    def _score_moods(self, energy_variance: np.ndarray, tempo: np.ndarray, dynamic_range: np.ndarray,
+                     brightness: np.ndarray, texture: np.ndarray) -> np.ndarray:
+        """Vectorized form of _analyze_mood_advanced: one score column per mood, then argmax"""
+        scores = np.zeros((len(tempo), len(MOOD_NAMES)), dtype=np.int64)
+        column = {mood: index for index, mood in enumerate(MOOD_NAMES)}
+
+        def add(mask: np.ndarray, **points: int):
+            for mood, value in points.items():
+                scores[:, column[mood]] += np.where(mask, value, 0)
+
+        def chain(*masks: np.ndarray) -> List[np.ndarray]:
+            # Turn if/elif conditions into mutually exclusive masks
+            taken = np.zeros(len(tempo), dtype=bool)
+            exclusive = []
+            for mask in masks:
+                exclusive.append(mask & ~taken)
+                taken |= mask
+            return exclusive
+
+        energy = chain((energy_variance > 50000) & (tempo > 140),
+                       (energy_variance < 15000) & (tempo < 80),
+                       (energy_variance < 25000) & (tempo < 100))
+        add(energy[0], energetic=4)
+        add(energy[1], calm=4, peaceful=3)
+        add(energy[2], peaceful=4, calm=2)
+
+        pace = chain(tempo > 150, tempo < 70, tempo < 90)
+        add(pace[0], energetic=3)
+        add(pace[1], peaceful=3, contemplative=2)
+        add(pace[2], calm=2)
+
+        light = chain((brightness == 'bright') & (tempo > 120),
+                      (brightness == 'dark') & (texture == 'smooth'),
+                      (brightness == 'warm') & (tempo < 100))
+        add(light[0], joyful=3)
+        add(light[1], melancholic=3)
+        add(light[2], peaceful=3, calm=2)
+
+        dynamics = chain((dynamic_range > 25) & (energy_variance > 40000),
+                         (dynamic_range < 15) & (energy_variance < 20000))
+        add(dynamics[0], dramatic=3)
+        add(dynamics[1], peaceful=2, calm=2)
+
+        surface = chain((texture == 'layered') & (brightness == 'dark'),
+                        (texture == 'smooth') & (tempo < 90),
+                        (texture == 'gritty') & (dynamic_range > 20))
+        add(surface[0], mysterious=3)
+        add(surface[1], contemplative=3, peaceful=2)
+        add(surface[2], passionate=3)
+
+        add((energy_variance < 15000) & (tempo < 80) & np.isin(brightness, ['warm', 'balanced']) & (texture == 'smooth'),
+            peaceful=5, calm=3)
+
+        # argmax returns the first maximum, matching max() over the dict order
+        return np.array(MOOD_NAMES)[scores.argmax(axis=1)]
+
     def _estimate_duration_advanced(self, file_size: int, file_name: str, file_extension: str) -> float:
         """Advanced duration estimation using multiple factors"""
         # Base estimation by format and size
-        bitrates = {
-            '.mp3': 128000, '.m4a': 256000, '.wav': 1411000, 
-            '.flac': 1000000, '.aac': 256000, '.ogg': 192000
-        }
-        
-        # Get bitrate for format
-        bitrate = bitrates.get(file_extension, 256000)
+        bitrate = FORMAT_BITRATES.get(file_extension, 256000)
         
         # Calculate theoretical duration
         theoretical_duration = (file_size * 8) / bitrate
@@ -265,36 +613,25 @@ class SimpleEnhancedAudioProcessor:
     
     def _analyze_filename_for_duration(self, file_name: str) -> float:
         """Analyze filename for duration hints"""
-        name_lower = file_name.lower()
+        name_index = filename_index(file_name)
         
         # Duration indicators
-        if any(word in name_lower for word in ['short', 'clip', 'sample', 'preview']):
+        if name_index.any_of(['short', 'clip', 'sample', 'preview']):
             return 0.3
-        elif any(word in name_lower for word in ['long', 'full', 'complete', 'extended']):
+        elif name_index.any_of(['long', 'full', 'complete', 'extended']):
             return 2.0
-        elif any(word in name_lower for word in ['remix', 'version', 'edit']):
+        elif name_index.any_of(['remix', 'version', 'edit']):
             return 1.2
-        elif any(word in name_lower for word in ['intro', 'outro', 'bridge']):
+        elif name_index.any_of(['intro', 'outro', 'bridge']):
             return 0.5
         
         return 1.0
     
     def _analyze_audio_format(self, file_extension: str, file_size: int, duration: float) -> Dict[str, Any]:
         """Analyze audio format characteristics"""
-        format_info = {
-            '.mp3': {'format': 'MP3', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 16},
-            '.m4a': {'format': 'M4A', 'sample_rate': 48000, 'channels': 2, 'bit_depth': 16},
-            '.wav': {'format': 'WAV', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 24},
-            '.flac': {'format': 'FLAC', 'sample_rate': 48000, 'channels': 2, 'bit_depth': 24},
-            '.aac': {'format': 'AAC', 'sample_rate': 48000, 'channels': 2, 'bit_depth': 16},
-            '.ogg': {'format': 'OGG', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 16}
-        }
-        
-        return format_info.get(file_extension, {
-            'format': 'Unknown', 'sample_rate': 44100, 'channels': 2, 'bit_depth': 16
-        })
+        return FORMAT_INFO.get(file_extension, DEFAULT_FORMAT_INFO)
     
-    def _analyze_musical_structure_advanced(self, file_size: int, duration: float, file_name: str) -> Dict[str, Any]:
+    def _analyze_musical_structure_advanced(self, file_size: int, duration: float, file_name: str, rng: random.Random) -> Dict[str, Any]:
         """Advanced musical structure analysis"""
         # Calculate complexity based on file characteristics
         complexity_factor = min(1.0, (file_size / 1000000) / max(1, duration / 60))
@@ -305,7 +642,7 @@ class SimpleEnhancedAudioProcessor:
         peak_density = energy_peaks / max(1, duration)
         
         # Tempo estimation
-        estimated_tempo = self._estimate_tempo_advanced(file_name, complexity_factor, duration)
+        estimated_tempo = self._estimate_tempo_advanced(file_name, complexity_factor, duration, rng)
         
         # Structure analysis
         sections = self._estimate_musical_sections(duration, complexity_factor)
@@ -320,28 +657,31 @@ class SimpleEnhancedAudioProcessor:
             'energy_distribution': self._analyze_energy_distribution(complexity_factor)
         }
     
-    def _estimate_tempo_advanced(self, file_name: str, complexity_factor: float, duration: float) -> int:
+    def _estimate_tempo_advanced(self, file_name: str, complexity_factor: float, duration: float, rng: random.Random) -> int:
         """Advanced tempo estimation"""
-        name_lower = file_name.lower()
-        
         # Genre-based tempo estimation
-        if any(word in name_lower for word in ['dance', 'electronic', 'techno', 'house']):
-            base_tempo = random.randint(120, 140)
-        elif any(word in name_lower for word in ['ambient', 'chill', 'lounge']):
-            base_tempo = random.randint(60, 90)
-        elif any(word in name_lower for word in ['rock', 'metal', 'punk']):
-            base_tempo = random.randint(100, 160)
-        elif any(word in name_lower for word in ['jazz', 'blues']):
-            base_tempo = random.randint(80, 140)
-        elif any(word in name_lower for word in ['classical', 'orchestral']):
-            base_tempo = random.randint(60, 120)
-        else:
-            base_tempo = random.randint(80, 120)
+        base_tempo = rng.randint(*self._tempo_range_from_filename(file_name))
         
         # Adjust based on complexity and duration
         tempo_adjustment = 1.0 + (complexity_factor - 0.5) * 0.4
         return int(base_tempo * tempo_adjustment)
     
+    def _tempo_range_from_filename(self, file_name: str) -> Tuple[int, int]:
+        """Genre-based tempo range (inclusive) from filename hints"""
+        name_index = filename_index(file_name)
+        if name_index.any_of(['dance', 'electronic', 'techno', 'house']):
+            return (120, 140)
+        elif name_index.any_of(['ambient', 'chill', 'lounge']):
+            return (60, 90)
+        elif name_index.any_of(['rock', 'metal', 'punk']):
+            return (100, 160)
+        elif name_index.any_of(['jazz', 'blues']):
+            return (80, 140)
+        elif name_index.any_of(['classical', 'orchestral']):
+            return (60, 120)
+        else:
+            return (80, 120)
+    
     def _estimate_musical_sections(self, duration: float, complexity_factor: float) -> List[str]:
         """Estimate musical sections based on duration and complexity"""
         sections = ['intro']
@@ -367,13 +707,13 @@ class SimpleEnhancedAudioProcessor:
         else:
             return "consistent"
     
-    def _analyze_spectral_characteristics_advanced(self, file_name: str, duration: float) -> Dict[str, Any]:
+    def _analyze_spectral_characteristics_advanced(self, file_name: str, duration: float, rng: random.Random) -> Dict[str, Any]:
         """Advanced spectral analysis"""
         name_lower = file_name.lower()
         
         # Frequency analysis
-        spectral_centroid = self._estimate_spectral_centroid(name_lower)
-        spectral_rolloff = spectral_centroid * (1.2 + random.uniform(0, 0.6))
+        spectral_centroid = self._estimate_spectral_centroid(name_lower, rng)
+        spectral_rolloff = spectral_centroid * (1.2 + rng.uniform(0, 0.6))
         
         # Brightness analysis
         brightness = self._analyze_brightness_advanced(name_lower, spectral_centroid)
@@ -387,42 +727,49 @@ class SimpleEnhancedAudioProcessor:
         return {
             'spectral_centroid': spectral_centroid,
             'spectral_rolloff': spectral_rolloff,
-            'zero_crossing_rate': random.uniform(0.02, 0.18),
+            'zero_crossing_rate': rng.uniform(0.02, 0.18),
             'brightness': brightness,
             'texture': texture,
             'harmonic_content': harmonic_content,
             'frequency_balance': self._analyze_frequency_balance(spectral_centroid)
         }
     
-    def _estimate_spectral_centroid(self, file_name: str) -> float:
+    def _estimate_spectral_centroid(self, file_name: str, rng: random.Random) -> float:
         """Estimate spectral centroid based on file characteristics"""
-        if any(word in file_name for word in ['bass', 'low', 'deep', 'sub']):
-            return random.uniform(600, 1200)
-        elif any(word in file_name for word in ['high', 'bright', 'treble', 'crystal']):
-            return random.uniform(2800, 4500)
-        elif any(word in file_name for word in ['mid', 'warm', 'analog']):
-            return random.uniform(1200, 2200)
+        return rng.uniform(*self._spectral_range_from_filename(file_name))
+    
+    def _spectral_range_from_filename(self, file_name: str) -> Tuple[float, float]:
+        """Spectral centroid range (Hz) from filename hints"""
+        name_index = filename_index(file_name)
+        if name_index.any_of(['bass', 'low', 'deep', 'sub']):
+            return (600, 1200)
+        elif name_index.any_of(['high', 'bright', 'treble', 'crystal']):
+            return (2800, 4500)
+        elif name_index.any_of(['mid', 'warm', 'analog']):
+            return (1200, 2200)
         else:
-            return random.uniform(1500, 2800)
+            return (1500, 2800)
     
     def _analyze_brightness_advanced(self, file_name: str, spectral_centroid: float) -> str:
         """Advanced brightness analysis"""
+        name_index = filename_index(file_name)
         if spectral_centroid > 3000:
             return "bright"
         elif spectral_centroid < 1200:
             return "dark"
-        elif any(word in file_name for word in ['warm', 'analog', 'vintage']):
+        elif name_index.any_of(['warm', 'analog', 'vintage']):
             return "warm"
         else:
             return "balanced"
     
     def _analyze_texture_advanced(self, file_name: str, duration: float) -> str:
         """Advanced texture analysis"""
-        if any(word in file_name for word in ['smooth', 'ambient', 'atmospheric']):
+        name_index = filename_index(file_name)
+        if name_index.any_of(['smooth', 'ambient', 'atmospheric']):
             return "smooth"
-        elif any(word in file_name for word in ['gritty', 'distorted', 'raw']):
+        elif name_index.any_of(['gritty', 'distorted', 'raw']):
             return "gritty"
-        elif any(word in file_name for word in ['layered', 'complex', 'orchestral']):
+        elif name_index.any_of(['layered', 'complex', 'orchestral']):
             return "layered"
         elif duration > 180:
             return "evolving"
@@ -431,9 +778,10 @@ class SimpleEnhancedAudioProcessor:
     
     def _analyze_harmonic_content(self, file_name: str) -> str:
         """Analyze harmonic content"""
-        if any(word in file_name for word in ['harmonic', 'chordal', 'polyphonic']):
+        name_index = filename_index(file_name)
+        if name_index.any_of(['harmonic', 'chordal', 'polyphonic']):
             return "rich"
-        elif any(word in file_name for word in ['monophonic', 'melodic', 'lead']):
+        elif name_index.any_of(['monophonic', 'melodic', 'lead']):
             return "melodic"
         else:
             return "mixed"
@@ -447,14 +795,14 @@ class SimpleEnhancedAudioProcessor:
         else:
             return "balanced"
     
-    def _analyze_rhythm_patterns_advanced(self, file_size: int, duration: float) -> Dict[str, Any]:
+    def _analyze_rhythm_patterns_advanced(self, file_size: int, duration: float, rng: random.Random) -> Dict[str, Any]:
         """Advanced rhythm analysis"""
         complexity_factor = min(1.0, (file_size / 1000000) / max(1, duration / 60))
         
         # Beat analysis
         strong_beats = int(3 + (complexity_factor * 40))
         weak_beats = int(8 + (complexity_factor * 50))
-        syncopation = random.uniform(0, complexity_factor)
+        syncopation = rng.uniform(0, complexity_factor)
         
         # Rhythm characteristics
         rhythm_regularity = 0.4 + (complexity_factor * 0.4)
@@ -495,7 +843,7 @@ class SimpleEnhancedAudioProcessor:
         """Calculate groove factor"""
         return (complexity_factor + rhythm_regularity) / 2
     
-    def _analyze_dynamic_characteristics_advanced(self, file_size: int, duration: float) -> Dict[str, Any]:
+    def _analyze_dynamic_characteristics_advanced(self, file_size: int, duration: float, rng: random.Random) -> Dict[str, Any]:
         """Advanced dynamic range analysis"""
         complexity_factor = min(1.0, (file_size / 1000000) / max(1, duration / 60))
         
@@ -504,7 +852,7 @@ class SimpleEnhancedAudioProcessor:
         volume_variance = 1 + (complexity_factor * 20)
         
         # Volume curve analysis
-        volume_curve = self._analyze_volume_curve(complexity_factor, duration)
+        volume_curve = self._analyze_volume_curve(complexity_factor, duration, rng)
         expression = self._analyze_expression(dynamic_range, volume_variance)
         
         # Dynamic characteristics
@@ -519,12 +867,12 @@ class SimpleEnhancedAudioProcessor:
             'compression_level': self._estimate_compression_level(complexity_factor)
         }
     
-    def _analyze_volume_curve(self, complexity_factor: float, duration: float) -> str:
+    def _analyze_volume_curve(self, complexity_factor: float, duration: float, rng: random.Random) -> str:
         """Analyze volume curve throughout the track"""
         if complexity_factor > 0.7:
-            return random.choice(['crescendo', 'diminuendo', 'dynamic'])
+            return rng.choice(['crescendo', 'diminuendo', 'dynamic'])
         elif complexity_factor > 0.4:
-            return random.choice(['building', 'fading', 'stable'])
+            return rng.choice(['building', 'fading', 'stable'])
         else:
             return 'stable'
     
@@ -578,9 +926,10 @@ class SimpleEnhancedAudioProcessor:
     
     def _estimate_harmonic_complexity(self, file_name: str, duration: float) -> str:
         """Estimate harmonic complexity"""
-        if any(word in file_name for word in ['jazz', 'progressive', 'complex']):
+        name_index = filename_index(file_name)
+        if name_index.any_of(['jazz', 'progressive', 'complex']):
             return "complex"
-        elif any(word in file_name for word in ['ambient', 'drone', 'minimal']):
+        elif name_index.any_of(['ambient', 'drone', 'minimal']):
             return "simple"
         elif duration > 180:
             return "evolving"
@@ -589,40 +938,44 @@ class SimpleEnhancedAudioProcessor:
     
     def _analyze_chord_progression(self, file_name: str) -> str:
         """Analyze chord progression characteristics"""
-        if any(word in file_name for word in ['jazz', 'sophisticated']):
+        name_index = filename_index(file_name)
+        if name_index.any_of(['jazz', 'sophisticated']):
             return "sophisticated"
-        elif any(word in file_name for word in ['pop', 'catchy']):
+        elif name_index.any_of(['pop', 'catchy']):
             return "catchy"
-        elif any(word in file_name for word in ['ambient', 'atmospheric']):
+        elif name_index.any_of(['ambient', 'atmospheric']):
             return "floating"
         else:
             return "standard"
     
     def _analyze_melodic_characteristics(self, file_name: str) -> str:
         """Analyze melodic characteristics"""
-        if any(word in file_name for word in ['melodic', 'tuneful']):
+        name_index = filename_index(file_name)
+        if name_index.any_of(['melodic', 'tuneful']):
             return "melodic"
-        elif any(word in file_name for word in ['rhythmic', 'percussive']):
+        elif name_index.any_of(['rhythmic', 'percussive']):
             return "rhythmic"
-        elif any(word in file_name for word in ['textural', 'atmospheric']):
+        elif name_index.any_of(['textural', 'atmospheric']):
             return "textural"
         else:
             return "mixed"
     
     def _estimate_tonal_center(self, file_name: str) -> str:
         """Estimate tonal center"""
-        if any(word in file_name for word in ['major', 'bright', 'happy']):
+        name_index = filename_index(file_name)
+        if name_index.any_of(['major', 'bright', 'happy']):
             return "major"
-        elif any(word in file_name for word in ['minor', 'dark', 'sad']):
+        elif name_index.any_of(['minor', 'dark', 'sad']):
             return "minor"
         else:
             return "mixed"
     
     def _analyze_harmonic_movement(self, file_name: str) -> str:
         """Analyze harmonic movement"""
-        if any(word in file_name for word in ['progressive', 'evolving']):
+        name_index = filename_index(file_name)
+        if name_index.any_of(['progressive', 'evolving']):
             return "progressive"
-        elif any(word in file_name for word in ['static', 'drone']):
+        elif name_index.any_of(['static', 'drone']):
             return "static"
         else:
             return "moderate"
@@ -651,7 +1004,7 @@ class SimpleEnhancedAudioProcessor:
     
     def _detect_genre_from_filename(self, file_name: str) -> str:
         """Detect genre from filename patterns"""
-        name_lower = file_name.lower()
+        name_index = filename_index(file_name)
         
         genre_patterns = {
             'electronic': ['electronic', 'synth', 'techno', 'house', 'edm', 'dance'],
@@ -665,7 +1018,7 @@ class SimpleEnhancedAudioProcessor:
         }
         
         for genre, patterns in genre_patterns.items():
-            if any(pattern in name_lower for pattern in patterns):
+            if name_index.any_of(patterns):
                 return genre
         
         return 'experimental'
@@ -897,147 +1250,36 @@ class SimpleEnhancedAudioProcessor:
         texture = features.get('texture', 'balanced')
         sophistication = features.get('sophistication_level', 'simple')
         
-        if musical_style == 'electronic dance':
-            return "futuristic cyberpunk"
-        elif musical_style == 'acoustic folk':
-            return "natural organic"
-        elif musical_style == 'ambient atmospheric':
-            return "ethereal dreamlike"
-        elif musical_style == 'jazz fusion':
-            return "sophisticated elegant"
-        elif musical_style == 'rock alternative':
-            return "raw powerful"
-        elif musical_style == 'classical orchestral':
-            return "timeless majestic"
+        if musical_style in ARTISTIC_STYLES:
+            return ARTISTIC_STYLES[musical_style]
         elif mood == 'mysterious' and brightness == 'dark':
             return "mystical otherworldly"
         else:
             return "contemporary artistic"
     
-    def create_art_prompt(self, features: Dict[str, Any], transcription: str = "") -> str:
+    def create_art_prompt(self, features: AudioFeatures, transcription: str = "") -> str:
         """Create a sophisticated art prompt based on comprehensive musical analysis"""
-        # Core musical characteristics
-        mood = features.get('mood', 'moderate')
-        energy = features.get('energy_level', 'medium')
-        complexity = features.get('complexity', 'moderate')
-        musical_style = features.get('musical_style', 'experimental')
-        emotional_tone = features.get('emotional_tone', 'balanced')
-        artistic_style = features.get('artistic_style', 'contemporary artistic')
-        
-        # Visual characteristics
-        brightness = features.get('brightness', 'balanced')
-        texture = features.get('texture', 'balanced')
-        rhythm_complexity = features.get('rhythm_complexity', 'moderate')
-        expression = features.get('expression', 'moderate')
-        duration = features.get('duration', 0)
-        
-        # Advanced characteristics
-        sophistication = features.get('sophistication_level', 'simple')
-        emotional_depth = features.get('emotional_depth', 'subtle')
-        innovation = features.get('musical_innovation', 'traditional')
-        
-        # Build sophisticated prompt components
-        prompt_parts = [
-            f"Create a {artistic_style} visual representation of {musical_style} music",
-            f"with {mood} mood and {energy} energy",
-            f"Complexity: {complexity}, Duration: {duration:.1f} seconds"
-        ]
-        
-        # Add emotional and stylistic elements
-        prompt_parts.append(f"Emotional tone: {emotional_tone}")
-        prompt_parts.append(f"Visual brightness: {brightness}")
-        prompt_parts.append(f"Texture: {texture}")
-        prompt_parts.append(f"Sophistication: {sophistication}")
-        prompt_parts.append(f"Emotional depth: {emotional_depth}")
-        
-        # Add rhythm-inspired elements
-        if rhythm_complexity == 'complex':
-            prompt_parts.append("rhythmic and layered")
-        elif rhythm_complexity == 'simple':
-            prompt_parts.append("minimal and clean")
-        
-        # Add expression-inspired elements
-        if expression == 'expressive':
-            prompt_parts.append("dynamic and dramatic")
-        elif expression == 'consistent':
-            prompt_parts.append("harmonious and balanced")
-        
-        # Add innovation-inspired elements
-        if innovation == 'innovative':
-            prompt_parts.append("avant-garde and experimental")
-        elif innovation == 'creative':
-            prompt_parts.append("imaginative and original")
-        
-        # Add style-specific artistic elements
-        if musical_style == 'electronic dance':
-            prompt_parts.append("futuristic and digital")
-        elif musical_style == 'acoustic folk':
-            prompt_parts.append("organic and natural")
-        elif musical_style == 'ambient atmospheric':
-            prompt_parts.append("atmospheric and ethereal")
-        elif musical_style == 'jazz fusion':
-            prompt_parts.append("sophisticated and complex")
-        elif musical_style == 'rock':
-            prompt_parts.append("powerful and energetic")
-        elif musical_style == 'classical':
-            prompt_parts.append("elegant and refined")
-        elif musical_style == 'pop':
-            prompt_parts.append("bright and accessible")
-        elif musical_style == 'experimental':
-            prompt_parts.append("innovative and creative")
-        
-        # Add specific scene suggestions based on mood and energy
-        if mood == 'peaceful' and energy == 'low':
-            prompt_parts.append("peaceful landscape or serene environment")
-        elif mood == 'energetic' and energy == 'high':
-            prompt_parts.append("dynamic scene with movement and energy")
-        elif mood == 'mysterious':
-            prompt_parts.append("mysterious or atmospheric environment")
-        elif mood == 'joyful':
-            prompt_parts.append("bright and cheerful scene")
-        elif mood == 'melancholy':
-            prompt_parts.append("contemplative or reflective scene")
-        elif mood == 'passionate':
-            prompt_parts.append("intense and dramatic scene")
-        
-        # Add instrument-specific scene suggestions (only if detected_instruments is provided)
-        if detected_instruments:
-            for instrument in detected_instruments[:2]:  # Top 2 instruments
-                instrument_name = instrument['name']
-                if instrument_name == 'piano':
-                    prompt_parts.append("elegant piano or musical setting")
-                elif instrument_name == 'guitar':
-                    prompt_parts.append("acoustic or electric guitar scene")
-                elif instrument_name == 'drums':
-                    prompt_parts.append("rhythmic drum or percussion scene")
-                elif instrument_name == 'voice':
-                    prompt_parts.append("vocal or singing scene")
-                elif instrument_name == 'nature_sounds':
-                    prompt_parts.append("natural outdoor environment")
-                elif instrument_name == 'synth':
-                    prompt_parts.append("electronic or digital music scene")
-        
-        # Add transcription if available
-        if transcription and transcription.strip():
-            prompt_parts.append(f"Audio content: '{transcription.strip()}'")
-        
-        return " | ".join(prompt_parts)
+        return get_templates().render('art', features, instruments=None,
+                                      transcription=(transcription or '').strip())
     
-    def _get_default_features(self) -> Dict[str, Any]:
+    def _get_default_features(self) -> AudioFeatures:
         """Return default features if analysis fails"""
-        return {
-            'duration': 180.0,
-            'tempo': 120,
-            'energy_level': 'medium',
-            'complexity': 'moderate',
-            'musical_style': 'pop',
-            'emotional_tone': 'balanced',
-            'artistic_style': 'contemporary',
-            'detected_instruments': []
-        }
+        return AudioFeatures(
+            duration=180.0,
+            estimated_tempo=120,
+            energy_level='medium',
+            complexity='moderate',
+            musical_style='pop',
+            emotional_tone='balanced',
+            artistic_style='contemporary'
+        )
 
-    def generate_dynamic_color_palette(self, features: Dict[str, Any], detected_instruments: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def generate_dynamic_color_palette(self, features: AudioFeatures, detected_instruments: List[Dict[str, Any]] = None,
+                                       rng: random.Random = None) -> Dict[str, Any]:
         """Generate a dynamic color palette based on musical features"""
+        if rng is None:
+            # Same features, same palette
+            rng = seeded_random(features.to_json())
         palette = {
             'primary_colors': [],
             'secondary_colors': [],
@@ -1052,9 +1294,8 @@ class SimpleEnhancedAudioProcessor:
         if mood in self.color_palettes['mood_based']:
             mood_colors = self.color_palettes['mood_based'][mood]
             # Add some randomization to mood colors
-            import random
             if len(mood_colors) > 4:
-                mood_colors = random.sample(mood_colors, 4)
+                mood_colors = rng.sample(mood_colors, 4)
             palette['mood_colors'] = mood_colors
         
         # Get energy-based colors
@@ -1062,9 +1303,8 @@ class SimpleEnhancedAudioProcessor:
         if energy in self.color_palettes['energy_based']:
             energy_colors = self.color_palettes['energy_based'][energy]
             # Add some randomization to energy colors
-            import random
             if len(energy_colors) > 3:
-                energy_colors = random.sample(energy_colors, 3)
+                energy_colors = rng.sample(energy_colors, 3)
             palette['primary_colors'] = energy_colors
         
         # Get tempo-based colors
@@ -1132,11 +1372,9 @@ class SimpleEnhancedAudioProcessor:
         """Detect instruments based on audio characteristics and transcription"""
         detected_instruments = []
         
-        # Analyze filename for instrument hints
-        file_name = os.path.basename(audio_path).lower()
-        
-        # Check transcription for instrument keywords
-        transcription_lower = transcription.lower() if transcription else ""
+        # Tokenize filename and transcription once; keyword checks are lookups
+        name_index = filename_index(os.path.basename(audio_path))
+        transcript_index = get_index(transcription or "")
         
         # Analyze audio characteristics for instrument detection
         audio_characteristics = self._analyze_audio_for_instruments(audio_path)
@@ -1147,15 +1385,16 @@ class SimpleEnhancedAudioProcessor:
             detection_reasons = []
             
             # Check filename for instrument hints
-            for keyword in instrument_data['keywords']:
-                if keyword in file_name:
-                    score += 3
-                    detection_reasons.append(f"filename contains '{keyword}'")
+            for keyword in name_index.matches(instrument_data['keywords']):
+                score += 3
+                detection_reasons.append(f"filename contains '{keyword}'")
             
-            # Check transcription for instrument mentions
-            for keyword in instrument_data['keywords']:
-                if keyword in transcription_lower:
-                    score += 5
+            # Check transcription for instrument mentions, weighting repeats
+            for keyword, hits in transcript_index.matches(instrument_data['keywords']).items():
+                score += 5 + min(hits - 1, MAX_REPEAT_BONUS)
+                if hits > 1:
+                    detection_reasons.append(f"transcription mentions '{keyword}' {hits} times")
+                else:
                     detection_reasons.append(f"transcription mentions '{keyword}'")
             
             # Check audio characteristics
@@ -1183,41 +1422,37 @@ class SimpleEnhancedAudioProcessor:
 
     def _analyze_audio_for_instruments(self, audio_path: str) -> Dict[str, float]:
         """Analyze audio characteristics to detect instruments"""
-        file_name = os.path.basename(audio_path).lower()
+        name_index = filename_index(os.path.basename(audio_path))
         file_size = os.path.getsize(audio_path)
         
         # Simulate audio analysis based on file characteristics
         instrument_scores = {}
         
         # Piano detection (often in filenames, warm tones)
-        if any(word in file_name for word in ['piano', 'keys', 'melody', 'chords']):
+        if name_index.any_of(['piano', 'keys', 'melody', 'chords']):
             instrument_scores['piano'] = 4.0
-        elif 'piano' in file_name or 'keys' in file_name:
-            instrument_scores['piano'] = 2.0
         
         # Guitar detection
-        if any(word in file_name for word in ['guitar', 'acoustic', 'strings']):
+        if name_index.any_of(['guitar', 'acoustic', 'strings']):
             instrument_scores['guitar'] = 4.0
-        elif 'guitar' in file_name:
-            instrument_scores['guitar'] = 2.0
         
         # Voice detection (common in songs)
-        if any(word in file_name for word in ['voice', 'vocal', 'sing', 'song']):
+        if name_index.any_of(['voice', 'vocal', 'sing', 'song']):
             instrument_scores['voice'] = 3.0
         else:
             # Assume voice is likely present in most songs
             instrument_scores['voice'] = 1.5
         
         # Nature sounds detection
-        if any(word in file_name for word in ['bird', 'nature', 'ambient', 'environmental']):
+        if name_index.any_of(['bird', 'nature', 'ambient', 'environmental']):
             instrument_scores['nature_sounds'] = 4.0
         
         # Electronic/synth detection
-        if any(word in file_name for word in ['electronic', 'synth', 'digital', 'electronic']):
+        if name_index.any_of(['electronic', 'synth', 'digital', 'electronic']):
             instrument_scores['synth'] = 4.0
         
         # Drums detection (common in most music)
-        if any(word in file_name for word in ['drums', 'beat', 'rhythm']):
+        if name_index.any_of(['drums', 'beat', 'rhythm']):
             instrument_scores['drums'] = 3.0
         else:
             # Assume drums might be present
@@ -1225,242 +1460,34 @@ class SimpleEnhancedAudioProcessor:
         
         return instrument_scores
 
-    def create_instrument_enhanced_prompt(self, features: Dict[str, Any], transcription: str = "") -> str:
+    def create_instrument_enhanced_prompt(self, features: AudioFeatures, transcription: str = "") -> str:
         """Create an art prompt enhanced with instrument-specific visual elements and dynamic color palette"""
         detected_instruments = self.detect_instruments(features.get('audio_path', ''), transcription)
         base_prompt = self._create_base_art_prompt(features, transcription, detected_instruments)
         
         # Generate dynamic color palette
         color_palette = self.generate_dynamic_color_palette(features, detected_instruments)
-        
-        enhanced_parts = []
-        
-        # PRIORITY 1: Start with color information to emphasize it
-        if color_palette['final_colors']:
-            color_names = []
-            for color in color_palette['final_colors'][:6]:  # Use top 6 colors
-                # Convert hex to color names for better prompt understanding
-                color_name = self._hex_to_color_name(color)
-                color_names.append(color_name)
-            
-            # Create strong color emphasis
-            color_emphasis = f"ARTWORK featuring {', '.join(color_names)}"
-            enhanced_parts.append(color_emphasis)
-            
-            # Add color style description
-            enhanced_parts.append(f"Color style: {color_palette['description']}")
-            
-            # Add color intensity keywords
-            mood = features.get('mood', 'balanced')
-            energy = features.get('energy_level', 'medium')
-            
-            if energy == 'high' or mood in ['energetic', 'passionate']:
-                enhanced_parts.append("VIBRANT and INTENSE colors")
-            elif mood in ['peaceful', 'calm']:
-                enhanced_parts.append("SOFT and WARM colors")
-            elif mood in ['mysterious', 'dark']:
-                enhanced_parts.append("RICH and DEEP colors")
-            else:
-                enhanced_parts.append("BEAUTIFUL and HARMONIOUS colors")
-        
-        # PRIORITY 2: Add base artistic prompt
-        enhanced_parts.append(base_prompt)
-        
-        # PRIORITY 3: Add instrument elements
-        if detected_instruments:
-            instrument_elements = []
-            for instrument in detected_instruments[:3]:
-                visual_elements = instrument['visual_elements'][:2]
-                instrument_elements.extend(visual_elements)
-                moods = instrument['mood_associations'][:2]
-                instrument_elements.extend(moods)
-            
-            if instrument_elements:
-                enhanced_parts.append(f"Instrument elements: {', '.join(instrument_elements)}")
-            
-            instrument_names = [inst['name'] for inst in detected_instruments[:3]]
-            enhanced_parts.append(f"Detected instruments: {', '.join(instrument_names)}")
-        
-        # PRIORITY 4: Add final color reinforcement
-        if color_palette['final_colors']:
-            enhanced_parts.append("MUST USE the specified color palette prominently")
-            enhanced_parts.append("NO black and white or monochrome")
-            enhanced_parts.append("FULL COLOR artwork with rich, saturated colors")
-        
-        # PRIORITY 5: Add balanced art style instructions based on musical characteristics
-        mood = features.get('mood', 'balanced')
-        energy = features.get('energy_level', 'medium')
-        complexity = features.get('complexity', 'moderate')
-        musical_style = features.get('musical_style', 'experimental')
-        
-        # Determine art style based on musical characteristics - FAVOR REPRESENTATIONAL
-        if mood in ['peaceful', 'calm', 'serene'] and complexity == 'simple':
-            # Representational for simple, peaceful music
-            enhanced_parts.append("REPRESENTATIONAL and REALISTIC imagery")
-            enhanced_parts.append("peaceful and serene concrete scenes")
-            enhanced_parts.append("recognizable objects and environments")
-            enhanced_parts.append("NO ABSTRACT ART - ONLY REPRESENTATIONAL")
-            enhanced_parts.append("CREATE CONCRETE SCENES WITH REAL OBJECTS")
-        elif mood in ['dramatic', 'passionate'] and energy == 'medium':
-            # Representational for dramatic music (CHANGED FROM ABSTRACT)
-            enhanced_parts.append("REPRESENTATIONAL and DRAMATIC imagery")
-            enhanced_parts.append("concrete scenes with emotional intensity")
-            enhanced_parts.append("recognizable objects in dramatic lighting")
-            enhanced_parts.append("NO ABSTRACT ART - ONLY REPRESENTATIONAL")
-            enhanced_parts.append("CREATE CONCRETE SCENES WITH REAL OBJECTS")
-        elif mood in ['dramatic', 'passionate'] and energy == 'high':
-            # Representational for high-energy dramatic music (CHANGED FROM ABSTRACT)
-            enhanced_parts.append("REPRESENTATIONAL and INTENSE imagery")
-            enhanced_parts.append("concrete scenes with powerful emotion")
-            enhanced_parts.append("recognizable objects in intense lighting")
-            enhanced_parts.append("NO ABSTRACT ART - ONLY REPRESENTATIONAL")
-            enhanced_parts.append("CREATE CONCRETE SCENES WITH REAL OBJECTS")
-        elif mood in ['melancholic', 'contemplative'] and complexity == 'moderate':
-            # Representational for contemplative music
-            enhanced_parts.append("REPRESENTATIONAL and CONTEMPLATIVE imagery")
-            enhanced_parts.append("peaceful concrete scenes with depth")
-            enhanced_parts.append("recognizable objects in serene settings")
-            enhanced_parts.append("NO ABSTRACT ART - ONLY REPRESENTATIONAL")
-            enhanced_parts.append("CREATE CONCRETE SCENES WITH REAL OBJECTS")
-        elif mood in ['joyful', 'upbeat'] and musical_style in ['pop', 'electronic dance']:
-            # Mix of both for upbeat music
-            enhanced_parts.append("BALANCED artwork with both abstract and representational elements")
-            enhanced_parts.append("abstract backgrounds with concrete focal points")
-            enhanced_parts.append("dynamic composition with recognizable elements")
-        elif mood in ['mysterious', 'ethereal', 'atmospheric'] or (musical_style in ['ambient atmospheric'] and mood not in ['dramatic', 'passionate']):
-            # Abstract for mysterious/ambient music
-            enhanced_parts.append("ABSTRACT and ATMOSPHERIC artwork")
-            enhanced_parts.append("ethereal and dreamlike imagery")
-            enhanced_parts.append("fluid and organic abstract forms")
-        elif mood in ['energetic'] and energy == 'high':
-            # Representational for high-energy music (CHANGED FROM ABSTRACT)
-            enhanced_parts.append("REPRESENTATIONAL and DYNAMIC imagery")
-            enhanced_parts.append("concrete scenes with movement and energy")
-            enhanced_parts.append("recognizable objects in dynamic composition")
-            enhanced_parts.append("NO ABSTRACT ART - ONLY REPRESENTATIONAL")
-            enhanced_parts.append("CREATE CONCRETE SCENES WITH REAL OBJECTS")
-        else:
-            # Default approach - STRONGLY FAVOR REPRESENTATIONAL
-            enhanced_parts.append("REPRESENTATIONAL artwork with artistic interpretation")
-            enhanced_parts.append("concrete scenes with creative elements")
-            enhanced_parts.append("recognizable objects with artistic flair")
-            enhanced_parts.append("NO ABSTRACT ART - ONLY REPRESENTATIONAL")
-            enhanced_parts.append("CREATE CONCRETE SCENES WITH REAL OBJECTS")
-            enhanced_parts.append("AVOID ABSTRACT SHAPES AND PATTERNS")
-        
-        return " | ".join(enhanced_parts)
+        # Hex colors read poorly in prompts, so use names for the top 6
+        color_names = [self._hex_to_color_name(color) for color in color_palette['final_colors'][:6]]
+        
+        instrument_elements = []
+        for instrument in detected_instruments[:3]:
+            instrument_elements.extend(instrument['visual_elements'][:2])
+            instrument_elements.extend(instrument['mood_associations'][:2])
+        
+        return get_templates().render(
+            'instrument_enhanced', features,
+            color_names=', '.join(color_names),
+            palette_description=color_palette['description'],
+            base_prompt=base_prompt,
+            instrument_elements=', '.join(instrument_elements),
+            instrument_names=', '.join(inst['name'] for inst in detected_instruments[:3])
+        )
 
-    def _create_base_art_prompt(self, features: Dict[str, Any], transcription: str = "", detected_instruments: List[Dict[str, Any]] = None) -> str:
+    def _create_base_art_prompt(self, features: AudioFeatures, transcription: str = "", detected_instruments: List[Dict[str, Any]] = None) -> str:
         """Create a base art prompt without instrument enhancement (to avoid recursion)"""
-        # Core musical characteristics
-        mood = features.get('mood', 'moderate')
-        energy = features.get('energy_level', 'medium')
-        complexity = features.get('complexity', 'moderate')
-        musical_style = features.get('musical_style', 'experimental')
-        emotional_tone = features.get('emotional_tone', 'balanced')
-        artistic_style = features.get('artistic_style', 'contemporary artistic')
-        
-        # Visual characteristics
-        brightness = features.get('brightness', 'balanced')
-        texture = features.get('texture', 'balanced')
-        rhythm_complexity = features.get('rhythm_complexity', 'moderate')
-        expression = features.get('expression', 'moderate')
-        duration = features.get('duration', 0)
-        
-        # Advanced characteristics
-        sophistication = features.get('sophistication_level', 'simple')
-        emotional_depth = features.get('emotional_depth', 'subtle')
-        innovation = features.get('musical_innovation', 'traditional')
-        
-        # Build sophisticated prompt components
-        prompt_parts = [
-            f"Create a {artistic_style} visual representation of {musical_style} music",
-            f"with {mood} mood and {energy} energy",
-            f"Complexity: {complexity}, Duration: {duration:.1f} seconds"
-        ]
-        
-        # Note: Art style instructions are handled in create_instrument_enhanced_prompt
-        # to avoid duplication
-        
-        # Add emotional and stylistic elements
-        prompt_parts.append(f"Emotional tone: {emotional_tone}")
-        prompt_parts.append(f"Visual brightness: {brightness}")
-        prompt_parts.append(f"Texture: {texture}")
-        prompt_parts.append(f"Sophistication: {sophistication}")
-        prompt_parts.append(f"Emotional depth: {emotional_depth}")
-        
-        # Add rhythm-inspired elements
-        if rhythm_complexity == 'complex':
-            prompt_parts.append("rhythmic and layered")
-        elif rhythm_complexity == 'simple':
-            prompt_parts.append("minimal and clean")
-        
-        # Add expression-inspired elements
-        if expression == 'expressive':
-            prompt_parts.append("dynamic and dramatic")
-        elif expression == 'consistent':
-            prompt_parts.append("harmonious and balanced")
-        
-        # Add innovation-inspired elements
-        if innovation == 'innovative':
-            prompt_parts.append("avant-garde and experimental")
-        elif innovation == 'creative':
-            prompt_parts.append("imaginative and original")
-        
-        # Add style-specific artistic elements
-        if musical_style == 'electronic dance':
-            prompt_parts.append("futuristic and digital")
-        elif musical_style == 'acoustic folk':
-            prompt_parts.append("organic and natural")
-        elif musical_style == 'ambient atmospheric':
-            prompt_parts.append("atmospheric and ethereal")
-        elif musical_style == 'jazz fusion':
-            prompt_parts.append("sophisticated and dynamic")
-        elif musical_style == 'rock':
-            prompt_parts.append("powerful and energetic")
-        elif musical_style == 'classical':
-            prompt_parts.append("elegant and refined")
-        elif musical_style == 'pop':
-            prompt_parts.append("bright and accessible")
-        elif musical_style == 'experimental':
-            prompt_parts.append("innovative and creative")
-        
-        # Add specific scene suggestions based on mood and energy
-        if mood == 'peaceful' and energy == 'low':
-            prompt_parts.append("peaceful landscape or serene environment")
-        elif mood == 'energetic' and energy == 'high':
-            prompt_parts.append("dynamic scene with movement and energy")
-        elif mood == 'mysterious':
-            prompt_parts.append("mysterious or atmospheric environment")
-        elif mood == 'joyful':
-            prompt_parts.append("bright and cheerful scene")
-        elif mood == 'melancholy':
-            prompt_parts.append("contemplative or reflective scene")
-        elif mood == 'passionate':
-            prompt_parts.append("intense and dramatic scene")
-        
-        # Add instrument-specific scene suggestions (only if detected_instruments is provided)
-        if detected_instruments:
-            for instrument in detected_instruments[:2]:  # Top 2 instruments
-                instrument_name = instrument['name']
-                if instrument_name == 'piano':
-                    prompt_parts.append("elegant piano or musical setting")
-                elif instrument_name == 'guitar':
-                    prompt_parts.append("acoustic or electric guitar scene")
-                elif instrument_name == 'drums':
-                    prompt_parts.append("rhythmic drum or percussion scene")
-                elif instrument_name == 'voice':
-                    prompt_parts.append("vocal or singing scene")
-                elif instrument_name == 'nature_sounds':
-                    prompt_parts.append("natural outdoor environment")
-                elif instrument_name == 'synth':
-                    prompt_parts.append("electronic or digital music scene")
-        
-        # Add transcription if available
-        if transcription and transcription.strip():
-            prompt_parts.append(f"Audio content: '{transcription.strip()}'")
-        
-        return " | ".join(prompt_parts)
+        return get_templates().render('base_art', features, instruments=detected_instruments,
+                                      transcription=(transcription or '').strip())
 
     def _hex_to_color_name(self, hex_color: str) -> str:
         """Convert hex color to descriptive color name"""
@@ -0,0 +1,189 @@
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple, Union
+
+# Words are runs of letters/digits; everything else (spaces, punctuation,
+# underscores, hyphens, extension dots) is a boundary. "hi-hat" and
+# "r&b" therefore become the bigrams "hi hat" and "r b".
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words whose trailing "s" is not a plural; stripping it would merge them
+# with a different keyword ("blues" the genre vs "blue" the colour)
+_KEEP_AS_IS = frozenset({'blues', 'bass', 'news', 'series'})
+
+# Cap on the extra detector score a keyword earns for being repeated
+MAX_REPEAT_BONUS = 3
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text and strip accents so 'Café' and 'cafe' index the same"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized word tokens"""
+    return _TOKEN_PATTERN.findall(normalize_text(text))
+
+
+@lru_cache(maxsize=8192)
+def stem(token: str) -> str:
+    """Light suffix stripping so inflected forms share one index term.
+
+    Handles plurals and -ing forms only ("guitars" -> "guitar", "melodies"
+    -> "melody", "strumming" -> "strum"); short words are left alone so
+    "string", "swing" and "was" survive. Both the indexed text and the
+    keywords go through it, so the rules only need to be consistent, not
+    linguistically exact.
+    """
+    if token in _KEEP_AS_IS:
+        return token
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 5 and token.endswith('ing'):
+        base = token[:-3]
+        if len(base) < 4:
+            return token
+        # Undo the doubled consonant of "drumming", but keep "rolling" -> "roll"
+        if base[-1] == base[-2] and base[-1] not in 'lsz':
+            base = base[:-1]
+        return base
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def index_terms(text: str) -> List[str]:
+    """Tokens of a text reduced to the stemmed terms the index stores"""
+    return [stem(token) for token in tokenize(text)]
+
+
+@lru_cache(maxsize=4096)
+def _keyword_key(keyword: str) -> Tuple[str, ...]:
+    """Normalize a keyword or phrase into the term tuple used for lookups"""
+    return tuple(index_terms(keyword))
+
+
+class TranscriptIndex:
+    """Token and bigram frequency index built in a single pass over a text.
+
+    Lookups are word-boundary aware ('hip' does not match 'relationship')
+    and cost one dict access per keyword regardless of the text length.
+    Text and keywords are stemmed, so inflections still match ('drums'
+    finds "drum", 'guitar' finds "strumming guitars"); unrelated words
+    that merely contain a keyword no longer do.
+    """
+
+    __slots__ = ('tokens', 'unigrams', 'bigrams')
+
+    def __init__(self, text: str = ""):
+        self.tokens = tuple(index_terms(text))
+        self.unigrams = Counter(self.tokens)
+        self.bigrams = Counter(zip(self.tokens, self.tokens[1:]))
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __bool__(self) -> bool:
+        return bool(self.tokens)
+
+    def count(self, keyword: str) -> int:
+        """Number of occurrences of a one- or two-word keyword"""
+        key = _keyword_key(keyword)
+        if len(key) == 1:
+            return self.unigrams.get(key[0], 0)
+        if len(key) == 2:
+            return self.bigrams.get(key, 0)
+        if not key:
+            return 0
+        # Longer phrases are rare in the keyword databases; bound the count by
+        # the rarest bigram, then confirm with a scan over candidate positions
+        if min(self.bigrams.get(pair, 0) for pair in zip(key, key[1:])) == 0:
+            return 0
+        width = len(key)
+        return sum(
+            1 for i in range(len(self.tokens) - width + 1)
+            if self.tokens[i:i + width] == key
+        )
+
+    def contains(self, keyword: str) -> bool:
+        """True if the keyword occurs at least once"""
+        return self.count(keyword) > 0
+
+    def any_of(self, keywords: Iterable[str]) -> bool:
+        """True if any keyword occurs"""
+        return any(self.count(keyword) for keyword in keywords)
+
+    def matches(self, keywords: Iterable[str]) -> Dict[str, int]:
+        """Map each keyword that occurs to its occurrence count"""
+        found = {}
+        for keyword in keywords:
+            hits = self.count(keyword)
+            if hits:
+                found[keyword] = hits
+        return found
+
+    def first_match(self, keyword_groups: Union['KeywordGroups', Dict[str, List[str]]]) -> str:
+        """Return the first group name whose keywords occur, or '' if none do"""
+        if isinstance(keyword_groups, KeywordGroups):
+            return keyword_groups.first_match(self)
+        for name, keywords in keyword_groups.items():
+            if self.any_of(keywords):
+                return name
+        return ""
+
+
+class KeywordGroups:
+    """Named keyword lists compiled once into token lookups.
+
+    Matching walks the (short) token and bigram lists of an index instead of
+    every keyword, so its cost does not grow with the keyword database.
+    """
+
+    __slots__ = ('names', 'lookup', 'long_phrases')
+
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.names = list(groups)
+        self.lookup: Dict[Tuple[str, ...], int] = {}
+        self.long_phrases: List[Tuple[str, int]] = []
+        for rank, keywords in enumerate(groups.values()):
+            for keyword in keywords:
+                key = _keyword_key(keyword)
+                if len(key) > 2:
+                    self.long_phrases.append((keyword, rank))
+                elif key:
+                    # Earlier groups win, matching dict-order iteration
+                    self.lookup.setdefault(key, rank)
+
+    def first_match(self, index: 'TranscriptIndex') -> str:
+        """Name of the earliest group with a keyword in the index, or ''"""
+        best = len(self.names)
+        lookup = self.lookup
+        for token in index.unigrams:
+            rank = lookup.get((token,), best)
+            if rank < best:
+                best = rank
+        for pair in index.bigrams:
+            rank = lookup.get(pair, best)
+            if rank < best:
+                best = rank
+        for keyword, rank in self.long_phrases:
+            if rank < best and index.contains(keyword):
+                best = rank
+        return self.names[best] if best < len(self.names) else ""
+
+
+@lru_cache(maxsize=256)
+def get_index(text: str) -> TranscriptIndex:
+    """Build (or reuse) the index for a text; repeated detectors share one pass"""
+    return TranscriptIndex(text)
+
+
+def filename_index(file_name: str) -> TranscriptIndex:
+    """Index a file name, ignoring its extension"""
+    stem = file_name.rsplit('.', 1)[0] if '.' in file_name else file_name
+    return get_index(stem)
@@ -0,0 +1,85 @@
+import math
+from typing import Any, Dict
+
+import numpy as np
+
+# Analysis frames of about 32 ms with a half-frame hop
+FRAME_SECONDS = 0.032
+
+# Most of a voice's energy (fundamental to upper formants) falls here
+SPEECH_BAND = (300.0, 3400.0)
+
+# A frame is voiced when its speech band is tonal (flatness: 0 pure tone
+# .. 1 noise) and has kept moving for VOICED_MIN_FRAMES frames: glides,
+# vibrato and formant changes hold a voice's spectral flux in this range,
+# where held chords and decaying notes settle below it and drum hits
+# spike above it for a frame or two
+VOICED_MAX_FLATNESS = 0.35
+VOICED_FLUX = (0.1, 0.7)
+VOICED_MIN_FRAMES = 3
+
+# Frames more than this far (in amplitude) below the track's loud level are silence
+SILENCE_RATIO = 0.05
+
+# Share of non-silent frames that are voiced, mapped linearly onto 0..1 confidence
+VOICED_RATIO_FLOOR = 0.1
+VOICED_RATIO_CEILING = 0.6
+
+# Confidence at or above which a track counts as having vocals; below
+# SKIP_TRANSCRIPTION_BELOW transcription is not worth a remote call. The
+# estimate is a heuristic not yet tuned on real recordings (a harmonic
+# voice with vibrato can score near 0.4, a noisy piano near 1.0), so only
+# tracks with almost no voiced frames skip Whisper
+VOCAL_THRESHOLD = 0.5
+SKIP_TRANSCRIPTION_BELOW = 0.1
+
+
+def _frames(samples: np.ndarray, frame_length: int, hop_length: int) -> np.ndarray:
+    if len(samples) < frame_length:
+        samples = np.pad(samples, (0, frame_length - len(samples)))
+    return np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop_length]
+
+
+def vocal_activity(samples: np.ndarray, sample_rate: int) -> Dict[str, Any]:
+    """Estimate whether mono float samples contain voice.
+
+    Returns confidence (0..1), has_vocals, and the measurements behind
+    them. A heuristic for routing, not a singing-voice separator: held
+    pads, piano and drums score low; lead vocals and speech, alone or over
+    a backing track, score high.
+    """
+    frame_length = 1 << max(6, math.ceil(math.log2(FRAME_SECONDS * sample_rate)))
+    frames = _frames(np.asarray(samples, dtype=np.float32), frame_length, frame_length // 2)
+    power = np.square(np.abs(np.fft.rfft(frames * np.hanning(frame_length).astype(np.float32), axis=1)))
+    frequencies = np.fft.rfftfreq(frame_length, 1.0 / sample_rate)
+    in_band = (frequencies >= SPEECH_BAND[0]) & (frequencies < SPEECH_BAND[1])
+
+    energy = power.sum(axis=1)
+    loud_level = np.percentile(energy, 95) if len(energy) else 0.0
+    active = energy > loud_level * SILENCE_RATIO ** 2
+    if loud_level <= 0 or not active.any():
+        return {'confidence': 0.0, 'has_vocals': False, 'voiced_ratio': 0.0, 'tonal_ratio': 0.0,
+                'active_ratio': 0.0}
+
+    band_power = power[:, in_band]
+    # Spectral flatness: geometric over arithmetic mean of the band's power
+    flatness = np.exp(np.mean(np.log(band_power + 1e-12), axis=1)) / (np.mean(band_power, axis=1) + 1e-12)
+    tonal = active & (flatness <= VOICED_MAX_FLATNESS)
+    # Spectral flux: how much of the band's magnitude changed since the last frame
+    magnitude = np.sqrt(band_power)
+    change = np.abs(np.diff(magnitude, axis=0)).sum(axis=1)
+    flux = np.concatenate(([0.0], change / (magnitude[1:].sum(axis=1) + magnitude[:-1].sum(axis=1) + 1e-12)))
+    moving = (flux >= VOICED_FLUX[0]) & (flux <= VOICED_FLUX[1])
+    padded = np.concatenate((np.zeros(VOICED_MIN_FRAMES - 1, dtype=bool), moving))
+    voiced = tonal & np.lib.stride_tricks.sliding_window_view(padded, VOICED_MIN_FRAMES).all(axis=1)
+
+    voiced_ratio = float(voiced.sum() / active.sum())
+    confidence = (voiced_ratio - VOICED_RATIO_FLOOR) / (VOICED_RATIO_CEILING - VOICED_RATIO_FLOOR)
+    confidence = min(max(confidence, 0.0), 1.0)
+    return {
+        'confidence': round(confidence, 3),
+        'has_vocals': confidence >= VOCAL_THRESHOLD,
+        'voiced_ratio': round(voiced_ratio, 3),
+        'tonal_ratio': round(float(tonal.sum() / active.sum()), 3),
+        'active_ratio': round(float(active.mean()), 3)
+    }
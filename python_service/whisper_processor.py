@@ -1,37 +1,102 @@
 import os
+import queue
+import threading
+import time
+import base64
 import requests
 import json
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from seeding import seed_from
+from cancellation import CancelToken, JobCancelled
+from fair_queue import get_prediction_slots
+from job_store import start_prediction
+from prediction_registry import PredictionRegistry, TERMINAL_STATUSES, replicate_api_base
+from audio_io import (AudioChunk, CHUNK_SECONDS, DEFAULT_UPLOAD_FORMAT, UPLOAD_FORMATS, WHISPER_SAMPLE_RATE,
+                      chunk_audio, encode_audio, load_audio, mono_samples, silence_bounds, source_mime_type)
+from vocal_activity import SKIP_TRANSCRIPTION_BELOW, vocal_activity
+
+# Transcriptions are given this long to finish; without webhooks they are
+# polled every POLL_INTERVAL seconds
+PREDICTION_TIMEOUT = 60
+POLL_INTERVAL = 2
+
+# Chunks of long audio are transcribed at most this many at a time
+MAX_CONCURRENT_CHUNKS = 8
+
+WHISPER_VERSION = "openai/whisper:91ee9c0c3df30478510ff8c8a3a545add1ad0259ad3a9f78fba57fbc05ee64f7"
+
+# Transcription tiers, fastest first: the Whisper model size each runs and
+# the seconds it normally finishes within. Hedged, the next tier starts
+# once the running ones overrun their target, and the first acceptable
+# result wins; otherwise a tier is only tried after the one before it fails
+TRANSCRIPTION_TIERS = (
+    ('fast', 'small', 15),
+    ('accurate', 'large-v2', 45)
+)
 
 class WhisperAudioProcessor:
     """Audio processor focused on transcription services"""
 
-    def __init__(self, replicate_api_key: str = None):
+    def __init__(self, replicate_api_key: str = None, registry: PredictionRegistry = None):
         self.replicate_api_key = replicate_api_key or os.getenv('REPLICATE_API_KEY')
+        # Completion webhooks replace polling when the registry is enabled
+        self.registry = registry
+        # Audio longer than about this many seconds is transcribed in
+        # concurrent chunks (0 always sends the whole file)
+        self.chunk_seconds = float(os.getenv('WHISPER_CHUNK_SECONDS', CHUNK_SECONDS))
+        # Tracks whose vocal-activity confidence is below this are not sent
+        # to Whisper at all (0 always transcribes)
+        self.skip_below = float(os.getenv('VOCAL_SKIP_BELOW', SKIP_TRANSCRIPTION_BELOW))
+        # Audio is uploaded as 16 kHz mono in this encoding
+        self.upload_format = os.getenv('WHISPER_UPLOAD_FORMAT', DEFAULT_UPLOAD_FORMAT).lower()
+        if self.upload_format not in UPLOAD_FORMATS:
+            print(f"⚠️ Unknown WHISPER_UPLOAD_FORMAT '{self.upload_format}', using {DEFAULT_UPLOAD_FORMAT}")
+            self.upload_format = DEFAULT_UPLOAD_FORMAT
         
-        # Replicate transcription services only
-        self.transcription_services = {
-            'replicate_whisper_medium': {
-                'url': "https://api.replicate.com/v1/predictions",
-                'model': "openai/whisper:91ee9c0c3df30478510ff8c8a3a545add1ad0259ad3a9f78fba57fbc05ee64f7",
-                'available': bool(self.replicate_api_key),
-                'priority': 1,
-                'type': 'replicate'
-            },
-            'replicate_whisper_large': {
-                'url': "https://api.replicate.com/v1/predictions",
-                'model': "openai/whisper:91ee9c0c3df30478510ff8c8a3a545add1ad0259ad3a9f78fba57fbc05ee64f7",
+        # 'hedged' races the tiers; 'fallback' tries them one after another
+        self.hedged = os.getenv('WHISPER_STRATEGY', 'hedged').lower() != 'fallback'
+        
+        # Replicate transcription services only, one per tier; model sizes
+        # and latency targets can be overridden per tier, e.g.
+        # WHISPER_FAST_MODEL=base or WHISPER_ACCURATE_TARGET=30
+        self.transcription_services = {}
+        for priority, (tier, model_size, latency_target) in enumerate(TRANSCRIPTION_TIERS, 1):
+            self.transcription_services[f'replicate_whisper_{tier}'] = {
+                'url': f"{replicate_api_base()}/predictions",
+                'model': WHISPER_VERSION,
+                'model_size': os.getenv(f'WHISPER_{tier.upper()}_MODEL', model_size),
+                'latency_target': float(os.getenv(f'WHISPER_{tier.upper()}_TARGET', latency_target)),
                 'available': bool(self.replicate_api_key),
-                'priority': 2,
+                'priority': priority,
                 'type': 'replicate'
             }
-        }
 
     def transcribe_audio(self, audio_path: str) -> str:
         """Transcribe audio using multiple available services"""
+        return self.transcribe(audio_path)['text']
+
+    def transcribe(self, audio_path: str, cancel: CancelToken = None) -> Dict[str, Any]:
+        """Transcription text plus timed segments ({'start', 'end', 'text'}, in seconds).
+
+        Audio longer than a chunk is split at quiet points and its chunks
+        are transcribed concurrently; 'chunks' says how many predictions ran.
+        'vocals' is the local vocal-activity estimate (None if the audio could
+        not be decoded); tracks it finds instrumental are not transcribed.
+        A fired cancel token cancels running predictions and raises JobCancelled.
+        """
         # Store audio path for instrument detection
         self._last_audio_path = audio_path
         
+        # Decoded once, for the vocal check, chunking and upload; leading and
+        # trailing silence is cut, and offset maps times back onto the file
+        audio = self._decode(audio_path)
+        audio, offset = self._trim_silence(audio)
+        vocals = self._vocal_activity(audio)
+        if vocals is not None and vocals['confidence'] < self.skip_below:
+            print(f"🔇 No vocals detected (confidence {vocals['confidence']:.2f}), skipping transcription")
+            return {'text': '', 'segments': [], 'chunks': 0, 'vocals': vocals}
+        
         # Try each available service in priority order
         available_services = [
             service for service in self.transcription_services.items()
@@ -41,119 +106,364 @@ class WhisperAudioProcessor:
         # Sort by priority (lower number = higher priority)
         available_services.sort(key=lambda x: x[1]['priority'])
         
-        for service_name, service_config in available_services:
+        if self.hedged and len(available_services) > 1:
+            # A single attempt racing all the tiers
+            attempts = [(' + '.join(name for name, _ in available_services), available_services)]
+        else:
+            attempts = [(service_name, [(service_name, service_config)])
+                        for service_name, service_config in available_services]
+        
+        for service_name, services in attempts:
             try:
                 print(f"🎤 Attempting transcription with {service_name}...")
-                transcription = self._transcribe_with_service(audio_path, service_name, service_config)
-                if transcription:
+                result = self._transcribe_with_services(audio_path, audio, services, cancel)
+                if result and result['text']:
                     print(f"✅ Transcription successful with {service_name}")
-                    return transcription
+                    for segment in result['segments']:
+                        segment['start'] = round(segment['start'] + offset, 2)
+                        segment['end'] = round(segment['end'] + offset, 2)
+                    result['vocals'] = vocals
+                    return result
             except Exception as e:
                 print(f"❌ {service_name} failed: {e}")
                 continue
         
         # If all services fail, use simulated transcription
         print("⚠️ All transcription services failed, using simulated transcription")
-        return self._simulate_transcription(audio_path)
+        return {'text': self._simulate_transcription(audio_path), 'segments': [], 'chunks': 0, 'vocals': vocals}
+
+    def _decode(self, audio_path: str) -> Any:
+        """The audio as 16 kHz mono, or None when it cannot be decoded (the file is then sent as is)"""
+        try:
+            return load_audio(audio_path, WHISPER_SAMPLE_RATE)
+        except Exception as e:
+            print(f"⚠️ Could not decode audio, skipping the vocal check, trimming and chunking: {e}")
+            return None
+
+    def _trim_silence(self, audio: Any) -> Tuple[Any, float]:
+        """The audio without leading and trailing silence, and the seconds cut from its start"""
+        if audio is None:
+            return None, 0.0
+        start, end = silence_bounds(audio)
+        duration = len(audio) / 1000.0
+        if start <= 0 and end >= duration:
+            return audio, 0.0
+        print(f"✂️ Trimmed {start:.1f}s of leading and {duration - end:.1f}s of trailing silence")
+        return audio[int(start * 1000):int(end * 1000)], start
 
-    def _transcribe_with_service(self, audio_path: str, service_name: str, service_config: Dict[str, Any]) -> str:
-        """Transcribe audio with a specific service"""
+    def _vocal_activity(self, audio: Any) -> Optional[Dict[str, Any]]:
+        """Vocal-activity estimate of decoded audio"""
+        if audio is None:
+            return None
+        started = time.time()
+        vocals = vocal_activity(mono_samples(audio), audio.frame_rate)
+        print(f"🎙️ Vocal activity {vocals['confidence']:.2f} ({time.time() - started:.2f}s)")
+        return vocals
+
+    def _transcribe_with_services(self, audio_path: str, audio: Any, services: List[Tuple[str, Dict[str, Any]]],
+                                  cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        """Transcribe audio with specific services (several are hedged against each other)"""
         
-        service_type = service_config.get('type', 'unknown')
+        for service_name, service_config in services:
+            service_type = service_config.get('type', 'unknown')
+            if service_type != 'replicate':
+                raise ValueError(f"Unknown transcription service type: {service_type}")
         
-        if service_type == 'replicate':
-            return self._transcribe_with_replicate(audio_path, service_config)
+        return self._transcribe_with_replicate(audio_path, audio, services, cancel)
+
+    def _transcribe_with_replicate(self, audio_path: str, audio: Any, services: List[Tuple[str, Dict[str, Any]]],
+                                   cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        """Transcribe using Replicate Whisper models, in concurrent chunks for long audio"""
+        chunks = self._plan_chunks(audio)
+        if chunks:
+            return self._transcribe_chunks(audio, chunks, services, cancel)
+        
+        if audio is not None:
+            audio_data, mime_type = encode_audio(audio, upload_format=self.upload_format)
         else:
-            raise ValueError(f"Unknown transcription service type: {service_type}")
+            with open(audio_path, 'rb') as audio_file:
+                audio_data, mime_type = audio_file.read(), source_mime_type(audio_path)
+        print(f"📦 Uploading {len(audio_data) / 1e6:.2f} MB of {mime_type} "
+              f"({os.path.getsize(audio_path) / 1e6:.2f} MB source)")
+        result = self._run_tiers(self._data_uri(audio_data, mime_type), services, cancel)
+        if result is not None:
+            result['chunks'] = 1
+        return result
+
+    def _plan_chunks(self, audio: Any) -> Optional[List[AudioChunk]]:
+        """Chunks of the decoded audio, or None when it is short, undecodable or chunking is off"""
+        if audio is None or self.chunk_seconds <= 0:
+            return None
+        return chunk_audio(audio, self.chunk_seconds)
+
+    def _transcribe_chunks(self, audio: Any, chunks: List[AudioChunk], services: List[Tuple[str, Dict[str, Any]]],
+                           cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        """Transcribe chunks concurrently and stitch their segments onto the source timeline"""
+        def transcribe_chunk(chunk: AudioChunk) -> Optional[Dict[str, Any]]:
+            try:
+                audio_data, mime_type = encode_audio(audio, chunk.start, chunk.end, self.upload_format)
+                return self._run_tiers(self._data_uri(audio_data, mime_type), services, cancel)
+            except Exception as e:
+                print(f"Replicate transcription error in chunk {chunk.index}: {e}")
+                return None
+        
+        print(f"🎤 Transcribing {len(chunks)} chunks of {len(audio) / 1000.0:.0f}s audio concurrently...")
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_CHUNKS, len(chunks))) as executor:
+            results = list(executor.map(transcribe_chunk, chunks))
+        
+        segments = []
+        for chunk, result in zip(chunks, results):
+            if result is None:
+                print(f"⚠️ Chunk {chunk.index} ({chunk.keep_start:.0f}-{chunk.keep_end:.0f}s) has no transcription")
+                continue
+            if not result['segments']:
+                # Untimed output covers the chunk's kept span
+                segments.append({'start': chunk.keep_start, 'end': chunk.keep_end, 'text': result['text']})
+                continue
+            for segment in result['segments']:
+                start, end = chunk.start + segment['start'], chunk.start + segment['end']
+                # Overlapping chunks both hear a segment near a cut; the one
+                # whose kept span holds its midpoint keeps it
+                if chunk.keep_start <= (start + end) / 2 < chunk.keep_end:
+                    segments.append({'start': round(start, 2), 'end': round(end, 2), 'text': segment['text']})
+        
+        if not any(results):
+            return None
+        text = ' '.join(segment['text'] for segment in segments if segment['text'])
+        return {'text': text, 'segments': segments, 'chunks': len(chunks)}
+
+    def _run_tiers(self, audio_uri: str, services: List[Tuple[str, Dict[str, Any]]],
+                   cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        """One transcription of the audio, hedged across the services when there are several"""
+        if len(services) == 1:
+            return self._run_whisper(audio_uri, services[0][1], cancel=cancel)
+        return self._run_hedged(audio_uri, services, cancel)
 
-    def _transcribe_with_replicate(self, audio_path: str, service_config: Dict[str, Any]) -> str:
-        """Transcribe using Replicate Whisper models"""
+    def _run_hedged(self, audio_uri: str, services: List[Tuple[str, Dict[str, Any]]],
+                    cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        """Start the fastest tier, add the next whenever the running ones overrun their latency target.
+
+        The first result with text wins and the other predictions are
+        cancelled; if none has text, the last successful one is returned.
+        """
+        results: queue.Queue = queue.Queue()
+        lock = threading.Lock()
+        # service name -> prediction id, for cancelling the losers still running
+        created: Dict[str, str] = {}
+        decided = threading.Event()
+
+        def on_created(service_name: str, service_config: Dict[str, Any], prediction_id: str):
+            with lock:
+                created[service_name] = prediction_id
+            if decided.is_set():
+                # Created after the race was already won
+                self._cancel_prediction(prediction_id, service_config['url'])
+
+        def attempt(service_name: str, service_config: Dict[str, Any]):
+            result = None
+            try:
+                result = self._run_whisper(audio_uri, service_config, on_created=lambda prediction_id:
+                                           on_created(service_name, service_config, prediction_id), cancel=cancel)
+            except JobCancelled:
+                pass
+            except Exception as e:
+                print(f"❌ {service_name} failed: {e}")
+            finally:
+                results.put((service_name, result))
+
+        started = time.time()
+        launched = running = 0
+        hedge_at = started
+        winner, fallback = None, None
+        while cancel is None or not cancel.cancelled:
+            if launched < len(services) and (running == 0 or time.time() >= hedge_at):
+                service_name, service_config = services[launched]
+                if launched:
+                    print(f"⏱️ Hedging with {service_name} after {time.time() - started:.1f}s")
+                threading.Thread(target=attempt, args=services[launched], name=f'whisper-{service_name}',
+                                 daemon=True).start()
+                hedge_at = time.time() + service_config['latency_target']
+                launched += 1
+                running += 1
+            if running == 0:
+                break
+            try:
+                timeout = max(0.0, hedge_at - time.time()) if launched < len(services) else None
+                service_name, result = results.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            running -= 1
+            with lock:
+                created.pop(service_name, None)
+            if result is not None and result['text']:
+                winner = (service_name, result)
+                break
+            if result is not None:
+                fallback = (service_name, result)
+
+        decided.set()
+        winner = winner or fallback
+        with lock:
+            losers = list(created.items())
+        for service_name, prediction_id in losers:
+            self._cancel_prediction(prediction_id, dict(services)[service_name]['url'])
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        if winner is None:
+            return None
+        print(f"🏁 {winner[0]} answered first ({time.time() - started:.1f}s)")
+        return winner[1]
+
+    def _cancel_prediction(self, prediction_id: str, url: str):
+        """Ask Replicate to stop a prediction whose result is no longer needed"""
         try:
-            # Replicate uses a two-step process: create prediction, then poll for results
-            headers = {
-                'Authorization': f'Token {self.replicate_api_key}',
-                'Content-Type': 'application/json'
-            }
+            requests.post(f"{url}/{prediction_id}/cancel", headers=self._headers(), timeout=10)
+        except Exception as e:
+            print(f"⚠️ Could not cancel prediction {prediction_id}: {e}")
 
-            # Step 1: Create prediction
-            with open(audio_path, 'rb') as audio_file:
-                import base64
-                audio_data = base64.b64encode(audio_file.read()).decode('utf-8')
+    def _headers(self) -> Dict[str, str]:
+        return {
+            'Authorization': f'Token {self.replicate_api_key}',
+            'Content-Type': 'application/json'
+        }
+
+    @staticmethod
+    def _data_uri(audio_data: bytes, mime_type: str) -> str:
+        return f"data:{mime_type};base64,{base64.b64encode(audio_data).decode('ascii')}"
 
+    def _run_whisper(self, audio_uri: str, service_config: Dict[str, Any],
+                     on_created: Callable[[str], None] = None,
+                     cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        """One Whisper prediction on a data URI; its text and timed segments, or None on failure.
+
+        on_created(prediction_id) is called as soon as the prediction exists;
+        it is tracked on the cancel token while it runs. The prediction
+        holds one of its lane's Replicate slots, waiting for one if needed.
+        """
+        with get_prediction_slots().slot(cancel):
+            return self._run_whisper_prediction(audio_uri, service_config, on_created, cancel)
+
+    def _run_whisper_prediction(self, audio_uri: str, service_config: Dict[str, Any],
+                                on_created: Callable[[str], None] = None,
+                                cancel: CancelToken = None) -> Optional[Dict[str, Any]]:
+        try:
+            # Replicate uses a two-step process: create prediction, then wait for results
+            headers = self._headers()
+
+            # Step 1: Create prediction
             payload = {
                 "version": service_config['model'],
                 "input": {
-                    "audio": f"data:audio/m4a;base64,{audio_data}",
-                    "model": "large-v2" if "large" in service_config.get('name', '') else "large",
+                    "audio": audio_uri,
+                    "model": service_config['model_size'],
                     "language": "en",
                     "task": "transcribe"
                 }
             }
 
-            print(f"Creating Replicate transcription prediction...")
-            response = requests.post(
-                service_config['url'],
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-
-            if response.status_code == 201:
-                prediction = response.json()
-                prediction_id = prediction['id']
-
-                # Step 2: Poll for completion
-                import time
-                max_attempts = 30
-                attempts = 0
-
-                while attempts < max_attempts:
-                    time.sleep(2)
-                    status_response = requests.get(
-                        f"{service_config['url']}/{prediction_id}",
-                        headers=headers
-                    )
-
-                    if status_response.status_code == 200:
-                        status_data = status_response.json()
-
-                        if status_data['status'] == 'succeeded':
-                            # Get the transcription
-                            transcription = status_data.get('output', '')
-                            if isinstance(transcription, dict) and 'transcription' in transcription:
-                                # Replicate Whisper returns a dict with 'transcription' field
-                                return transcription['transcription'].strip()
-                            elif isinstance(transcription, list) and len(transcription) > 0:
-                                return transcription[0].strip()
-                            elif isinstance(transcription, str):
-                                return transcription.strip()
-                            else:
-                                print(f"Unexpected transcription format: {transcription}")
-                                return None
-
-                        elif status_data['status'] == 'failed':
-                            print(f"Replicate prediction failed: {status_data.get('error', 'Unknown error')}")
-                            return None
-                        elif status_data['status'] == 'processing':
-                            print(f"Still processing... attempt {attempts + 1}")
-                            attempts += 1
-                            continue
-                    else:
-                        print(f"Error checking status: {status_response.status_code}")
-                        return None
+            def create() -> Optional[str]:
+                webhook_fields = self.registry.webhook_fields() if self.registry is not None else {}
+                print(f"Creating Replicate transcription prediction...")
+                response = requests.post(
+                    service_config['url'],
+                    headers=headers,
+                    json={**payload, **webhook_fields},
+                    timeout=60
+                )
+                if response.status_code != 201:
+                    print(f"Error creating Replicate prediction: {response.status_code}")
+                    print(response.text)
+                    return None
+                return response.json()['id']
 
+            # A resumed job gets back the prediction it created before the restart
+            prediction_id, resumed = start_prediction(cancel.journal if cancel is not None else None,
+                                                      'whisper', payload, create)
+            if prediction_id is None:
+                return None
+            if on_created is not None:
+                on_created(prediction_id)
+
+            # Step 2: Wait for completion (webhook-driven when enabled)
+            if cancel is not None:
+                cancel.track(prediction_id, lambda: self._cancel_prediction(prediction_id, service_config['url']))
+            try:
+                status_data = self._wait_for_prediction(prediction_id, service_config['url'], headers, cancel,
+                                                           refresh=resumed)
+            finally:
+                if cancel is not None:
+                    cancel.untrack(prediction_id)
+            if status_data is None:
                 print("Timeout waiting for Replicate prediction completion")
                 return None
+            if status_data['status'] == 'canceled':
+                print(f"Replicate prediction {prediction_id} canceled")
+                return None
+            if status_data['status'] != 'succeeded':
+                print(f"Replicate prediction failed: {status_data.get('error', 'Unknown error')}")
+                return None
 
+            # Get the transcription
+            transcription = status_data.get('output', '')
+            if isinstance(transcription, dict) and 'transcription' in transcription:
+                # Replicate Whisper returns a dict with 'transcription' and timed 'segments'
+                segments = [
+                    {'start': float(segment['start']), 'end': float(segment['end']),
+                     'text': segment.get('text', '').strip()}
+                    for segment in transcription.get('segments') or []
+                ]
+                return {'text': transcription['transcription'].strip(), 'segments': segments}
+            elif isinstance(transcription, list) and len(transcription) > 0:
+                return {'text': transcription[0].strip(), 'segments': []}
+            elif isinstance(transcription, str):
+                return {'text': transcription.strip(), 'segments': []}
             else:
-                print(f"Error creating Replicate prediction: {response.status_code}")
-                print(response.text)
+                print(f"Unexpected transcription format: {transcription}")
                 return None
 
         except Exception as e:
             print(f"Replicate transcription error: {e}")
             return None
 
+    def _wait_for_prediction(self, prediction_id: str, url: str, headers: Dict[str, str],
+                             cancel: CancelToken = None, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Terminal status data of a prediction, or None on error or timeout; raises JobCancelled once cancelled.
+
+        refresh (for a prediction re-attached after a restart) has the
+        webhook registry fetch its status at once. The outcome is noted in
+        the job's journal.
+        """
+        def fetch():
+            status_response = requests.get(f"{url}/{prediction_id}", headers=headers, timeout=30)
+            if status_response.status_code != 200:
+                print(f"Error checking status: {status_response.status_code}")
+                return None
+            return status_response.json()
+
+        if self.registry is not None and self.registry.enabled:
+            status_data = self.registry.wait(prediction_id, fetch, PREDICTION_TIMEOUT, cancel=cancel, refresh=refresh)
+            self._journal_outcome(prediction_id, status_data, cancel)
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            return status_data
+
+        for attempt in range(PREDICTION_TIMEOUT // POLL_INTERVAL):
+            if cancel is not None:
+                cancel.sleep(POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+            status_data = fetch()
+            if status_data is None or status_data['status'] in TERMINAL_STATUSES:
+                self._journal_outcome(prediction_id, status_data, cancel)
+                return status_data
+            print(f"Still processing... attempt {attempt + 1}")
+        return None
+
+    @staticmethod
+    def _journal_outcome(prediction_id: str, status_data: Optional[Dict[str, Any]], cancel: CancelToken = None):
+        if status_data is not None and cancel is not None and cancel.journal is not None:
+            cancel.journal.finish_prediction(prediction_id, status_data['status'])
+
     def _simulate_transcription(self, audio_path: str) -> str:
         """Enhanced simulated transcription with more variety and accuracy"""
         # Analyze file name for hints
@@ -195,7 +505,8 @@ class WhisperAudioProcessor:
                 "Emotional melodies speak to the heart, conveying feelings through the universal language of music and sound.",
                 "Contemporary rhythms blend with traditional elements, creating a fusion of old and new musical expressions."
             ]
-            return responses[hash(file_name) % len(responses)]
+            # hash() is salted per process; seed_from picks the same response every run
+            return responses[seed_from(file_name) % len(responses)]
 
     # Note: Art prompt generation is now handled by ImprovedAudioAnalyzer
     # This class focuses only on transcription services 
\ No newline at end of file
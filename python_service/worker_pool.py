@@ -0,0 +1,363 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, TimeoutError as ResultTimeout
+from functools import lru_cache
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from cancellation import CancelToken
+
+# Workers report to the coordinator this often, busy or idle
+HEARTBEAT_SECONDS = 2
+
+# A worker whose last heartbeat is older than this is reported unhealthy
+STALE_HEARTBEAT_SECONDS = 15
+
+# The coordinator checks for dead worker processes at least this often
+MONITOR_SECONDS = 1
+
+# A pipeline waiting on a worker checks its job's cancel token this often
+RESULT_POLL_SECONDS = 0.25
+
+# Imported once by the fork server, so each worker starts with them loaded
+PRELOAD_MODULES = ['worker_pool', 'improved_audio_analysis', 'replicate_image_generator']
+
+
+class WorkerLost(RuntimeError):
+    """The worker process running a task died before returning a result"""
+
+
+def parse_processes(value: Optional[str]) -> int:
+    """Worker process count from WORKER_PROCESSES: a number, or 'auto' for one per core; 0 runs in-process"""
+    value = (value or '0').strip().lower()
+    if value == 'auto':
+        return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    return max(0, int(value))
+
+
+# Tasks, run inside worker processes. Each process builds its own analyzer
+# and renderer on first use
+@lru_cache(maxsize=1)
+def _analyzer():
+    from improved_audio_analysis import ImprovedAudioAnalyzer
+    return ImprovedAudioAnalyzer()
+
+
+@lru_cache(maxsize=1)
+def _generator():
+    from replicate_image_generator import ReplicateImageGenerator
+    return ReplicateImageGenerator()
+
+
+def analyze_task(audio_path: str):
+    """AudioFeatures of an audio file"""
+    return _analyzer().analyze_audio_file(audio_path)
+
+
+def render_task(prompts: List[str], output_paths: List[str], variants: int, rngs: list, features: Any,
+                colors: List[str]) -> List[List[str]]:
+    """Procedural images (rendered and PNG-encoded) for each prompt; their paths, per prompt"""
+    return _generator().generate_image_files(prompts, output_paths, variants=variants, rngs=rngs,
+                                             features=features, colors=colors, backend='procedural')
+
+
+TASKS: Dict[str, Callable[..., Any]] = {
+    'analyze': analyze_task,
+    'render': render_task
+}
+
+
+def _worker_main(index: int, connection: Connection):
+    """Worker process loop: run the tasks the coordinator sends until told to stop, reporting as it goes"""
+    state = {'task': None, 'done': 0, 'failed': 0}
+    sending = threading.Lock()
+
+    def send(message: tuple):
+        with sending:
+            connection.send(message)
+
+    def heartbeat():
+        while True:
+            send(('heartbeat', {'task': state['task'], 'done': state['done'], 'failed': state['failed'],
+                                'cpu_seconds': time.process_time()}))
+            time.sleep(HEARTBEAT_SECONDS)
+
+    threading.Thread(target=heartbeat, name='heartbeat', daemon=True).start()
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+        task_id, name, args = task
+        state['task'] = name
+        try:
+            outcome = (True, TASKS[name](*args))
+            state['done'] += 1
+        except Exception as e:
+            outcome = (False, f"{type(e).__name__}: {e}")
+            state['failed'] += 1
+        state['task'] = None
+        send(('finished', task_id) + outcome)
+
+
+class _Worker:
+    """The coordinator's view of one worker process"""
+
+    __slots__ = ('index', 'process', 'connection', 'pid', 'started_at', 'heartbeat_at', 'task_id', 'task', 'done',
+                 'failed', 'cpu_seconds', 'restarts')
+
+    def __init__(self, index: int, process: multiprocessing.Process, connection: Connection, restarts: int = 0):
+        self.index = index
+        self.process = process
+        self.connection = connection
+        self.pid = process.pid
+        self.started_at = time.time()
+        self.heartbeat_at = self.started_at
+        self.task_id: Optional[str] = None
+        self.task: Optional[str] = None
+        self.done = 0
+        self.failed = 0
+        self.cpu_seconds = 0.0
+        self.restarts = restarts
+
+    def to_dict(self) -> Dict[str, Any]:
+        age = time.time() - self.heartbeat_at
+        return {
+            'pid': self.pid,
+            'alive': self.process.is_alive(),
+            'healthy': self.process.is_alive() and age < STALE_HEARTBEAT_SECONDS,
+            'task': self.task,
+            'done': self.done,
+            'failed': self.failed,
+            'cpu_seconds': round(self.cpu_seconds, 2),
+            'heartbeat_age': round(age, 1),
+            'restarts': self.restarts
+        }
+
+
+class WorkerPool:
+    """Worker processes that run the CPU-bound pipeline stages on every core.
+
+    The web process is the coordinator. Tasks (analysis, procedural
+    rendering and PNG encoding) wait in one queue, and each worker is handed
+    the next one as soon as it is free, over its own pipe, on which it also
+    sends results and heartbeats. A worker that dies therefore takes down
+    only its own pipe: it is restarted and the task it was running fails
+    with WorkerLost. Workers only compute and write the files they are
+    asked for: feature and prompt caches are read and written by the
+    coordinator, and every Replicate call stays there under its per-lane
+    prediction slots.
+
+    Workers, including replacements started while the service's threads
+    are running, come from a fork server (a fresh single-threaded process)
+    or are spawned where there is none, never forked from the coordinator:
+    a fork could copy a lock some other thread was holding.
+    """
+
+    def __init__(self, processes: int):
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context('forkserver')
+            self._context.set_forkserver_preload(PRELOAD_MODULES)
+        else:
+            self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._pending: Deque[Tuple[str, str, tuple]] = deque()
+        self._futures: Dict[str, Future] = {}
+        self._closed = False
+        self._workers = [self._start(index) for index in range(processes)]
+        threading.Thread(target=self._coordinate, name='worker-coordinator', daemon=True).start()
+        print(f"🧵 Started {processes} worker process(es): {', '.join(str(worker.pid) for worker in self._workers)}")
+
+    def _start(self, index: int, restarts: int = 0) -> _Worker:
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(index, worker_connection),
+                                        name=f"worker-{index}", daemon=True)
+        process.start()
+        worker_connection.close()
+        return _Worker(index, process, connection, restarts)
+
+    # Submitting work
+    def submit(self, name: str, *args: Any) -> Future:
+        """Queue TASKS[name](*args) for the next free worker"""
+        if name not in TASKS:
+            raise KeyError(name)
+        future = Future()
+        with self._lock:
+            task_id = uuid.uuid4().hex
+            self._futures[task_id] = future
+            self._pending.append((task_id, name, args))
+            self._dispatch()
+        return future
+
+    def call(self, name: str, *args: Any, cancel: CancelToken = None) -> Any:
+        """Run a task on a worker and wait for its result"""
+        return self.map(name, [args], cancel=cancel)[0]
+
+    def map(self, name: str, calls: Sequence[Tuple[Any, ...]], cancel: CancelToken = None) -> List[Any]:
+        """Run a task once per argument tuple, spread over the workers; results in order.
+
+        Raises the first task's error as RuntimeError (WorkerLost if its
+        worker died), or JobCancelled once the cancel token fires; tasks
+        already running then finish unobserved.
+        """
+        futures = [self.submit(name, *args) for args in calls]
+        results = []
+        for future in futures:
+            while True:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                try:
+                    results.append(future.result(timeout=RESULT_POLL_SECONDS))
+                    break
+                except ResultTimeout:
+                    continue
+        return results
+
+    def _dispatch(self):
+        # Hand pending tasks to idle workers; caller holds the lock
+        for worker in self._workers:
+            if not self._pending:
+                return
+            if worker.task_id is None and worker.process.is_alive():
+                task = self._pending.popleft()
+                worker.task_id, worker.task = task[0], task[1]
+                try:
+                    worker.connection.send(task)
+                except OSError:
+                    # Dying; the coordinator fails the task when it notices
+                    continue
+
+    # Coordinator thread: results, heartbeats and dead workers
+    def _coordinate(self):
+        while not self._closed:
+            with self._lock:
+                connections = {worker.connection: worker for worker in self._workers}
+            for connection in wait(list(connections), timeout=MONITOR_SECONDS):
+                worker = connections[connection]
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # The process is gone; handled below once is_alive() agrees
+                    continue
+                self._receive(worker, message)
+            for worker in list(self._workers):
+                if not worker.process.is_alive() and not self._closed:
+                    self._replace(worker)
+
+    def _receive(self, worker: _Worker, message: tuple):
+        future = None
+        with self._lock:
+            if message[0] == 'heartbeat':
+                beat = message[1]
+                worker.heartbeat_at = time.time()
+                worker.done, worker.failed, worker.cpu_seconds = beat['done'], beat['failed'], beat['cpu_seconds']
+                return
+            _, task_id, ok, value = message
+            if worker.task_id == task_id:
+                worker.task_id = worker.task = None
+            future = self._futures.pop(task_id, None)
+            self._dispatch()
+        if future is None:
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(RuntimeError(value))
+
+    def _replace(self, worker: _Worker):
+        print(f"❌ Worker {worker.pid} exited ({worker.process.exitcode}), restarting")
+        worker.connection.close()
+        replacement = self._start(worker.index, worker.restarts + 1)
+        with self._lock:
+            self._workers[worker.index] = replacement
+            future = self._futures.pop(worker.task_id, None) if worker.task_id else None
+            self._dispatch()
+        if future is not None:
+            future.set_exception(WorkerLost(f"worker {worker.pid} exited while running the task"))
+
+    # Health
+    def healthy(self) -> bool:
+        with self._lock:
+            return all(worker.to_dict()['healthy'] for worker in self._workers)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'processes': len(self._workers),
+                'queued': len(self._pending),
+                'workers': [worker.to_dict() for worker in self._workers]
+            }
+
+    def close(self):
+        """Ask every worker to finish its current task and exit"""
+        self._closed = True
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    worker.connection.send(None)
+                except OSError:
+                    pass
+        for worker in self._workers:
+            worker.process.join(timeout=HEARTBEAT_SECONDS * 2)
+
+
+def benchmark(process_counts: Sequence[int], jobs: int = 16) -> List[Dict[str, float]]:
+    """Throughput of the CPU stages (analysis plus both procedural stage images) at each worker count.
+
+    Jobs are submitted from as many threads, as concurrent pipelines
+    would; 0 processes runs them on those threads in this process.
+    """
+    import random
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from feature_record import AudioFeatures
+
+    directory = tempfile.mkdtemp()
+    track = os.path.join(directory, 'benchmark energetic rock.wav')
+    with open(track, 'wb') as audio_file:
+        audio_file.write(os.urandom(256 * 1024))
+    colors = ['crimson', 'gold', 'teal', 'navy', 'violet']
+
+    results = []
+    for processes in process_counts:
+        pool = WorkerPool(processes) if processes else None
+        if pool is not None:
+            # Build each worker's analyzer and renderer before timing
+            pool.map('analyze', [(track,)] * processes)
+
+        def pipeline(job: int):
+            paths = [os.path.join(directory, f"{processes}_{job}_{stage}.png") for stage in ('abstract', 'representational')]
+            rngs = [random.Random(f"{job}-{stage}") for stage in range(2)]
+            if pool is None:
+                features = analyze_task(track)
+                return [render_task([f"stage {stage}"], [paths[stage]], 1, [rngs[stage]], features, colors)
+                        for stage in range(2)]
+            features = pool.call('analyze', track)
+            return pool.map('render', [([f"stage {stage}"], [paths[stage]], 1, [rngs[stage]], features, colors)
+                                       for stage in range(2)])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max(processes, 1) * 2) as threads:
+            list(threads.map(pipeline, range(jobs)))
+        seconds = time.perf_counter() - started
+        if pool is not None:
+            pool.close()
+        results.append({'processes': processes, 'seconds': round(seconds, 2), 'jobs_per_second': round(jobs / seconds, 2)})
+    return results
+
+
+if __name__ == "__main__":
+    # python worker_pool.py [process counts...] measures how the CPU stages
+    # scale, by default from in-process up to one worker per core
+    cores = parse_processes('auto')
+    counts = [int(count) for count in sys.argv[1:]] or sorted({0, 1, 2, max(1, cores // 2), cores})
+    results = benchmark(counts)
+    print(f"🧪 CPU stage throughput on {cores} core(s), relative to {results[0]['processes']} process(es)")
+    baseline = results[0]['jobs_per_second']
+    for result in results:
+        print(f"  {result['processes']:>3} process(es): {result['jobs_per_second']:6.2f} jobs/s "
+              f"({result['seconds']}s, {result['jobs_per_second'] / baseline:.2f}x)")